@@ -0,0 +1,218 @@
+import base64
+from datetime import date, timedelta
+
+# Faollik bitmaplari: foydalanuvchiga zich tartib raqami (0, 1, 2, ...) beriladi,
+# kunlik faollik shu raqamlar bo'yicha bitlar to'plami sifatida saqlanadi.
+# 100 000 foydalanuvchi uchun bir kun ~12.5 KB, ID'lar ro'yxati esa bir necha MB bo'lardi.
+
+
+class Bitmap:
+    __slots__ = ("bits",)
+
+    def __init__(self, data=b""):
+        self.bits = bytearray(data)
+
+    def add(self, ordinal):
+        byte, mask = ordinal >> 3, 1 << (ordinal & 7)
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte - len(self.bits) + 1))
+        if self.bits[byte] & mask:
+            return False
+        self.bits[byte] |= mask
+        return True
+
+    def __contains__(self, ordinal):
+        byte = ordinal >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (ordinal & 7)))
+
+    def __iter__(self):
+        for byte, value in enumerate(self.bits):
+            while value:
+                low = value & -value
+                yield (byte << 3) + low.bit_length() - 1
+                value ^= low
+
+    def as_int(self):
+        return int.from_bytes(self.bits, "little")
+
+    def count(self):
+        return self.as_int().bit_count()
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+    def to_text(self):
+        return base64.b64encode(self.bits).decode("ascii")
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(base64.b64decode(text))
+
+    @classmethod
+    def from_ordinals(cls, ordinals):
+        ordinals = list(ordinals)
+        bits = bytearray((max(ordinals, default=-1) >> 3) + 1)
+        for ordinal in ordinals:
+            bits[ordinal >> 3] |= 1 << (ordinal & 7)
+        return cls(bits)
+
+    @classmethod
+    def from_int(cls, value):
+        return cls(value.to_bytes((value.bit_length() + 7) // 8, "little"))
+
+
+def month_of(day):
+    return day[:7]
+
+
+# Saqlash siyosati: `keep_days` kundan eski kunlar oylik bitmapga qo'shiladi
+# (kunlik DAU soni saqlanib qoladi), `keep_months` oydan eski oylarning
+# bitmapi o'chiriladi va faqat MAU soni qoladi.
+def compaction_cutoffs(today, keep_days, keep_months):
+    current = date.fromisoformat(today)
+    day_cutoff = (current - timedelta(days=keep_days)).isoformat()
+    year, month = current.year, current.month - keep_months
+    while month < 1:
+        year, month = year - 1, month + 12
+    return day_cutoff, f"{year:04d}-{month:02d}"
+
+
+# [start, end] oralig'idagi kunlar (ISO satrlar)
+def days_between(start, end):
+    current, last = date.fromisoformat(start), date.fromisoformat(end)
+    while current <= last:
+        yield current.isoformat()
+        current += timedelta(days=1)
+
+
+# JSON backend uchun xotiradagi faollik jurnali.
+# Oylik bitmap kunlar siqilgandan keyin ham WAU/MAU ni taxminan hisoblash imkonini beradi:
+# oyning bir qismi so'ralsa, butun oy bitmapidan foydalaniladi (yuqori chegara).
+# Tarix (oylik bitmaplar va siqilgan kunlar soni) `history` orqali birinchi kerak bo'lganda yuklanadi:
+# `compacted_until` dan keyingi kunlar tarixda bo'lmaydi, shuning uchun joriy statistikaga tarix kerak emas.
+class ActivityLog:
+    def __init__(self, history=None):
+        self.ordinals = {}
+        self.days = {}
+        self.compacted_until = ""
+        self.pruned_before = ""
+        self.history_dirty = False
+        self._months = {}
+        self._counts = {}
+        self._history = history
+
+    @property
+    def history_loaded(self):
+        return self._history is None
+
+    def load_history(self):
+        if self._history is not None:
+            data, self._history = self._history(), None
+            self._months = {month: Bitmap.from_text(bits) for month, bits in data.get("months", {}).items()}
+            self._counts = dict(data.get("counts", {}))
+
+    @property
+    def months(self):
+        self.load_history()
+        return self._months
+
+    @property
+    def counts(self):
+        self.load_history()
+        return self._counts
+
+    def ordinal(self, user_id):
+        ordinal = self.ordinals.get(user_id)
+        if ordinal is None:
+            ordinal = self.ordinals[user_id] = len(self.ordinals)
+        return ordinal
+
+    def start_day(self, day):
+        if day in self.days or (day <= self.compacted_until and day in self.counts):
+            return False
+        self.days[day] = Bitmap()
+        return True
+
+    def mark(self, user_id, day):
+        bitmap = self.days.get(day)
+        if bitmap is None:
+            bitmap = self.days[day] = Bitmap()
+        return bitmap.add(self.ordinal(user_id))
+
+    def count_day(self, day):
+        bitmap = self.days.get(day)
+        if bitmap is not None:
+            return bitmap.count()
+        return self.counts.get(day, 0) if day <= self.compacted_until else 0
+
+    def count_between(self, start, end):
+        return self.active_between(start, end).bit_count()
+
+    # [start, end] da faol bo'lganlar bitmapi (int, bit = tartib raqami)
+    def active_between(self, start, end):
+        value, months = 0, set()
+        for day in days_between(start, end):
+            if day in self.days:
+                value |= self.days[day].as_int()
+            elif day <= self.compacted_until and month_of(day) in self.months:
+                months.add(month_of(day))
+        for month in months:
+            value |= self.months[month].as_int()
+        return value
+
+    def compact(self, today, keep_days, keep_months):
+        day_cutoff, month_cutoff = compaction_cutoffs(today, keep_days, keep_months)
+        changed = 0
+        for day in sorted(day for day in self.days if day < day_cutoff):
+            bitmap = self.days.pop(day)
+            self.counts[day] = bitmap.count()
+            month = month_of(day)
+            merged = self.months[month].as_int() | bitmap.as_int() if month in self.months else bitmap.as_int()
+            self.months[month] = Bitmap.from_int(merged)
+            self.compacted_until = max(self.compacted_until, day)
+            changed += 1
+        if month_cutoff > self.pruned_before:
+            for month in [month for month in self.months if month < month_cutoff]:
+                self.counts[month] = self.months.pop(month).count()
+                changed += 1
+            self.pruned_before = month_cutoff
+        if changed:
+            self.history_dirty = True
+        return changed
+
+    # Joriy qism: foydalanuvchilar tartibi va hali siqilmagan kunlar
+    def current_dict(self):
+        return {
+            "users": sorted(self.ordinals, key=self.ordinals.get),
+            "days": {day: bitmap.to_text() for day, bitmap in self.days.items()},
+            "compacted_until": self.compacted_until,
+            "pruned_before": self.pruned_before
+        }
+
+    def history_dict(self):
+        return {
+            "months": {month: bitmap.to_text() for month, bitmap in self.months.items()},
+            "counts": dict(self.counts)
+        }
+
+    def to_dict(self):
+        return {**self.current_dict(), **self.history_dict()}
+
+    # `data` da tarix bo'lmasa, u `history()` chaqirilib keyinroq yuklanadi
+    @classmethod
+    def from_dict(cls, data, history=None):
+        log = cls()
+        log.ordinals = {user_id: i for i, user_id in enumerate(data.get("users", []))}
+        log.days = {day: Bitmap.from_text(bits) for day, bits in data.get("days", {}).items()}
+        log.pruned_before = data.get("pruned_before", "")
+        if "months" in data or "counts" in data or history is None:
+            log._history = lambda: data
+            log.load_history()
+            log.history_dirty = bool(log._months or log._counts)
+            # Eski format: oy kaliti ("2025-01") shu oyning oxirgi kunigacha siqilgan deb olinadi
+            periods = [period if len(period) > 7 else period + "-31" for period in [*log._counts, *log._months]]
+            log.compacted_until = data.get("compacted_until", max(periods, default=""))
+        else:
+            log._history = history
+            log.compacted_until = data.get("compacted_until", "")
+        return log
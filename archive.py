@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+from metrics import ARCHIVE_BYTES, ARCHIVE_FILES
+
+logger = logging.getLogger(__name__)
+
+# Ro'yxatdan o'tish hujjatlarining lokal arxivi: fayllar mazmuni bo'yicha (sha256) saqlanadi,
+# root/ab/abcdef... ko'rinishida. Telegram'dagi file_unique_id bo'yicha indeks saqlash qatlamida:
+# bir marta yuklangan fayl qayta yuklab olinmaydi, bir xil mazmunli fayllar bitta nusxada turadi.
+
+
+# Yuklab olinayotgan bo'laklarni faylga yozish va bir vaqtning o'zida xeshlash (butun fayl xotirada turmaydi)
+class HashingWriter:
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk):
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        return self.f.write(chunk)
+
+    def flush(self):
+        self.f.flush()
+
+
+class DocumentArchive:
+    def __init__(self, bot, storage, root, chunk_size=65536, timeout=60):
+        self.bot = bot
+        self.storage = storage
+        self.root = root
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._pending = {}
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    # Arxiv yozuvi (sha256, size, file_id, file_type); bir xil fayl bir vaqtda ikki marta yuklanmaydi
+    async def archive(self, file_id, file_unique_id, file_type):
+        record = self.storage.get_archived(file_unique_id)
+        if record is not None:
+            ARCHIVE_FILES.inc("known")
+            return record
+        task = self._pending.get(file_unique_id)
+        if task is None:
+            task = self._pending[file_unique_id] = asyncio.create_task(
+                self._download(file_id, file_unique_id, file_type)
+            )
+            task.add_done_callback(lambda _: self._pending.pop(file_unique_id, None))
+        return await asyncio.shield(task)
+
+    async def _download(self, file_id, file_unique_id, file_type):
+        started = time.perf_counter()
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                writer = HashingWriter(f)
+                await self.bot.download(file_id, destination=writer, timeout=self.timeout,
+                                        chunk_size=self.chunk_size, seek=False)
+                os.fsync(f.fileno())
+            sha256 = writer.sha256.hexdigest()
+            path = self.path_for(sha256)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                ARCHIVE_FILES.inc("same_content")
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                ARCHIVE_FILES.inc("downloaded")
+                ARCHIVE_BYTES.inc(amount=writer.size)
+        except BaseException:
+            ARCHIVE_FILES.inc("failed")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        record = {"sha256": sha256, "size": writer.size, "file_id": file_id, "file_type": file_type}
+        self.storage.add_archived(file_unique_id, record)
+        logger.info(f"Hujjat arxivlandi: {file_unique_id} -> {sha256} ({writer.size} bayt, "
+                    f"{time.perf_counter() - started:.2f}s)")
+        return record
+
+    # Fon vazifasi uchun: xatolik log qilinadi, registratsiya jarayoni to'xtamaydi
+    async def archive_quietly(self, file_id, file_unique_id, file_type):
+        try:
+            return await self.archive(file_id, file_unique_id, file_type)
+        except Exception as e:
+            logger.error(f"Hujjatni arxivlashda xatolik ({file_unique_id}): {e}")
+            return None
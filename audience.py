@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+
+from activity import Bitmap
+from texts import translations
+
+# Post auditoriyasi: foydalanuvchilar faollik tartib raqamlari (activity ordinals) bo'yicha
+# bitmaplarga (Python int) ajratilgan - hamma, bloklaganlar, ro'yxatdan o'tganlar,
+# hujjat yuborganlar va har bir til. Segment shu bitmaplar ustida AND/ANDNOT bilan quriladi,
+# faollik filtri esa kunlik/oylik faollik bitmaplari bilan kesishadi.
+# Ro'yxat (user_id'lar) faqat tarqatish boshlanganda bir marta yoyiladi.
+
+# Segment bitmaplari nomlari
+ALL_USERS = "users"
+BLOCKED_USERS = "blocked"
+REGISTERED = "registered"
+WITH_DOCUMENTS = "documents"
+
+ACTIVE_DAYS = (1, 7, 30)
+# Filtr -> tanlovlar (None - hammasi). Admin tugmani bosganda keyingi qiymatga o'tiladi.
+FILTERS = {
+    "lang": (None, *translations),
+    "registered": (None, True, False),
+    "documents": (None, True, False),
+    "active_days": (None, *ACTIVE_DAYS),
+}
+
+
+def lang_set(lang):
+    return f"lang:{lang}"
+
+
+def empty_audience():
+    return dict.fromkeys(FILTERS)
+
+
+def is_everyone(audience):
+    return not audience or all(value is None for value in audience.values())
+
+
+# Oxirgi `days` kun (bugun ham) - faollik bitmaplari so'raladigan oraliq
+def active_range(days, today=None):
+    today = today or date.today()
+    return (today - timedelta(days=days - 1)).isoformat(), today.isoformat()
+
+
+def next_value(audience, name):
+    choices = FILTERS[name]
+    return choices[(choices.index(audience.get(name)) + 1) % len(choices)]
+
+
+class AudienceIndex:
+    def __init__(self):
+        self.sets = {}
+
+    # Ishga tushishda: {nom: tartib raqamlari}
+    def build(self, ordinals_by_set):
+        for name, ordinals in ordinals_by_set.items():
+            self.sets[name] = self.get(name) | Bitmap.from_ordinals(ordinals).as_int()
+
+    def get(self, name):
+        return self.sets.get(name, 0)
+
+    def add(self, name, ordinal):
+        self.sets[name] = self.get(name) | (1 << ordinal)
+
+    def discard(self, name, ordinal):
+        value = self.get(name)
+        if value >> ordinal & 1:
+            self.sets[name] = value ^ (1 << ordinal)
+
+    # Auditoriya bitmapi; `active` - oxirgi active_days kundagi faollik bitmapi
+    def select(self, audience, active=0):
+        bits = self.get(ALL_USERS) & ~self.get(BLOCKED_USERS)
+        if is_everyone(audience):
+            return bits
+        if audience.get("lang"):
+            bits &= self.get(lang_set(audience["lang"]))
+        for name, key in ((REGISTERED, "registered"), (WITH_DOCUMENTS, "documents")):
+            if audience.get(key) is True:
+                bits &= self.get(name)
+            elif audience.get(key) is False:
+                bits &= ~self.get(name)
+        if audience.get("active_days"):
+            bits &= active
+        return bits
+
+
+def ordinals_of(bits):
+    return iter(Bitmap.from_int(bits))
@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from datetime import date, timedelta
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import SendMessage
+
+from responses import (
+    LANGUAGES, PreparedMarkupSession, build_main_menu, build_services_menu, build_admin_menu, build_inline_pair,
+    get_main_menu, get_services_menu, get_admin_menu, get_confirm_buttons
+)
+from audience import empty_audience
+from routing import MenuAction, menu_action
+from stats import collect
+from storage import JsonStorage, SqliteStorage, migrate_json_to_sqlite, write_json_atomic
+from texts import translations, SERVICE_BUTTONS
+
+
+# Eski handle_language_and_menu dagi if/elif zanjiri (taqqoslash uchun)
+def legacy_route(text, lang):
+    if text in ["📝 Ro'yxatdan o'tish", "📝 Регистрация", "📝 Registration"]:
+        return "registration"
+    if text == translations[lang]["home"]:
+        return "home"
+    elif text == translations[lang]["menu"][1]:
+        return "operator"
+    elif text == translations[lang]["menu"][2]:
+        return "services"
+    elif text == translations[lang]["menu"][3]:
+        return "profile"
+    elif text in ["🚛 Logistika", "🚛 Логистика", "🚛 Logistics"]:
+        return "service_0"
+    elif text in ["🧾 Ruxsatnomalar va bojxona xizmatlari", "🧾 Разрешения и таможенные услуги", "🧾 Permits and Customs Services"]:
+        return "service_1"
+    elif text in ["🏢 Ma’muriyatchilik ishlari", "🏢 Административные услуги", "🏢 Administrative Services"]:
+        return "service_2"
+    elif text in ["📄 Sertifikatsiya", "📄 Сертификация", "📄 Certification"]:
+        return "service_3"
+    elif text == translations[lang]["back"]:
+        return "back"
+    return None
+
+
+def routing_samples():
+    samples = []
+    for lang, t in translations.items():
+        texts = [t["home"], t["back"], *t["menu"], *SERVICE_BUTTONS[lang], "Salom", "998901234567"]
+        samples += [(text, lang) for text in texts]
+    return samples
+
+
+# Sintetik bot_data.json (eski format): foydalanuvchilar, kunlik faollik, ro'yxatdan o'tganlar
+def build_dataset(users, days=365, active_ratio=0.05, registered_ratio=0.3, seed=1):
+    rng = random.Random(seed)
+    user_ids = [str(5_000_000_000 + i * 7919) for i in range(users)]
+    questions = translations["uz"]["initial_questions"]
+    start = date(2025, 1, 1)
+    daily_users = {}
+    for i in range(days):
+        daily_users[(start + timedelta(days=i)).isoformat()] = rng.sample(user_ids, int(users * active_ratio))
+    registered = rng.sample(user_ids, int(users * registered_ratio))
+    return {
+        "users": user_ids,
+        "blocked_users": rng.sample(user_ids, users // 50),
+        "daily_users": daily_users,
+        "registered_users": {
+            uid: {questions[0]: f"Foydalanuvchi {uid[-4:]}", questions[1]: f"99890{uid[-7:]}"} for uid in registered
+        },
+        "user_documents": {uid: {str(slot): f"AgAC{uid}{slot}" for slot in range(3)} for uid in registered}
+    }
+
+
+# Eng yaxshi vaqt (soniya) va alohida o'lchangan eng yuqori xotira (MB)
+def measure(fn, repeat=3, number=1):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+    return {"seconds": best, "peak_mb": round(peak / 2 ** 20, 3)}
+
+
+def bench_persistence(users, days, workdir):
+    data = build_dataset(users, days)
+    legacy_path = os.path.join(workdir, f"legacy-{users}.json")
+    json_path = os.path.join(workdir, f"bot_data-{users}.json")
+    db_path = os.path.join(workdir, f"bot_data-{users}.db")
+    write_json_atomic(legacy_path, data)
+    del data
+
+    results = {}
+    legacy = JsonStorage(legacy_path)
+    results["json_load_legacy"] = measure(legacy.load, repeat=1)
+    legacy.compact_activity(max(legacy.activity.days), 35, 24)
+    current = JsonStorage(json_path)
+    current.write(legacy.snapshot())
+    results["json_save"] = measure(lambda: current.write(legacy.snapshot()))
+    results["json_load"] = measure(current.load)
+
+    # Tarix bilan birga yuklash (statistika birinchi marta so'ralganda)
+    def load_with_history():
+        current.load()
+        current.activity.load_history()
+    results["json_load_history"] = measure(load_with_history)
+    results["json_file_mb"] = {"value": round(os.path.getsize(json_path) / 2 ** 20, 3)}
+    # --days saqlanadigan kunlardan kam bo'lsa tarix fayli yozilmaydi
+    history_size = os.path.getsize(current.history_path) if os.path.exists(current.history_path) else 0
+    results["json_history_mb"] = {"value": round(history_size / 2 ** 20, 3)}
+
+    def migrate():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        migrate_json_to_sqlite(legacy_path, db_path)
+    results["sqlite_migrate"] = measure(migrate, repeat=1)
+    results["sqlite_file_mb"] = {"value": round(os.path.getsize(db_path) / 2 ** 20, 3)}
+    return results, current, db_path
+
+
+# admin_stats dagi hisob-kitoblar (jami, bloklangan, bugungi faollar)
+def bench_stats(storage, today):
+    def stats():
+        return storage.count_users(), storage.count_blocked(), storage.count_active(today)
+    return measure(stats, repeat=5, number=20)
+
+
+# Admin paneli: tayyor hisoblagichlardan o'qish
+def bench_panel(storage, today):
+    return measure(lambda: collect(storage, today, LANGUAGES), repeat=5, number=20)
+
+
+# Post segmenti (show_post_preview dagi son): indeks birinchi chaqiruvda quriladi, o'lchovga kirmaydi
+def bench_audience(storage):
+    audience = dict(empty_audience(), lang="uz", registered=True, documents=False, active_days=30)
+    storage.audience_count(audience)
+    return measure(lambda: storage.audience_count(audience), repeat=5, number=20)
+
+
+# handle_language_and_menu: eski if/elif zanjiri, indeks va MenuAction filtri (bitta xabar uchun)
+def bench_routing(number=20000):
+    samples = routing_samples()
+    for text, lang in samples:
+        assert legacy_route(text, lang) in (None, menu_action(text)), text
+
+    class Message:
+        def __init__(self, text):
+            self.text = text
+
+    messages = [Message(text) for text, _ in samples]
+    menu_filter = MenuAction()
+    loop = asyncio.new_event_loop()
+
+    def run_legacy():
+        for text, lang in samples:
+            legacy_route(text, lang)
+
+    def run_index():
+        for text, lang in samples:
+            menu_action(text)
+
+    async def filter_all():
+        for message in messages:
+            await menu_filter(message)
+
+    def run_filter():
+        loop.run_until_complete(filter_all())
+
+    results = {}
+    try:
+        for name, fn, count in (("legacy_chain", run_legacy, number), ("menu_index", run_index, number),
+                                ("menu_filter", run_filter, number // 10)):
+            result = measure(fn, repeat=5, number=count)
+            result["seconds"] /= len(samples)
+            results[name] = result
+    finally:
+        loop.close()
+    return results
+
+
+# Klaviaturalar: har safar qurish, tayyor obyektni olish va JSON'ga serializatsiya
+def bench_keyboards(number=2000):
+    def build_all():
+        for lang in LANGUAGES:
+            build_main_menu(lang)
+            build_services_menu(lang)
+            build_admin_menu(lang)
+            build_inline_pair(lang, "confirm_registration", "retry_registration")
+
+    def get_all():
+        for lang in LANGUAGES:
+            get_main_menu(lang)
+            get_services_menu(lang)
+            get_admin_menu(lang)
+            get_confirm_buttons(lang)
+
+    session = PreparedMarkupSession()
+    bot = Bot(token="1:bench", session=session)
+    method = SendMessage(chat_id=1, text="bench", reply_markup=get_services_menu("uz"))
+
+    def serialize_plain():
+        AiohttpSession.build_form_data(session, bot, method)
+
+    def serialize_prepared():
+        session.build_form_data(bot, method)
+
+    return {
+        "build": measure(build_all, repeat=5, number=number),
+        "cached": measure(get_all, repeat=5, number=number),
+        "serialize_plain": measure(serialize_plain, repeat=5, number=number),
+        "serialize_prepared": measure(serialize_prepared, repeat=5, number=number)
+    }
+
+
+def run_suite(sizes, days, number):
+    results = {}
+
+    def record(prefix, values):
+        for name, value in values.items():
+            results[f"{prefix}.{name}"] = value
+
+    record("routing", bench_routing(number))
+    record("keyboards", bench_keyboards(max(1, number // 10)))
+    with tempfile.TemporaryDirectory() as workdir:
+        for users in sizes:
+            persistence, json_storage, db_path = bench_persistence(users, days, workdir)
+            record(f"persistence[users={users}]", persistence)
+            today = max(json_storage.activity.days)
+            record(f"stats[users={users}]", {"json": bench_stats(json_storage, today),
+                                             "panel_json": bench_panel(json_storage, today)})
+            record(f"audience[users={users}]", {"json": bench_audience(json_storage)})
+            sqlite_storage = SqliteStorage(db_path)
+            asyncio.run(sqlite_storage.open())
+            try:
+                sqlite_storage.compact_activity(today, 35, 24)
+                record(f"stats[users={users}]", {"sqlite": bench_stats(sqlite_storage, today),
+                                                 "panel_sqlite": bench_panel(sqlite_storage, today)})
+                record(f"audience[users={users}]", {"sqlite": bench_audience(sqlite_storage)})
+            finally:
+                asyncio.run(sqlite_storage.close())
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "days": days,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+
+
+# Bazaviy natija bilan solishtirish: vaqt `tolerance` dan ko'proq oshgan bo'lsa regressiya
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, current in sorted(results["results"].items()):
+        previous = baseline.get("results", {}).get(name)
+        if not previous or "seconds" not in current or "seconds" not in previous:
+            continue
+        ratio = current["seconds"] / previous["seconds"] if previous["seconds"] else 1.0
+        mark = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:<55} {previous['seconds'] * 1e6:>12.2f}us -> {current['seconds'] * 1e6:>12.2f}us  {ratio:5.2f}x {mark}")
+        if mark:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Saqlash, menyu yo'naltirish va klaviaturalar mikro-benchmarklari")
+    parser.add_argument("--sizes", default="10000,100000", help="Foydalanuvchilar soni (vergul bilan), masalan 10000,100000,1000000")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--number", type=int, default=20000, help="Yo'naltirish benchmarkidagi takrorlar")
+    parser.add_argument("--output", help="Natijani JSON faylga yozish")
+    parser.add_argument("--baseline", help="Solishtirish uchun bazaviy JSON natija")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Ruxsat etilgan sekinlashish ulushi")
+    args = parser.parse_args()
+
+    suite = run_suite([int(size) for size in args.sizes.split(",")], args.days, args.number)
+    if args.output:
+        write_json_atomic(args.output, suite)
+    else:
+        print(json.dumps(suite, indent=2))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            if compare(suite, json.load(f), args.tolerance):
+                sys.exit(1)
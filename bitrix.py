@@ -0,0 +1,254 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from urllib.parse import urlencode
+
+import aiohttp
+
+from metrics import BITRIX_ERRORS, BITRIX_LEADS, BITRIX_SECONDS
+
+logger = logging.getLogger(__name__)
+
+LEAD_ADD = "crm.lead.add"
+LEAD_UPDATE = "crm.lead.update"
+LEAD_UPDATE_FIELDS = ("NAME", "COMMENTS")  # Mavjud lead'da holat, manba va telefon qayta yozilmaydi
+LEAD_ACTIONS = {LEAD_ADD: "add", LEAD_UPDATE: "update", None: "skip"}
+BATCH_LIMIT = 50  # Bitrix24 bitta batch so'rovidagi buyruqlar chegarasi
+
+
+class BitrixError(Exception):
+    pass
+
+
+# Bitrix24 lead uchun so'rov tanasi
+def build_lead_payload(name, phone, documents):
+    comments = f"Telefon: {phone}\nHujjatlar:\n"
+    for i, _ in enumerate(documents):
+        comments += f"Hujjat {i + 1}: Yuklandi\n"
+    return {
+        "fields": {
+            "TITLE": "PBS IMPEX - Yangi ro'yxatdan o'tgan foydalanuvchi",
+            "NAME": name,
+            "PHONE": [{"VALUE": phone, "VALUE_TYPE": "WORK"}],
+            "COMMENTS": comments,
+            "SOURCE_ID": "WEB",
+            "STATUS_ID": "NEW"
+        }
+    }
+
+
+# Lead maydonlari o'zgarganini aniqlash uchun (kesh bilan solishtiriladi)
+def lead_fingerprint(payload):
+    return hashlib.sha256(json.dumps(payload["fields"], sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+
+
+# batch buyrug'i: PHP http_build_query ko'rinishi (fields[PHONE][0][VALUE]=...)
+def build_query(params):
+    pairs = []
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                walk(f"{prefix}[{key}]" if prefix else str(key), item)
+        elif isinstance(value, (list, tuple)):
+            for i, item in enumerate(value):
+                walk(f"{prefix}[{i}]", item)
+        else:
+            pairs.append((prefix, value))
+
+    walk("", params)
+    return urlencode(pairs)
+
+
+# Asinxron Bitrix24 REST klienti: bitta keep-alive aiohttp sessiyasi (ulanishlar puli)
+class BitrixClient:
+    def __init__(self, webhook_url, timeout=10, pool_size=10):
+        self.webhook_url = webhook_url.rstrip("/") + "/"
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.pool_size = pool_size
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def call(self, method, payload):
+        started = time.perf_counter()
+        try:
+            async with self._get_session().post(f"{self.webhook_url}{method}", json=payload) as response:
+                data = await response.json(content_type=None)
+                if response.status >= 400 or "error" in data:
+                    raise BitrixError(f"{response.status}: {data.get('error_description') or data.get('error')}")
+                return data
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            BITRIX_ERRORS.inc(method)
+            raise BitrixError(str(e) or type(e).__name__) from e
+        except BitrixError:
+            BITRIX_ERRORS.inc(method)
+            raise
+        finally:
+            BITRIX_SECONDS.observe(time.perf_counter() - started, method)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+# Doimiy outbox: so'rovlar avval omborga yoziladi, fon ishchisi ularni
+# eksponensial kutish (jitter bilan) orqali Bitrix24'ga yetkazadi.
+# Qayta ishga tushirilganda yuborilmagan so'rovlar ombordan davom ettiriladi.
+# Navbatda bir nechta yozuv bo'lsa, ular bitta `batch` so'roviga (50 tagacha buyruq) jamlanadi.
+# Telefon raqami (context["phone"], E.164) bo'lgan crm.lead.add yozuvlari lead keshi orqali o'tadi:
+# shu raqam bilan lead yaratilgan bo'lsa u yangilanadi, maydonlar o'zgarmagan bo'lsa so'rov yuborilmaydi.
+class BitrixOutbox:
+    def __init__(self, storage, client, on_result=None, max_attempts=10, base_delay=2.0, max_delay=600.0,
+                 batch_size=BATCH_LIMIT, poll_interval=None):
+        self.storage = storage
+        self.client = client
+        self.on_result = on_result
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batch_size = max(1, min(batch_size, BATCH_LIMIT))
+        self.poll_interval = poll_interval  # Boshqa jarayonlar qo'shgan yozuvlarni tekshirish oralig'i
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def enqueue(self, method, payload, context=None):
+        entry_id = self.storage.outbox_add(method, payload, context or {}, time.time())
+        self._wakeup.set()
+        return entry_id
+
+    def backoff(self, attempts):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.5)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.client.close()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.process_due()
+            except Exception as e:
+                logger.error(f"Bitrix24 outbox xatoligi: {e}")
+            next_at = self.storage.outbox_next_attempt()
+            timeout = None if next_at is None else max(0.0, next_at - time.time())
+            if self.poll_interval is not None:
+                timeout = self.poll_interval if timeout is None else min(timeout, self.poll_interval)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_due(self):
+        commands, phones = [], set()
+        for entry in self.storage.outbox_due(time.time(), self.batch_size):
+            phone = entry["context"].get("phone")
+            if phone in phones:
+                continue  # Bitta partiyada bitta raqam: keyingi yozuv keshdagi lead bilan yuboriladi
+            if phone:
+                phones.add(phone)
+            command = self._command(entry)
+            if command[1] is None:
+                await self._succeeded(command, {"result": command[2]["id"]})
+            else:
+                commands.append(command)
+        if len(commands) == 1:
+            await self._deliver(commands[0])
+        elif commands:
+            await self._deliver_batch(commands)
+
+    # (yozuv, metod, so'rov tanasi, lead izi); metod None - lead o'zgarmagan, yuborilmaydi
+    def _command(self, entry):
+        phone = entry["context"].get("phone")
+        if entry["method"] != LEAD_ADD or not phone:
+            return entry, entry["method"], entry["payload"], None
+        fingerprint = lead_fingerprint(entry["payload"])
+        lead = self.storage.get_lead(phone)
+        if lead is None:
+            return entry, LEAD_ADD, entry["payload"], fingerprint
+        if lead["fingerprint"] == fingerprint:
+            return entry, None, {"id": lead["lead_id"]}, fingerprint
+        fields = {key: value for key, value in entry["payload"]["fields"].items() if key in LEAD_UPDATE_FIELDS}
+        return entry, LEAD_UPDATE, {"id": lead["lead_id"], "fields": fields}, fingerprint
+
+    async def _deliver(self, command):
+        entry, method, payload, _ = command
+        try:
+            response = await self.client.call(method, payload)
+        except BitrixError as e:
+            await self._failed(entry, e)
+            return
+        await self._succeeded(command, response)
+
+    # Buyruqlar alohida bajariladi (halt=0): xato bergani qayta urinishga qoladi, qolganlari yakunlanadi
+    async def _deliver_batch(self, commands):
+        cmd = {f"e{entry['id']}": f"{method}?{build_query(payload)}" for entry, method, payload, _ in commands}
+        try:
+            response = await self.client.call("batch", {"halt": 0, "cmd": cmd})
+        except BitrixError as e:
+            for command in commands:
+                await self._failed(command[0], e)
+            return
+        results = response.get("result") or {}
+        values, errors = results.get("result") or {}, results.get("result_error") or {}
+        logger.info(f"Bitrix24 batch: {len(commands)} ta buyruq, {len(errors)} ta xatolik")
+        for command in commands:
+            key = f"e{command[0]['id']}"
+            if key in values:
+                await self._succeeded(command, {"result": values[key]})
+                continue
+            error = errors.get(key) or {}
+            BITRIX_ERRORS.inc(command[1])
+            await self._failed(command[0], BitrixError(error.get("error_description") or error.get("error") or "javob yo'q"))
+
+    async def _failed(self, entry, error):
+        attempts = entry["attempts"] + 1
+        logger.error(f"Bitrix24'ga yuborishda xatolik (urinish {attempts}/{self.max_attempts}): {error}")
+        if attempts >= self.max_attempts:
+            self.storage.outbox_fail(entry["id"], attempts, str(error))
+            await self._notify(entry["context"], None, str(error))
+        else:
+            self.storage.outbox_retry(entry["id"], attempts, time.time() + self.backoff(attempts), str(error))
+
+    # Lead yozuvlarida kesh yangilanadi, natijada lead ID va bajarilgan amal (add/update/skip) beriladi
+    async def _succeeded(self, command, response):
+        entry, method, payload, fingerprint = command
+        context = entry["context"]
+        if fingerprint is not None:
+            lead_id = response.get("result") if method == LEAD_ADD else payload["id"]
+            if method is not None and lead_id:
+                self.storage.set_lead(context["phone"], lead_id, fingerprint)
+            context = {**context, "action": LEAD_ACTIONS[method]}
+            response = {"result": lead_id}
+            BITRIX_LEADS.inc(context["action"])
+        self.storage.outbox_done(entry["id"])
+        logger.info(f"Bitrix24 yozuvi #{entry['id']} yakunlandi ({context.get('action') or method}): {response}")
+        await self._notify(context, response, None)
+
+    async def _notify(self, context, response, error):
+        if self.on_result is None:
+            return
+        try:
+            await self.on_result(context, response, error)
+        except Exception as e:
+            logger.error(f"Bitrix24 natijasini yuborishda xatolik: {e}")
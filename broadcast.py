@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from metrics import BROADCAST_ACTIVE, BROADCAST_MESSAGES, BROADCAST_PROCESSED
+from responses import get_admin_menu, get_broadcast_buttons
+from sender import bulk_priority
+from stats import BROADCAST_BLOCKED, BROADCAST_SENT
+from texts import translations
+
+logger = logging.getLogger(__name__)
+
+# Post tarqatish vazifalari saqlash qatlamida turadi (status, kursor, hisoblagichlar).
+# Qabul qiluvchilar user_id tartibida partiyalab olinadi; partiya yuborilishidan OLDIN kursor
+# saqlanadi (storage.flush), shuning uchun qayta ishga tushganda hech kimga post ikki marta
+# bormaydi - to'xtash paytida yuborilayotgan partiyaning bir qismi yetkazilmay qolishi mumkin.
+#
+# Statuslar: scheduled -> running <-> paused, running -> done, (scheduled|running|paused) -> cancelled
+
+SCHEDULED = "scheduled"
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+DONE = "done"
+FINISHED = (CANCELLED, DONE)
+
+
+# "2026-01-31 09:00" yoki "18:30" (bugun, o'tib ketgan bo'lsa ertaga) -> epoch; noto'g'ri bo'lsa None
+def parse_start_time(text, now=None):
+    now = now or datetime.now()
+    text = text.strip()
+    for fmt in ("%Y-%m-%d %H:%M", "%d.%m.%Y %H:%M"):
+        try:
+            start = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return start.timestamp() if start > now else None
+    try:
+        clock = datetime.strptime(text, "%H:%M")
+    except ValueError:
+        return None
+    start = now.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+    if start <= now:
+        start += timedelta(days=1)
+    return start.timestamp()
+
+
+def progress_text(job):
+    t = translations[job["lang"]]
+    total = max(job["total"], job["processed"])
+    start_at = datetime.fromtimestamp(job["start_at"]).strftime("%Y-%m-%d %H:%M")
+    return t["broadcast_progress"].format(
+        id=job["id"], status=t["broadcast_status"][job["status"]].format(start_at=start_at),
+        processed=job["processed"], total=total, percent=round(100 * job["processed"] / total) if total else 100,
+        sent=job["sent"], failed=job["failed"]
+    )
+
+
+class BroadcastRunner:
+    def __init__(self, bot, storage, batch_size=100, progress_interval=5.0, poll_interval=None):
+        self.bot = bot
+        self.storage = storage
+        self.batch_size = max(1, batch_size)
+        self.progress_interval = progress_interval
+        self.poll_interval = poll_interval  # Boshqa jarayonlarda yaratilgan/o'zgartirilgan vazifalarni tekshirish
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    # Joriy partiya tugashi kutiladi (vazifa "running" holatida qoladi va keyingi ishga tushishda davom etadi)
+    async def close(self, timeout=30):
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        self._task = None
+
+    # Yangi vazifa (start_at berilmasa darhol boshlanadi): admin chatiga progress xabari yuboriladi,
+    # keyin shu xabar tahrirlab boriladi. `audience` - segment filtrlari (None - hamma).
+    async def create(self, admin_id, lang, content, start_at=None, audience=None):
+        status = SCHEDULED if start_at else RUNNING
+        job_id = self.storage.broadcast_add({
+            "admin_id": admin_id, "lang": lang, "content": content, "status": status, "audience": audience,
+            "start_at": start_at or time.time(), "total": self.storage.audience_count(audience)
+        })
+        job = self.storage.broadcast_get(job_id)
+        message = await self.bot.send_message(
+            admin_id, progress_text(job), reply_markup=get_broadcast_buttons(lang, job_id, status)
+        )
+        self.storage.broadcast_update(job_id, message_id=message.message_id)
+        self._wakeup.set()
+        logger.info(f"Post #{job_id} navbatga qo'yildi")
+        return job_id
+
+    # Admin tugmalari: pause / resume / cancel. Yakunlangan vazifa o'zgarmaydi.
+    async def control(self, job_id, action):
+        job = self.storage.broadcast_get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        if action == "pause" and job["status"] == RUNNING:
+            status = PAUSED
+        elif action == "resume" and job["status"] == PAUSED:
+            status = RUNNING
+        elif action == "cancel":
+            status = CANCELLED
+        else:
+            return job
+        self.storage.broadcast_update(job_id, status=status)
+        logger.info(f"Post #{job_id}: {job['status']} -> {status}")
+        job["status"] = status
+        await self._show_progress(job)
+        self._wakeup.set()
+        return job
+
+    async def _run(self):
+        while not self._closing:
+            self._wakeup.clear()
+            try:
+                job = self.storage.broadcast_due(time.time())
+                if job is not None:
+                    await self._run_job(job)
+                    continue
+            except Exception as e:
+                logger.error(f"Post tarqatish xatoligi: {e}")
+            next_at = self.storage.broadcast_next_start()
+            timeout = None if next_at is None else max(0.0, next_at - time.time())
+            if self.poll_interval is not None:
+                timeout = self.poll_interval if timeout is None else min(timeout, self.poll_interval)
+            if self._closing:
+                break
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_job(self, job):
+        if job["status"] == SCHEDULED:
+            # Rejalashtirilgandan beri auditoriya o'zgargan bo'lishi mumkin: qabul qiluvchilar qayta sanaladi
+            job["status"], job["total"] = RUNNING, self.storage.audience_count(job.get("audience"))
+            self.storage.broadcast_update(job["id"], status=RUNNING, total=job["total"])
+        if not job["processed"]:
+            logger.info(f"Post #{job['id']} tarqatish boshlandi ({job['total']} qabul qiluvchi)")
+        else:
+            logger.info(f"Post #{job['id']} {job['processed']} ta qabul qiluvchidan keyin davom ettirilmoqda")
+        BROADCAST_PROCESSED.set(job["processed"])
+        BROADCAST_ACTIVE.inc()
+        shown = 0.0
+        try:
+            recipients = self.storage.iter_recipients(after=job["cursor"], audience=job.get("audience"))
+            with bulk_priority():
+                while True:
+                    batch = [user_id for _, user_id in zip(range(self.batch_size), recipients)]
+                    if not batch:
+                        job["status"] = DONE
+                        break
+                    if self._closing:
+                        break
+                    # Pauza/bekor qilish boshqa jarayonda ham bosilgan bo'lishi mumkin
+                    status = self.storage.broadcast_get(job["id"])["status"]
+                    if status != RUNNING:
+                        job["status"] = status
+                        break
+                    job["cursor"] = batch[-1]
+                    job["processed"] += len(batch)
+                    self.storage.broadcast_update(job["id"], cursor=job["cursor"], processed=job["processed"])
+                    await self.storage.flush()
+                    results = await asyncio.gather(*(self._deliver(user_id, job["content"]) for user_id in batch))
+                    job["sent"] += sum(results)
+                    job["failed"] += len(results) - sum(results)
+                    self.storage.broadcast_update(job["id"], sent=job["sent"], failed=job["failed"])
+                    if time.monotonic() - shown >= self.progress_interval:
+                        shown = time.monotonic()
+                        await self._show_progress(job)
+        finally:
+            BROADCAST_ACTIVE.dec()
+        if job["status"] == DONE:
+            self.storage.broadcast_update(job["id"], status=DONE, finished_at=time.time())
+            logger.info(f"Post #{job['id']} yakunlandi: {job['sent']} yetkazildi, {job['failed']} yetkazilmadi")
+            await self._notify_done(job)
+        await self._show_progress(job)
+
+    async def _deliver(self, user_id, content):
+        try:
+            if content["photo"]:
+                await self.bot.send_photo(user_id, content["photo"], caption=content["text"] or "")
+            elif content["video"]:
+                await self.bot.send_video(user_id, content["video"], caption=content["text"] or "")
+            elif content["text"]:
+                await self.bot.send_message(user_id, content["text"])
+            BROADCAST_MESSAGES.inc("sent")
+            self.storage.add_stat(BROADCAST_SENT)
+            return True
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Faqat botni bloklagan yoki mavjud bo'lmagan chatlar keyingi postlardan chiqariladi
+            if isinstance(e, TelegramBadRequest) and "chat not found" not in e.message.lower():
+                return self._failed(user_id, e)
+            BROADCAST_MESSAGES.inc("blocked")
+            self.storage.add_stat(BROADCAST_BLOCKED)
+            self.storage.block_user(user_id)
+            return False
+        except Exception as e:
+            # Tarmoq xatolari, tugagan RetryAfter urinishlari va h.k. - foydalanuvchi bloklanmaydi
+            return self._failed(user_id, e)
+        finally:
+            BROADCAST_PROCESSED.inc()
+
+    def _failed(self, user_id, error):
+        logger.error("Post yuborishda xatolik (user_id: %s): %s", user_id, error)
+        BROADCAST_MESSAGES.inc("failed")
+        return False
+
+    async def _show_progress(self, job):
+        if not job.get("message_id"):
+            return
+        try:
+            await self.bot.edit_message_text(
+                progress_text(job), chat_id=job["admin_id"], message_id=job["message_id"],
+                reply_markup=get_broadcast_buttons(job["lang"], job["id"], job["status"])
+            )
+        except Exception as e:
+            logger.warning(f"Post #{job['id']} progress xabarini yangilab bo'lmadi: {e}")
+
+    async def _notify_done(self, job):
+        try:
+            await self.bot.send_message(
+                job["admin_id"], translations[job["lang"]]["post_sent"].format(count=job["sent"]),
+                reply_markup=get_admin_menu(job["lang"])
+            )
+        except Exception as e:
+            logger.error(f"Post #{job['id']} natijasini adminga yuborishda xatolik: {e}")
@@ -0,0 +1,244 @@
+import json
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+from metrics import FSM_ENTRIES, FSM_EVICTIONS
+from storage import connect_sqlite, retry_locked
+
+FSM_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm_state (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL
+);
+"""
+FSM_COLUMNS = [("expires_at", "REAL")]
+
+
+# Suhbat holatining yashash muddati: oxirgi yozuvdan `ttl` soniya o'tsa holat va qoralama
+# ma'lumotlari o'chiriladi, `keep` dagi kalitlar (masalan, til) saqlanib qoladi.
+# Holatsiz va qoralamasiz yozuv muddatsiz.
+class ExpiryPolicy:
+    def __init__(self, default_ttl=None, keep=()):
+        self.default_ttl = default_ttl
+        self.keep = tuple(keep)
+        self.ttls = {}
+
+    def set_ttl(self, state, ttl):
+        self.ttls[state.state if isinstance(state, State) else state] = ttl
+
+    def ttl(self, state, data):
+        if state is None and not set(data) - set(self.keep):
+            return None
+        return self.ttls.get(state, self.default_ttl)
+
+    def kept(self, data):
+        return {key: data[key] for key in self.keep if key in data}
+
+
+def _state_name(state):
+    return state.state if isinstance(state, State) else state
+
+
+# Xotiradagi FSM ombori: yozuvlar soni `max_entries` bilan cheklangan (eng eski ishlatilgani chiqariladi),
+# muddati o'tganlar o'qishda yoki taymer g'ildiragi orqali tozalanadi (har bir kalit uchun alohida vazifa yo'q).
+class ExpiringMemoryStorage(BaseStorage):
+    def __init__(self, expiry=None, max_entries=100000, granularity=10.0):
+        self.expiry = expiry or ExpiryPolicy()
+        self.max_entries = max_entries
+        self.granularity = granularity
+        self._records = OrderedDict()  # key -> [state, data, expires_at]
+        self._wheel = {}  # g'ildirak katagi -> shu oraliqda muddati tugaydigan kalitlar
+        self._cursor = self._slot(time.monotonic())
+        FSM_ENTRIES.set_function(lambda: len(self._records))
+
+    def _slot(self, moment):
+        return int(moment // self.granularity)
+
+    def _schedule(self, key, old, new):
+        if old is not None:
+            keys = self._wheel.get(self._slot(old))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._wheel[self._slot(old)]
+        if new is not None:
+            self._wheel.setdefault(self._slot(new), set()).add(key)
+
+    def _expire(self, key, record):
+        FSM_EVICTIONS.inc("expired")
+        self._schedule(key, record[2], None)
+        kept = self.expiry.kept(record[1])
+        if kept:
+            record[:] = [None, kept, None]
+        else:
+            del self._records[key]
+
+    # To'liq o'tib ketgan kataklar tozalanadi; joriy katakdagilar o'qishda tekshiriladi
+    def _sweep(self, now):
+        current = self._slot(now)
+        while self._cursor < current:
+            for key in self._wheel.pop(self._cursor, ()):
+                record = self._records.get(key)
+                if record is not None and record[2] is not None and record[2] <= now:
+                    self._expire(key, record)
+            self._cursor += 1
+
+    def _get(self, key):
+        record = self._records.get(key)
+        if record is not None and record[2] is not None and record[2] <= time.monotonic():
+            self._expire(key, record)
+            record = self._records.get(key)
+        if record is not None:
+            self._records.move_to_end(key)
+        return record
+
+    def _write(self, key, state, data):
+        now = time.monotonic()
+        self._sweep(now)
+        record = self._records.get(key)
+        old = record[2] if record is not None else None
+        if state is None and not data:
+            if record is not None:
+                self._schedule(key, old, None)
+                del self._records[key]
+            return
+        ttl = self.expiry.ttl(state, data)
+        expires_at = now + ttl if ttl else None
+        self._schedule(key, old, expires_at)
+        self._records[key] = [state, data, expires_at]
+        self._records.move_to_end(key)
+        while len(self._records) > self.max_entries:
+            evicted, record = self._records.popitem(last=False)
+            self._schedule(evicted, record[2], None)
+            FSM_EVICTIONS.inc("lru")
+
+    async def close(self):
+        pass
+
+    async def set_state(self, key, state=None):
+        record = self._get(key)
+        self._write(key, _state_name(state), record[1] if record else {})
+
+    async def get_state(self, key):
+        record = self._get(key)
+        return record[0] if record else None
+
+    async def set_data(self, key, data):
+        record = self._get(key)
+        self._write(key, record[0] if record else None, dict(data))
+
+    async def get_data(self, key):
+        record = self._get(key)
+        return dict(record[1]) if record else {}
+
+
+# SQLite'dagi FSM ombori: holat har bir foydalanuvchi uchun so'rov paytida o'qiladi
+# (hammasi xotirada saqlanmaydi), qayta ishga tushirishdan keyin ham saqlanib qoladi
+# va bir nechta jarayon bitta bazadan foydalana oladi.
+# Muddati o'tgan yozuvlar o'qishda e'tiborga olinmaydi va `sweep_interval` da bir marta tozalanadi.
+class SqliteFSMStorage(BaseStorage):
+    def __init__(self, path, key_builder=None, expiry=None, sweep_interval=60.0, busy_timeout=5000):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self.expiry = expiry or ExpiryPolicy()
+        self.sweep_interval = sweep_interval
+        self.conn = None
+        self._next_sweep = 0.0
+
+    # Ulanish birinchi so'rovda ochiladi (asosiy ombor bazani yaratib/ko'chirib bo'lgandan keyin)
+    def _db(self):
+        if self.conn is None:
+            self.conn = connect_sqlite(self.path, self.busy_timeout)
+            self.conn.executescript(FSM_SCHEMA)
+            for column, ddl in FSM_COLUMNS:
+                if column not in {row[1] for row in self.conn.execute("PRAGMA table_info(fsm_state)")}:
+                    self.conn.execute(f"ALTER TABLE fsm_state ADD COLUMN {column} {ddl}")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_state_expires ON fsm_state (expires_at)")
+        return self.conn
+
+    async def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    # Muddati o'tgan yozuv o'rniga faqat saqlanadigan kalitlar qaytariladi
+    def _row(self, key):
+        row = self._db().execute(
+            "SELECT state, data, expires_at FROM fsm_state WHERE key = ?", (self.key_builder.build(key),)
+        ).fetchone()
+        if row is None:
+            return None
+        state, data, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            return None, json.dumps(self.expiry.kept(json.loads(data)))
+        return state, data
+
+    def _write(self, key, state, data):
+        db_key = self.key_builder.build(key)
+        now = time.time()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.sweep(now)
+        # Bo'sh yozuvlar saqlanmaydi: jadval faqat faol suhbatlar hajmida qoladi
+        if state is None and not data:
+            self._db().execute("DELETE FROM fsm_state WHERE key = ?", (db_key,))
+            return
+        ttl = self.expiry.ttl(state, data)
+        self._db().execute(
+            "INSERT INTO fsm_state (key, state, data, updated_at, expires_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+            "updated_at = excluded.updated_at, expires_at = excluded.expires_at",
+            (db_key, state, json.dumps(data, ensure_ascii=False), now, now + ttl if ttl else None)
+        )
+
+    # Muddati o'tgan yozuvlardan faqat saqlanadigan kalitlar qoladi (qolmasa qator o'chiriladi)
+    def sweep(self, now=None, limit=1000):
+        db = self._db()
+        rows = db.execute(
+            "SELECT key, data FROM fsm_state WHERE expires_at <= ? LIMIT ?", (now or time.time(), limit)
+        ).fetchall()
+        if not rows:
+            return 0
+        with db:
+            db.execute("BEGIN")
+            for db_key, data in rows:
+                kept = self.expiry.kept(json.loads(data))
+                if kept:
+                    db.execute(
+                        "UPDATE fsm_state SET state = NULL, data = ?, expires_at = NULL WHERE key = ?",
+                        (json.dumps(kept, ensure_ascii=False), db_key)
+                    )
+                else:
+                    db.execute("DELETE FROM fsm_state WHERE key = ?", (db_key,))
+        FSM_EVICTIONS.inc("expired", amount=len(rows))
+        return len(rows)
+
+    async def set_state(self, key, state=None):
+        state = state.state if isinstance(state, State) else state
+        await retry_locked(self._write, key, state, await self.get_data(key))
+
+    async def get_state(self, key):
+        row = self._row(key)
+        return row[0] if row else None
+
+    async def set_data(self, key, data):
+        await retry_locked(self._write, key, await self.get_state(key), dict(data))
+
+    async def get_data(self, key):
+        row = self._row(key)
+        return json.loads(row[1]) if row else {}
+
+
+# FSM_STORAGE sozlamasiga qarab ombor tanlash: "sqlite" yoki "memory"
+def create_fsm_storage(backend, db_path, expiry=None, max_entries=100000, busy_timeout=5000):
+    if backend == "memory":
+        return ExpiringMemoryStorage(expiry, max_entries=max_entries)
+    if backend == "sqlite":
+        return SqliteFSMStorage(db_path, expiry=expiry, busy_timeout=busy_timeout)
+    raise ValueError(f"Noma'lum FSM ombori: {backend}")
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from metrics import INTAKE_QUEUE_DEPTH, INTAKE_SHED, INTAKE_WAIT_SECONDS
+from workers import update_user_id
+
+logger = logging.getLogger(__name__)
+
+SHED_REJECT = "reject"  # 503 qaytariladi, Telegram keyinroq qayta yuboradi (backpressure)
+SHED_DROP = "drop"  # 200 qaytariladi, update tashlab yuboriladi
+
+
+# Webhook'ni darhol tasdiqlash: update'lar chegaralangan navbatga qo'yiladi va
+# ishchilar tomonidan qayta ishlanadi. Bitta foydalanuvchining update'lari qat'iy
+# tartibda va hech qachon bir vaqtda ishlanmaydi (foydalanuvchi holati uchun qulf vazifasini bajaradi).
+class UpdateIntake:
+    def __init__(self, dispatcher, bot, workers=32, max_queue=2000, max_per_user=20, shed_policy=SHED_REJECT, **data):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.shed_policy = shed_policy
+        self.data = data
+        self.pending = 0
+        self._users = {}
+        self._ready = asyncio.Queue()
+        self._tasks = []
+        INTAKE_QUEUE_DEPTH.set_function(lambda: self.pending)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.pending:
+            logger.warning(f"Navbatda {self.pending} ta update qayta ishlanmay qoldi")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # Update navbatga qo'yilsa True, yuklama tufayli rad etilsa False
+    def submit(self, update):
+        if self.pending >= self.max_queue:
+            INTAKE_SHED.inc("queue_full")
+            return False
+        key = update_user_id(update)
+        updates = self._users.get(key)
+        if updates is None:
+            updates = self._users[key] = deque()
+            self._ready.put_nowait(key)
+        elif len(updates) >= self.max_per_user:
+            INTAKE_SHED.inc("user_full")
+            return False
+        updates.append((time.monotonic(), update))
+        self.pending += 1
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            updates = self._users[key]
+            queued_at, update = updates.popleft()
+            INTAKE_WAIT_SECONDS.observe(time.monotonic() - queued_at)
+            try:
+                result = await self.dispatcher.feed_raw_update(self.bot, update, **self.data)
+                if isinstance(result, TelegramMethod):
+                    await self.dispatcher.silent_call_request(bot=self.bot, result=result)
+            except Exception as e:
+                logger.error(f"Update'ni qayta ishlashda xatolik (user {key}): {e}")
+            finally:
+                self.pending -= 1
+                # Foydalanuvchining keyingi update'i faqat oldingisi tugagach navbatga qaytadi
+                if updates:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._users[key]
+
+
+class IntakeRequestHandler(SimpleRequestHandler):
+    def __init__(self, intake, **kwargs):
+        super().__init__(dispatcher=intake.dispatcher, bot=intake.bot, **kwargs)
+        self.intake = intake
+
+    def register(self, app, /, path, **kwargs):
+        app.on_startup.append(self._start_intake)
+        super().register(app, path=path, **kwargs)
+
+    async def _start_intake(self, app):
+        self.intake.start()
+
+    async def close(self):
+        await self.intake.close()
+        await super().close()
+
+    async def handle(self, request):
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+        update = await request.json(loads=bot.session.json_loads)
+        if not self.intake.submit(update) and self.intake.shed_policy == SHED_REJECT:
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.json_response({}, dumps=bot.session.json_dumps)
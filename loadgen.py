@@ -0,0 +1,401 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+from texts import translations, SERVICE_BUTTONS
+
+# Yuklama generatori: botning haqiqiy webhook'iga update'lar yuboradi,
+# bot esa api.telegram.org o'rniga shu yerdagi soxta Bot API serveriga murojaat qiladi.
+
+CODE_RE = re.compile(r"\b(\d{4})\b")
+BROADCAST_TEXT = "loadgen broadcast"
+USER_ID_BASE = 7_000_000_000
+FILE_SIZE = 256 * 1024
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Soxta Bot API: kechikish, 429 (retry_after) va "bot was blocked" xatolarini qo'sha oladi
+class FakeTelegramAPI:
+    def __init__(self, latency=0.03, jitter=0.02, retry_after_rate=0.0, retry_after=1, blocked_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.blocked_rate = blocked_rate
+        self.calls = Counter()
+        self.injected = Counter()
+        self.webhook_url = ""
+        self._message_ids = itertools.count(1)
+        self._waiters = {}
+        self.ready = asyncio.Event()
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        app.router.add_get("/file/bot{token}/{path:.*}", self.download)
+        return app
+
+    # Fayl mazmuni file_id oxiridan olinadi: turli foydalanuvchilarning bir xil slotdagi hujjatlari bir xil
+    async def download(self, request):
+        self.calls["download"] += 1
+        seed = request.match_info["path"].rsplit("/", 1)[-1][-11:].encode()
+        return web.Response(body=(seed * (FILE_SIZE // len(seed) + 1))[:FILE_SIZE],
+                            content_type="application/octet-stream")
+
+    # Keyingi chiquvchi xabarni kutish (predicate mos kelganini)
+    def expect(self, chat_id, predicate=None):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(str(chat_id), []).append((predicate, future))
+        return future
+
+    def _deliver(self, chat_id, method, text):
+        waiters = self._waiters.get(chat_id)
+        if not waiters or text.startswith(BROADCAST_TEXT):
+            return
+        for item in waiters:
+            predicate, future = item
+            if future.done():
+                continue
+            if predicate is None or predicate(method, text):
+                future.set_result((method, text))
+                waiters.remove(item)
+                return
+
+    def _message(self, chat_id, text=""):
+        chat = {"id": int(chat_id), "type": "private"} if chat_id.lstrip("-").isdigit() else \
+            {"id": -1001, "type": "channel", "username": chat_id.lstrip("@")}
+        return {"message_id": next(self._message_ids), "date": int(time.time()), "chat": chat, "text": text}
+
+    async def handle(self, request):
+        method = request.match_info["method"].lower()
+        form = await request.post()
+        self.calls[method] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        chat_id = form.get("chat_id")
+        if chat_id is not None and method.startswith("send"):
+            if random.random() < self.retry_after_rate:
+                self.injected["retry_after"] += 1
+                return web.json_response({
+                    "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after}
+                })
+            if random.random() < self.blocked_rate:
+                self.injected["blocked"] += 1
+                return web.json_response({"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"})
+        return web.json_response({"ok": True, "result": self.result(method, form)})
+
+    def result(self, method, form):
+        chat_id = str(form.get("chat_id", ""))
+        text = form.get("text") or form.get("caption") or ""
+        if method == "getme":
+            return {"id": 1, "is_bot": True, "first_name": "loadgen", "username": "loadgen_bot"}
+        if method == "setwebhook":
+            self.webhook_url = form.get("url", "")
+            self.ready.set()
+            return True
+        if method == "getfile":
+            file_id = form.get("file_id", "")
+            return {"file_id": file_id, "file_unique_id": file_id[-16:], "file_size": FILE_SIZE,
+                    "file_path": f"documents/{file_id}"}
+        if method == "getwebhookinfo":
+            return {"url": self.webhook_url, "has_custom_certificate": False, "pending_update_count": 0}
+        if method == "sendmediagroup":
+            media = json.loads(form.get("media", "[]"))
+            return [self._message(chat_id, item.get("caption", "")) for item in media]
+        if method.startswith("send") or method == "editmessagetext":
+            self._deliver(chat_id, method, text)
+            return self._message(chat_id, text)
+        return True
+
+
+def message_update(update_id, user_id, text=None, photo=None, document=None):
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"u{user_id}"}
+    }
+    if text is not None:
+        message["text"] = text
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    if photo is not None:
+        message["photo"] = [{"file_id": photo, "file_unique_id": photo[-16:], "width": 800, "height": 600}]
+    if document is not None:
+        message["document"] = {"file_id": document, "file_unique_id": document[-16:], "file_name": "doc.pdf",
+                               "mime_type": "application/pdf"}
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id, user_id, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+            "message": {"message_id": 1, "date": int(time.time()), "chat": {"id": user_id, "type": "private"}, "text": "x"}
+        }
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.updates = 0
+        self.acks = []
+        self.responses = []
+        self.timeouts = 0
+        self.errors = Counter()
+        self.scenarios = Counter()
+
+
+# Bitta virtual foydalanuvchi: har bir qadamda botning javobini kutadi
+class VirtualUser:
+    update_ids = itertools.count(1)
+
+    def __init__(self, user_id, http, webhook_url, api, stats, admin_code, timeout):
+        self.user_id = user_id
+        self.http = http
+        self.webhook_url = webhook_url
+        self.api = api
+        self.stats = stats
+        self.admin_code = admin_code
+        self.timeout = timeout
+        self.lang = random.choice(list(translations))
+        self.t = translations[self.lang]
+
+    async def step(self, update, expect=True, predicate=None):
+        waiter = self.api.expect(self.user_id, predicate) if expect else None
+        started = time.perf_counter()
+        try:
+            async with self.http.post(self.webhook_url, json=update) as response:
+                await response.read()
+                status = response.status
+        except aiohttp.ClientError as e:
+            self.stats.errors[type(e).__name__] += 1
+            status = None
+        if status != 200:
+            # Rad etilgan (masalan, yuklama tufayli 503) update'ga javob kutilmaydi
+            if status is not None:
+                self.stats.errors[f"http_{status}"] += 1
+            if waiter is not None:
+                waiter.cancel()
+            return None
+        self.stats.updates += 1
+        self.stats.acks.append(time.perf_counter() - started)
+        if waiter is None:
+            return None
+        try:
+            result = await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            return None
+        self.stats.responses.append(time.perf_counter() - started)
+        return result
+
+    def text(self, text):
+        return message_update(next(self.update_ids), self.user_id, text=text)
+
+    def callback(self, data):
+        return callback_update(next(self.update_ids), self.user_id, data)
+
+    async def start(self):
+        await self.step(self.text("/start"))
+        await self.step(self.callback(f"lang_{self.lang}"))
+
+    async def register(self):
+        await self.start()
+        await self.step(self.text("Load Test"))
+        reply = await self.step(self.text("+998 90 123 45 67"), predicate=lambda method, text: CODE_RE.search(text))
+        if reply is None:
+            return
+        await self.step(self.text(CODE_RE.search(reply[1]).group(1)))
+        await self.step(self.text(self.t["menu"][0]))
+        for slot in range(len(self.t["registration_questions"])):
+            file_id = f"AgACAgIAAxk{self.user_id}{slot:04d}loadgen"
+            if slot % 2:
+                update = message_update(next(self.update_ids), self.user_id, document=file_id)
+            else:
+                update = message_update(next(self.update_ids), self.user_id, photo=file_id)
+            await self.step(update)
+        await self.step(self.callback("confirm_registration"))
+
+    async def browse(self):
+        await self.start()
+        for text in random.sample([*self.t["menu"][1:], *SERVICE_BUTTONS[self.lang], self.t["home"]], 4):
+            await self.step(self.text(text))
+
+    async def broadcast(self):
+        await self.step(self.text("/admin"))
+        await self.step(self.text(self.admin_code))
+        await self.step(self.text(self.t["admin_menu"][1]))
+        await self.step(self.text(f"{BROADCAST_TEXT} {self.user_id}"), expect=False)
+        await self.step(self.callback("confirm_post"), expect=False)
+
+
+SCENARIOS = ("start", "register", "browse", "broadcast")
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Noma'lum ssenariy: {name} ({', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def run_load(args, api, webhook_url):
+    stats = Stats()
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + args.duration
+    user_ids = itertools.count(USER_ID_BASE)
+    calls_before = sum(api.calls.values())
+
+    async def worker(http):
+        while time.monotonic() < deadline:
+            scenario = random.choices(names, weights)[0]
+            user = VirtualUser(next(user_ids), http, webhook_url, api, stats, args.admin_code, args.timeout)
+            stats.scenarios[scenario] += 1
+            await getattr(user, scenario)()
+
+    started = time.monotonic()
+    connector = aiohttp.TCPConnector(limit=args.users)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        await asyncio.gather(*(worker(http) for _ in range(args.users)))
+    elapsed = time.monotonic() - started
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    outbound = sum(api.calls.values()) - calls_before
+    return {
+        "users": args.users,
+        "duration_s": round(elapsed, 2),
+        "updates": stats.updates,
+        "updates_per_s": round(stats.updates / elapsed, 1),
+        "webhook_ack_ms": {"p50": ms(percentile(stats.acks, 0.5)), "p99": ms(percentile(stats.acks, 0.99))},
+        "response_ms": {"p50": ms(percentile(stats.responses, 0.5)), "p99": ms(percentile(stats.responses, 0.99))},
+        "response_timeouts": stats.timeouts,
+        "outbound_calls_per_s": round(outbound / elapsed, 1),
+        "outbound_by_method": dict(api.calls.most_common()),
+        "injected_errors": dict(api.injected),
+        "scenarios": dict(stats.scenarios),
+        "errors": dict(stats.errors)
+    }
+
+
+# main.py ni alohida jarayonda, vaqtinchalik katalogda ishga tushirish
+def spawn_bot(args, api_url, port):
+    workdir = tempfile.mkdtemp(prefix="loadgen-")
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN="123456:LOADGEN",
+        TELEGRAM_API_URL=api_url,
+        WEBHOOK_URL=f"http://127.0.0.1:{port}/webhook",
+        PORT=str(port),
+        ADMIN_CODE=args.admin_code,
+        BITRIX_WEBHOOK_URL=args.bitrix_url,
+        LOG_LEVEL=args.bot_log_level
+    )
+    # Virtual foydalanuvchilar odamdan tezroq yozadi: flood cheklovi alohida yoqilmasa o'chiriladi
+    env.setdefault("THROTTLE_LIMITS", "")
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    process = subprocess.Popen([sys.executable, main_path], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process, workdir
+
+
+async def wait_for_webhook(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as http:
+        while time.monotonic() < deadline:
+            try:
+                async with http.get(url) as response:
+                    if response.status in (200, 405):
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"Webhook {url} {timeout}s ichida javob bermadi")
+
+
+async def main(args):
+    api = FakeTelegramAPI(latency=args.latency / 1000, jitter=args.jitter / 1000, retry_after_rate=args.retry_after_rate,
+                          retry_after=args.retry_after, blocked_rate=args.blocked_rate)
+    runner = web.AppRunner(api.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.api_port).start()
+    api_url = f"http://127.0.0.1:{args.api_port}"
+
+    process = None
+    webhook_url = args.webhook_url
+    if webhook_url is None:
+        port = free_port()
+        process, workdir = spawn_bot(args, api_url, port)
+        webhook_url = f"http://127.0.0.1:{port}/webhook"
+        print(f"Bot ishga tushirildi (pid {process.pid}, katalog {workdir})", file=sys.stderr)
+    else:
+        print(f"Bot TELEGRAM_API_URL={api_url} bilan ishga tushirilgan bo'lishi kerak", file=sys.stderr)
+    try:
+        await wait_for_webhook(webhook_url)
+        report = await run_load(args, api, webhook_url)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        await runner.cleanup()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Webhook yuklama generatori (soxta Telegram Bot API bilan)")
+    parser.add_argument("--users", type=int, default=50, help="Bir vaqtdagi virtual foydalanuvchilar")
+    parser.add_argument("--duration", type=float, default=30, help="Test davomiyligi (soniya)")
+    parser.add_argument("--mix", default="start=4,register=2,browse=3.5,broadcast=0.5",
+                        help="Ssenariylar ulushi: start, register, browse, broadcast")
+    parser.add_argument("--webhook-url", help="Ishlab turgan bot webhook'i (berilmasa main.py ishga tushiriladi)")
+    parser.add_argument("--api-port", type=int, default=8081, help="Soxta Bot API porti")
+    parser.add_argument("--latency", type=float, default=30, help="Soxta API kechikishi (ms)")
+    parser.add_argument("--jitter", type=float, default=20, help="Kechikish tarqoqligi (ms)")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="429 javoblar ulushi")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 javobdagi retry_after (s)")
+    parser.add_argument("--blocked-rate", type=float, default=0.0, help="\"bot was blocked\" javoblar ulushi")
+    parser.add_argument("--timeout", type=float, default=15, help="Bot javobini kutish chegarasi (s)")
+    parser.add_argument("--admin-code", default="loadgen-admin")
+    parser.add_argument("--bitrix-url", default="http://127.0.0.1:9/", help="Bitrix24 webhook (standart: yopiq port)")
+    parser.add_argument("--bot-log-level", default="WARNING")
+    parser.add_argument("--output", help="Hisobotni JSON faylga yozish")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from datetime import datetime
+
+# Joriy update foydalanuvchisi: middleware o'rnatadi, har bir log yozuviga qo'shiladi
+log_user_id = contextvars.ContextVar("log_user_id", default=None)
+
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        if getattr(record, "user_id", None) is None:
+            user_id = log_user_id.get()
+            if user_id is not None:
+                record.user_id = user_id
+        return True
+
+
+# Sershovqin loggerlar uchun tanlab olish (sampling) va soniyasiga yozuvlar chegarasi.
+# WARNING va undan yuqori darajalar hech qachon tashlab yuborilmaydi.
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates=None, rate_cap=0):
+        super().__init__()
+        self.rates = rates or {}
+        self.rate_cap = rate_cap
+        self.dropped = 0
+        self._windows = {}
+
+    # "aiogram.event" uchun "aiogram.event", keyin "aiogram" sozlamasi qidiriladi
+    def _rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate < 1.0 and random.random() >= rate:
+            self.dropped += 1
+            return False
+        if self.rate_cap:
+            second = int(record.created)
+            window = self._windows.get(record.name)
+            if window is None or window[0] != second:
+                window = self._windows[record.name] = [second, 0]
+            window[1] += 1
+            if window[1] > self.rate_cap:
+                self.dropped += 1
+                return False
+        return True
+
+
+# "aiogram.event=0.1,main=0.5" -> {"aiogram.event": 0.1, "main": 0.5}
+def parse_sample_rates(value):
+    rates = {}
+    for item in (value or "").split(","):
+        name, _, rate = item.strip().partition("=")
+        if name and rate:
+            rates[name] = float(rate)
+    return rates
+
+
+# Bir qatorda bitta JSON yozuv; `extra=` bilan berilgan maydonlar ham qo'shiladi
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# Event loop faqat yozuvni navbatga qo'yadi; formatlash va disk I/O
+# QueueListener oqimida bajariladi (tashlab yuborilgan yozuvlar umuman formatlanmaydi).
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(path, level=logging.INFO, max_bytes=10 * 1024 * 1024, backups=5, sample_rates=None, rate_cap=0):
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    records = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(records)
+    queue_handler.addFilter(SamplingFilter(sample_rates, rate_cap))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(records, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,320 +1,214 @@
 import asyncio
+import html
 import logging
-import json
 import os
 import random
-import requests
+import time
 from aiogram import Bot, Dispatcher, types, F, Router
 from aiogram.client.default import DefaultBotProperties
-from aiogram.filters import Command, Filter
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.filters import Command, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.memory import SimpleEventIsolation
+from aiogram.types import InputMediaPhoto, InputMediaDocument
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from archive import DocumentArchive
+from audience import FILTERS as AUDIENCE_FILTERS, empty_audience, next_value
+from broadcast import BroadcastRunner, parse_start_time
+from bitrix import LEAD_ADD, BitrixClient, BitrixOutbox, build_lead_payload
+from fsm_storage import ExpiryPolicy, create_fsm_storage
+from intake import IntakeRequestHandler, UpdateIntake
+from logs import log_user_id, parse_sample_rates, setup_logging
+from metrics import (
+    REGISTRY, ApiMetricsMiddleware, HandlerMetricsMiddleware, SEND_QUEUE_DEPTH, BITRIX_OUTBOX_DEPTH
+)
+from registration import FIELDS as REGISTRATION_FIELDS, Registration, normalize_phone
+from routing import MenuAction, menu_action, MAIN_MENU_ACTIONS
+from responses import (
+    LANGUAGES, PreparedMarkupSession, screen, get_language_menu, get_main_menu, get_registration_nav,
+    get_admin_menu, get_confirm_buttons, get_profile_buttons, get_post_confirm_buttons, get_page_buttons
+)
+from sender import SendScheduler, SchedulerMiddleware
+from stats import (
+    APPLICATIONS, DOCUMENTS, MAU, VERIFY_FAILED, WAU, collect
+)
+from storage import create_storage, retry_locked
+from texts import translations
+from throttle import ThrottleMiddleware, parse_limits
+from workers import run_dispatcher, watch_parent
 
 # .env faylidan sozlamalarni yuklash
 load_dotenv()
 
 # Bot sozlamalari
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # Lokal Bot API server yoki yuklama testi uchun soxta API (loadgen.py)
 ADMIN_CODE = os.getenv("ADMIN_CODE", "Q1w2e3r4+")
 DATA_FILE = "bot_data.json"
+DB_FILE = os.getenv("DB_FILE", "bot_data.db")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")  # "sqlite" yoki "json"
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")  # Suhbat holatlari: "sqlite" yoki "memory"
+FSM_CODE_TTL = int(os.getenv("FSM_CODE_TTL", 600))  # Tasdiqlash va admin kodini kutish muddati (soniya)
+FSM_DRAFT_TTL = int(os.getenv("FSM_DRAFT_TTL", 24 * 3600))  # Tugallanmagan ro'yxatdan o'tish va post qoralamalari (soniya)
+FSM_MAX_ENTRIES = int(os.getenv("FSM_MAX_ENTRIES", 100000))  # memory: xotiradagi suhbatlar chegarasi (eng eskisi chiqariladi)
 CHANNEL_ID = os.getenv("CHANNEL_ID", "@crm_tekshiruv")
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "documents")  # Hujjatlar arxivi papkasi (bo'sh qiymat - arxivlash o'chirilgan)
 WEBHOOK_PATH = "/webhook"
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 WEBAPP_HOST = "0.0.0.0"
 WEBAPP_PORT = int(os.getenv("PORT", 8080))
-BITRIX_WEBHOOK_URL = "https://pbsimpex.bitrix24.ru/rest/56/d73iwlisd80cv79z/"  # Bitrix24 webhook URL
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")  # Prometheus metrikalari (bo'sh qiymat - o'chirilgan)
+BITRIX_WEBHOOK_URL = os.getenv("BITRIX_WEBHOOK_URL", "https://pbsimpex.bitrix24.ru/rest/56/d73iwlisd80cv79z/")  # Bitrix24 webhook URL
+BITRIX_MAX_ATTEMPTS = int(os.getenv("BITRIX_MAX_ATTEMPTS", 10))  # Lead yuborish urinishlari (eksponensial kutish bilan)
+BITRIX_BATCH_SIZE = int(os.getenv("BITRIX_BATCH_SIZE", 50))  # Navbat to'planganda bitta batch so'rovidagi leadlar (Bitrix24 chegarasi 50)
+SAVE_INTERVAL = float(os.getenv("SAVE_INTERVAL", 5))  # JSON backend: saqlanmagan o'zgarish necha soniyagacha xotirada turishi mumkin
+SAVE_MAX_DIRTY = int(os.getenv("SAVE_MAX_DIRTY", 500))  # JSON backend: shuncha o'zgarish yig'ilsa darhol saqlanadi
+ACTIVITY_KEEP_DAYS = int(os.getenv("ACTIVITY_KEEP_DAYS", 35))  # Shuncha kundan eski faollik oylik bitmapga siqiladi
+ACTIVITY_KEEP_MONTHS = int(os.getenv("ACTIVITY_KEEP_MONTHS", 24))  # Shuncha oydan eski oylardan faqat MAU soni qoladi
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))  # Log fayli shu hajmga yetganda aylantiriladi
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", 5))  # Saqlanadigan eski log fayllari soni
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "aiogram.event=0.1")  # INFO/DEBUG yozuvlarning qaysi ulushi yoziladi (logger=ulush,...)
+LOG_RATE_CAP = int(os.getenv("LOG_RATE_CAP", 50))  # Bitta logger uchun soniyasiga INFO/DEBUG yozuvlar chegarasi (0 - cheklovsiz)
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 30))  # Telegram'ga soniyasiga umumiy xabarlar soni
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", 1))  # Bitta chatga soniyasiga xabarlar soni
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", 8))  # Parallel yuboruvchilar soni
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 100))  # Post tarqatishda bir vaqtda navbatdagi xabarlar (kursor shu partiyalar bilan saqlanadi)
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", 5))  # Progress xabari necha soniyada yangilanadi
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 10))  # Admin qidiruvida bir sahifadagi natijalar
+INTAKE_WORKERS = int(os.getenv("INTAKE_WORKERS", 32))  # Update'larni qayta ishlovchi vazifalar (0 - aiogram'ning oddiy handleri)
+INTAKE_MAX_QUEUE = int(os.getenv("INTAKE_MAX_QUEUE", 2000))  # Navbatdagi update'lar chegarasi
+INTAKE_MAX_PER_USER = int(os.getenv("INTAKE_MAX_PER_USER", 20))  # Bitta foydalanuvchining navbatdagi update'lari chegarasi
+INTAKE_SHED = os.getenv("INTAKE_SHED", "reject")  # Navbat to'lganda: "reject" (503, Telegram qayta yuboradi) yoki "drop"
+THROTTLE_LIMITS = os.getenv("THROTTLE_LIMITS", "message=1/8,callback_query=2/10")  # Foydalanuvchi limiti: tur=soniyasiga/zaxira (bo'sh - o'chirilgan)
+THROTTLE_MUTE = int(os.getenv("THROTTLE_MUTE", 30))  # Limitdan oshgan foydalanuvchi necha soniya jim qilinadi
+THROTTLE_MAX_USERS = int(os.getenv("THROTTLE_MAX_USERS", 10000))  # Xotirada saqlanadigan limiter holatlari (LRU)
+WORKERS = int(os.getenv("WORKERS", 1))  # Ishchi jarayonlar soni (>1 bo'lsa SQLite backend kerak)
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 250))  # SQLite qulfini kutish (ms), keyin yozuv qayta uriniladi
+WORKER_BASE_PORT = int(os.getenv("WORKER_BASE_PORT", WEBAPP_PORT + 1))  # Ishchilar 127.0.0.1 da shu portdan boshlab
+WORKER_INDEX = os.getenv("WORKER_INDEX")  # Ota jarayon tomonidan beriladi
+IS_LEADER = WORKER_INDEX in (None, "0")  # Webhook, fon vazifalari va Bitrix24 navbatini faqat bitta jarayon boshqaradi
+OUTBOX_POLL_INTERVAL = 2.0 if WORKERS > 1 else None  # Boshqa ishchilar yozgan Bitrix24 so'rovlarini tekshirish
+AUDIENCE_MAX_AGE = 60.0 if WORKERS > 1 else None  # Boshqa ishchilar qo'shgan foydalanuvchilar post segmentlarida shuncha soniyada ko'rinadi
+
+if WORKERS > 1 and (STORAGE_BACKEND != "sqlite" or FSM_STORAGE != "sqlite"):
+    raise SystemExit("WORKERS > 1 uchun STORAGE_BACKEND=sqlite va FSM_STORAGE=sqlite kerak")
+if WORKER_INDEX is not None:
+    # Har bir ishchi o'z log fayliga yozadi (aylantirishda jarayonlar to'qnashmaydi)
+    LOG_FILE = "{0}.{2}{1}".format(*os.path.splitext(LOG_FILE), WORKER_INDEX)
 
 # Bot va Dispatcher
-bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-dp = Dispatcher()
-router = Router()
+api_server = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION
+bot = Bot(token=TOKEN, session=PreparedMarkupSession(api=api_server), default=DefaultBotProperties(parse_mode="HTML"))
+# SimpleEventIsolation: bitta foydalanuvchining FSM holati bir vaqtda faqat bitta update tomonidan o'zgartiriladi
+# Muddati o'tgan suhbatdan faqat til saqlanib qoladi
+fsm_expiry = ExpiryPolicy(default_ttl=FSM_DRAFT_TTL, keep=("lang",))
+dp = Dispatcher(storage=create_fsm_storage(FSM_STORAGE, DB_FILE, fsm_expiry, max_entries=FSM_MAX_ENTRIES,
+                                           busy_timeout=SQLITE_BUSY_TIMEOUT),
+                events_isolation=SimpleEventIsolation())
+router = Router()  # Buyruqlar va inline tugmalar
+
+# Holatga qarab ajratilgan routerlar (tartib main() da belgilanadi)
+onboarding_router = Router()  # Ism, telefon va tasdiqlash kodi
+admin_post_router = Router()  # Admin post matni/rasmi/videosi
+documents_router = Router()  # Ro'yxatdan o'tish hujjatlari
+admin_code_router = Router()  # Admin kodi kutilmoqda
+admin_router = Router()  # Admin paneli
+admin_search_router = Router()  # Admin qidiruvi so'rovi
+menu_router = Router()  # Asosiy menyu
+
+# Barcha chiquvchi xabarlar yagona navbat orqali (flood control'dan himoya)
+# Umumiy limit ishchilar orasida teng bo'linadi; chat limiti foydalanuvchi-ishchi bog'lanishi tufayli o'zgarmaydi
+scheduler = SendScheduler(global_rate=SEND_GLOBAL_RATE / WORKERS, chat_rate=SEND_CHAT_RATE, workers=SEND_WORKERS)
+bot.session.middleware(SchedulerMiddleware(scheduler))
+bot.session.middleware(ApiMetricsMiddleware())  # Navbatdan keyin: faqat so'rovning o'zi o'lchanadi
+SEND_QUEUE_DEPTH.set_function(lambda: scheduler.pending)
 
 # Global o'zgaruvchilar
-user_lang = {}
-user_data = {}
-users = set()
-blocked_users = set()
-daily_users = {}
-admin_state = {}
-registered_users = {}
-user_documents = {}
-verification_codes = {}
-
-# Logging sozlash
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
+background_tasks = set()
+
+# Suhbat holatlari (aiogram FSM). "lang" FSM ma'lumotlarida saqlanadi va
+# oqimlar orasida o'chirilmaydi.
+class Onboarding(StatesGroup):
+    name = State()
+    phone = State()
+    code = State()
+
+class Documents(StatesGroup):
+    upload = State()
+    confirm = State()
+
+class AdminFlow(StatesGroup):
+    code = State()
+    panel = State()
+    post = State()
+    schedule = State()
+    search = State()
+
+ONBOARDING_STEPS = [Onboarding.name, Onboarding.phone]
+
+# Kod kutayotgan holatlar qisqa muddatli, qolgan qoralamalar FSM_DRAFT_TTL gacha saqlanadi
+fsm_expiry.set_ttl(Onboarding.code, FSM_CODE_TTL)
+fsm_expiry.set_ttl(AdminFlow.code, FSM_CODE_TTL)
+
+onboarding_router.message.filter(StateFilter(Onboarding))
+admin_post_router.message.filter(StateFilter(AdminFlow.post, AdminFlow.schedule))
+documents_router.message.filter(StateFilter(Documents.upload))
+admin_code_router.message.filter(StateFilter(AdminFlow.code))
+admin_router.message.filter(StateFilter(AdminFlow.panel))
+admin_search_router.message.filter(StateFilter(AdminFlow.search))
+
+# Oqimni tugatish: holat va vaqtinchalik ma'lumotlar tozalanadi, til saqlanadi
+async def reset_flow(state: FSMContext, lang, **data):
+    await state.set_state(None)
+    await state.set_data({"lang": lang, **data})
+
+def empty_post():
+    return {"text": None, "photo": None, "video": None}
+
+# Logging sozlash: navbat orqali alohida oqimda, faylga JSON ko'rinishida (aylantirish bilan)
+log_listener = setup_logging(LOG_FILE, level=LOG_LEVEL, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS,
+                             sample_rates=parse_sample_rates(LOG_SAMPLE), rate_cap=LOG_RATE_CAP)
 logger = logging.getLogger(__name__)
 
-# Ma'lumotlarni fayldan yuklash
-def load_data():
-    global users, blocked_users, daily_users, registered_users, user_documents
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                users = set(data.get("users", []))
-                blocked_users = set(data.get("blocked_users", []))
-                daily_users_raw = data.get("daily_users", {})
-                daily_users = {key: set(value) for key, value in daily_users_raw.items()}
-                registered_users = data.get("registered_users", {})
-                user_documents = data.get("user_documents", {})
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.error(f"Ma'lumotlarni yuklashda xatolik: {e}. Yangi fayl yaratilmoqda.")
-            os.remove(DATA_FILE)
-            users, blocked_users, daily_users, registered_users, user_documents = set(), set(), {}, {}, {}
-    else:
-        users, blocked_users, daily_users, registered_users, user_documents = set(), set(), {}, {}, {}
-
-# Ma'lumotlarni faylga saqlash
-def save_data():
-    daily_users_serializable = {key: list(value) for key, value in daily_users.items()}
-    try:
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump({
-                "users": list(users),
-                "blocked_users": list(blocked_users),
-                "daily_users": daily_users_serializable,
-                "registered_users": registered_users,
-                "user_documents": user_documents
-            }, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"Ma'lumotlarni saqlashda xatolik: {e}")
-
-# Bitrix24'ga ma'lumotlarni yuborish
-def send_lead_to_bitrix(name, phone, documents, max_retries=3):
-    comments = f"Telefon: {phone}\nHujjatlar:\n"
-    for i, doc in documents.items():
-        comments += f"Hujjat {i+1}: Yuklandi\n"
-
-    payload = {
-        "fields": {
-            "TITLE": "PBS IMPEX - Yangi ro'yxatdan o'tgan foydalanuvchi",
-            "NAME": name,
-            "PHONE": [{"VALUE": phone, "VALUE_TYPE": "WORK"}],
-            "COMMENTS": comments,
-            "SOURCE_ID": "WEB",
-            "STATUS_ID": "NEW"
-        }
-    }
+# Ma'lumotlar ombori (users, blocked_users, faollik bitmaplari, registered_users, user_documents)
+storage = create_storage(STORAGE_BACKEND, DATA_FILE, DB_FILE, save_interval=SAVE_INTERVAL, save_max_dirty=SAVE_MAX_DIRTY,
+                         audience_max_age=AUDIENCE_MAX_AGE, busy_timeout=SQLITE_BUSY_TIMEOUT)
 
-    for attempt in range(max_retries):
-        try:
-            response = requests.post(f"{BITRIX_WEBHOOK_URL}crm.lead.add", json=payload, timeout=10)
-            response.raise_for_status()
-            logger.info(f"Bitrix24'ga muvaffaqiyatli yuborildi: {response.json()}")
-            return response.json()
-        except requests.RequestException as e:
-            logger.error(f"Bitrix24'ga yuborishda xatolik (urinish {attempt + 1}/{max_retries}): {e}")
-            if attempt == max_retries - 1:
-                return {"error": str(e)}
-            asyncio.sleep(2 ** attempt)
-
-# Tarjimalar
-translations = {
-    "uz": {
-        "lang_name": "🇺🇿 O'zbekcha",
-        "start": "🌐 Iltimos, tilni tanlang:",
-        "welcome": "Assalomu alaykum! 👋\nSiz PBS IMPEX kompaniyasining rasmiy Telegram botidasiz. 🌍\n\nBiz yuk tashish va logistika xizmatlarini Markaziy Osiyo hamda xalqaro yo‘nalishlarda taqdim etamiz. ✈️🚛🚢🚂\n\n📦 Buyurtma berish yoki xizmatlar bilan tanishish uchun quyidagi menyudan foydalaning. 👇",
-        "menu": ["📝 Ro'yxatdan o'tish", "📞 Operator", "🛠 Xizmatlar", "👤 Foydalanuvchi profili"],
-        "registration_questions": [
-            "1️⃣ Pasport yoki ID suratini yuklang (.jpg, .jpeg, .png, .pdf):",
-            "2️⃣ Texpasport suratini yuklang (.jpg, .jpeg, .png, .pdf):",
-            "3️⃣ Xalqaro yuk tashish litsenziyasini yuklang (.jpg, .jpeg, .png, .pdf):"
-        ],
-        "initial_questions": ["Ismingiz yoki familiyangiz?", "Telefon raqamingiz?"],
-        "verify_code": "Tasdiqlash kodi yuborildi: {code}\nIltimos, kodni kiriting:",
-        "code_correct": "✅ Kod tasdiqlandi! Botga xush kelibsiz!",
-        "code_incorrect": "❌ Noto‘g‘ri kod! Qaytadan kiriting:",
-        "error_phone": "❌ Telefon raqami noto‘g‘ri! Faqat raqamlar kiritilishi kerak. Qaytadan kiriting:",
-        "error_phone_length": "❌ Telefon raqami 9 yoki 12 ta raqamdan iborat bo‘lishi kerak! Qaytadan kiriting:",
-        "error_no_digits": "❌ Bu maydonda raqamlar ishlatilmasligi kerak! Qaytadan kiriting:",
-        "error_not_registered": "Iltimos, avval ism va telefon raqamingizni kiriting!",
-        "confirm": "✅ Tasdiqlash",
-        "retry": "🔄 O‘zgartirish",
-        "home": "🏠 Bosh sahifa",
-        "back": "🔙 Orqaga",
-        "received": "✅ Ma'lumotlar qabul qilindi. Tez orada bog‘lanamiz!",
-        "error_invalid_file": "❌ Noto‘g‘ri fayl formati! Faqat .jpg, .jpeg, .png yoki .pdf fayllar qabul qilinadi.",
-        "services": "🛠 Xizmatlar",
-        "admin_menu": ["📊 Statistika", "📢 Post", "🏠 Bosh sahifa"],
-        "admin_code_prompt": "🔑 Admin paneliga kirish uchun kodni kiriting:",
-        "admin_welcome": "👨‍💼 Admin paneliga xush kelibsiz! Quyidagi menyudan foydalaning:",
-        "not_admin": "❌ Siz admin emassiz!",
-        "stats": "📊 Statistika:\n1. Umumiy foydalanuvchilar soni: {total}\n2. Botni bloklaganlar soni: {blocked}\n3. Kunlik foydalanuvchilar soni: {daily}",
-        "post_prompt": "📢 Post yozing (matn, rasm yoki video):",
-        "post_confirm": "📢 Yuboriladigan post:\n\n{post}\n\nTasdiqlaysizmi?",
-        "post_sent": "✅ Post {count} foydalanuvchiga yuborildi!",
-        "profile": "👤 Foydalanuvchi profili:\nIsm/Familiya: {name}\nTelefon: {phone}"
-    },
-    "ru": {
-        "lang_name": "🇷🇺 Русский",
-        "start": "🌐 Пожалуйста, выберите язык:",
-        "welcome": "Здравствуйте! 👋\nВы находитесь в официальном Telegram-боте компании PBS IMPEX. 🌍\n\nМы предоставляем услуги по перевозке и логистике в Центральной Азии и по всему миру. ✈️🚛🚢🚂\n\n📦 Для оформления заказа или получения информации воспользуйтесь меню ниже. 👇",
-        "menu": ["📝 Регистрация", "📞 Оператор", "🛠 Услуги", "👤 Профиль пользователя"],
-        "registration_questions": [
-            "1️⃣ Загрузите скан паспорта или ID (.jpg, .jpeg, .png, .pdf):",
-            "2️⃣ Загрузите скан транспортного паспорта (.jpg, .jpeg, .png, .pdf):",
-            "3️⃣ Загрузите международную лицензию на перевозку грузов (.jpg, .jpeg, .png, .pdf):"
-        ],
-        "initial_questions": ["Ваше имя или фамилия?", "Ваш номер телефона?"],
-        "verify_code": "Код подтверждения отправлен: {code}\nПожалуйста, введите код:",
-        "code_correct": "✅ Код подтвержден! Добро пожаловать в бот!",
-        "code_incorrect": "❌ Неверный код! Введите еще раз:",
-        "error_phone": "❌ Номер телефона неверный! Вводите только цифры. Повторите ввод:",
-        "error_phone_length": "❌ Номер телефона должен содержать 9 или 12 цифр! Повторите ввод:",
-        "error_no_digits": "❌ В этом поле нельзя использовать цифры! Повторите ввод:",
-        "error_not_registered": "Пожалуйста, сначала введите ваше имя и номер телефона!",
-        "confirm": "✅ Подтвердить",
-        "retry": "🔄 Изменить",
-        "home": "🏠 Главное меню",
-        "back": "🔙 Назад",
-        "received": "✅ Данные получены. Мы скоро свяжемся с вами!",
-        "error_invalid_file": "❌ Неверный формат файла! Принимаются только файлы .jpg, .jpeg, .png или .pdf.",
-        "services": "🛠 Услуги",
-        "admin_menu": ["📊 Статистика", "📢 Пост", "🏠 Главное меню"],
-        "admin_code_prompt": "🔑 Введите код для входа в админ-панель:",
-        "admin_welcome": "👨‍💼 Добро пожаловать в админ-панель! Используйте меню ниже:",
-        "not_admin": "❌ Вы не администратор!",
-        "stats": "📊 Статистика:\n1. Общее число пользователей: {total}\n2. Число заблокировавших бота: {blocked}\n3. Число пользователей за день: {daily}",
-        "post_prompt": "📢 Напишите пост (текст, фото или видео):",
-        "post_confirm": "📢 Пост для отправки:\n\n{post}\n\nПодтверждаете?",
-        "post_sent": "✅ Пост отправлен {count} пользователям!",
-        "profile": "👤 Профиль пользователя:\nИмя/Фамилия: {name}\nТелефон: {phone}"
-    },
-    "en": {
-        "lang_name": "🇬🇧 English",
-        "start": "🌐 Please select a language:",
-        "welcome": "Hello! 👋\nYou are in the official Telegram bot of PBS IMPEX. 🌍\n\nWe provide freight and logistics services in Central Asia and internationally. ✈️🚛🚢🚂\n\n📦 To place an order or view services, use the menu below. 👇",
-        "menu": ["📝 Registration", "📞 Contact Operator", "🛠 Services", "👤 User Profile"],
-        "registration_questions": [
-            "1️⃣ Upload a scan of your passport or ID (.jpg, .jpeg, .png, .pdf):",
-            "2️⃣ Upload a scan of your transport passport (.jpg, .jpeg, .png, .pdf):",
-            "3️⃣ Upload an international cargo transportation license (.jpg, .jpeg, .png, .pdf):"
-        ],
-        "initial_questions": ["Your name or surname?", "Your phone number?"],
-        "verify_code": "Verification code sent: {code}\nPlease enter the code:",
-        "code_correct": "✅ Code verified! Welcome to the bot!",
-        "code_incorrect": "❌ Incorrect code! Please try again:",
-        "error_phone": "❌ Invalid phone number! Only digits are allowed. Please try again:",
-        "error_phone_length": "❌ Phone number must be 9 or 12 digits long! Please try again:",
-        "error_no_digits": "❌ Digits are not allowed in this field! Please try again:",
-        "error_not_registered": "Please enter your name and phone number first!",
-        "confirm": "✅ Confirm",
-        "retry": "🔄 Edit",
-        "home": "🏠 Home",
-        "back": "🔙 Back",
-        "received": "✅ Data received. We will contact you soon!",
-        "error_invalid_file": "❌ Invalid file format! Only .jpg, .jpeg, .png, or .pdf files are accepted.",
-        "services": "🛠 Services",
-        "admin_menu": ["📊 Statistics", "📢 Post", "🏠 Home"],
-        "admin_code_prompt": "🔑 Enter the code to access the Admin Panel:",
-        "admin_welcome": "👨‍💼 Welcome to the Admin Panel! Use the menu below:",
-        "not_admin": "❌ You are not an admin!",
-        "stats": "📊 Statistics:\n1. Total users: {total}\n2. Users who blocked the bot: {blocked}\n3. Daily users: {daily}",
-        "post_prompt": "📢 Write a post (text, photo, or video):",
-        "post_confirm": "📢 Post to send:\n\n{post}\n\nConfirm?",
-        "post_sent": "✅ Post sent to {count} users!",
-        "profile": "👤 User Profile:\nName/Surname: {name}\nPhone: {phone}"
-    }
+# Bitrix24'ga ma'lumotlarni yuborish natijasini kanalga xabar qilish
+# (shu telefon raqami bilan lead avval yaratilgan bo'lsa, yangisi yaratilmaydi)
+BITRIX_RESULTS = {
+    "add": "✅ Bitrix24'ga muvaffaqiyatli yuborildi",
+    "update": "♻️ Bitrix24'dagi mavjud lead yangilandi",
+    "skip": "ℹ️ Bitrix24'da bu lead allaqachon bor, o'zgarish yo'q",
 }
 
-# Klaviaturalar
-def get_language_menu():
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text=translations["uz"]["lang_name"], callback_data="lang_uz")],
-            [InlineKeyboardButton(text=translations["ru"]["lang_name"], callback_data="lang_ru")],
-            [InlineKeyboardButton(text=translations["en"]["lang_name"], callback_data="lang_en")]
-        ]
-    )
-
-def get_main_menu(lang):
-    return ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=btn)] for btn in translations[lang]["menu"]],
-        resize_keyboard=True
-    )
-
-def get_registration_nav(lang):
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text=translations[lang]["home"])],
-            [KeyboardButton(text=translations[lang]["back"])]
-        ],
-        resize_keyboard=True
-    )
-
-def get_services_menu(lang):
-    services_menu = {
-        "uz": [
-            [KeyboardButton(text="🚛 Logistika")],
-            [KeyboardButton(text="🧾 Ruxsatnomalar va bojxona xizmatlari")],
-            [KeyboardButton(text="🏢 Ma’muriyatchilik ishlari")],
-            [KeyboardButton(text="📄 Sertifikatsiya")],
-            [KeyboardButton(text=translations[lang]["home"])],
-            [KeyboardButton(text=translations[lang]["back"])]
-        ],
-        "ru": [
-            [KeyboardButton(text="🚛 Логистика")],
-            [KeyboardButton(text="🧾 Разрешения и таможенные услуги")],
-            [KeyboardButton(text="🏢 Административные услуги")],
-            [KeyboardButton(text="📄 Сертификация")],
-            [KeyboardButton(text=translations[lang]["home"])],
-            [KeyboardButton(text=translations[lang]["back"])]
-        ],
-        "en": [
-            [KeyboardButton(text="🚛 Logistics")],
-            [KeyboardButton(text="🧾 Permits and Customs Services")],
-            [KeyboardButton(text="🏢 Administrative Services")],
-            [KeyboardButton(text="📄 Certification")],
-            [KeyboardButton(text=translations[lang]["home"])],
-            [KeyboardButton(text=translations[lang]["back"])]
-        ]
-    }
-    return ReplyKeyboardMarkup(keyboard=services_menu[lang], resize_keyboard=True)
-
-def get_admin_menu(lang):
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text=translations[lang]["admin_menu"][0])],
-            [KeyboardButton(text=translations[lang]["admin_menu"][1])],
-            [KeyboardButton(text=translations[lang]["admin_menu"][2])],
-            [KeyboardButton(text=translations[lang]["back"])]
-        ],
-        resize_keyboard=True
-    )
+async def report_bitrix_result(context, response, error):
+    if error:
+        logger.error(f"Bitrix24'ga yuborish muvaffaqiyatsiz: {error}")
+        await bot.send_message(CHANNEL_ID, f"❌ Bitrix24'ga yuborishda xatolik: {error}")
+    else:
+        result = BITRIX_RESULTS[context.get("action", "add")]
+        logger.info(f"{result}: Lead ID {response.get('result')}")
+        await bot.send_message(CHANNEL_ID, f"{result}: Lead ID {response.get('result')}")
 
-def get_confirm_buttons(lang):
-    return InlineKeyboardMarkup(
-        inline_keyboard=[[
-            InlineKeyboardButton(text=translations[lang]["confirm"], callback_data="confirm_registration"),
-            InlineKeyboardButton(text=translations[lang]["retry"], callback_data="retry_registration")
-        ]]
-    )
+# Bitrix24 so'rovlari doimiy navbat orqali fonda yuboriladi
+bitrix_outbox = BitrixOutbox(storage, BitrixClient(BITRIX_WEBHOOK_URL), on_result=report_bitrix_result,
+                             max_attempts=BITRIX_MAX_ATTEMPTS, batch_size=BITRIX_BATCH_SIZE,
+                             poll_interval=OUTBOX_POLL_INTERVAL)
+BITRIX_OUTBOX_DEPTH.set_function(storage.outbox_count)
 
-def get_profile_buttons(lang):
-    return InlineKeyboardMarkup(
-        inline_keyboard=[[
-            InlineKeyboardButton(text=translations[lang]["confirm"], callback_data="confirm_profile"),
-            InlineKeyboardButton(text=translations[lang]["retry"], callback_data="edit_profile")
-        ]]
-    )
+# Post tarqatish vazifalari saqlash qatlamida; qayta ishga tushganda to'xtagan joyidan davom etadi
+broadcast_runner = BroadcastRunner(bot, storage, batch_size=BROADCAST_CONCURRENCY,
+                                   progress_interval=BROADCAST_PROGRESS_INTERVAL, poll_interval=OUTBOX_POLL_INTERVAL)
 
-def get_post_confirm_buttons(lang):
-    return InlineKeyboardMarkup(
-        inline_keyboard=[[
-            InlineKeyboardButton(text=translations[lang]["confirm"], callback_data="confirm_post"),
-            InlineKeyboardButton(text=translations[lang]["retry"], callback_data="retry_post")
-        ]]
-    )
+# Yuklangan hujjatlar fonda lokal arxivga yuklab olinadi (file_unique_id bo'yicha bir marta)
+document_archive = DocumentArchive(bot, storage, ARCHIVE_DIR) if ARCHIVE_DIR else None
 
 # Botni ishga tushirishda buyruqlarni o'rnatish
 async def set_bot_commands():
@@ -329,15 +223,10 @@ async def set_bot_commands():
 @router.message(Command("start"))
 async def start_handler(message: types.Message):
     user_id = str(message.from_user.id)
-    today = datetime.now().date().isoformat()
-    users.add(user_id)
-    if today not in daily_users:
-        daily_users[today] = set()
-    daily_users[today].add(user_id)
-    save_data()
-
-    logger.info(f"Start command received for user_id: {user_id}")
-    logger.info(f"Registered users: {registered_users}")
+    await retry_locked(storage.add_user, user_id)
+
+    logger.info("Start command received for user_id: %s", user_id)
+    logger.info("User %s registered: %s", user_id, storage.is_registered(user_id))
     
     # Har safar til tanlashdan boshlash
     await message.answer(translations["uz"]["start"], reply_markup=get_language_menu())
@@ -346,554 +235,540 @@ async def start_handler(message: types.Message):
 @router.message(Command("lang"))
 async def lang_handler(message: types.Message):
     user_id = str(message.from_user.id)
-    logger.info(f"Lang command received for user_id: {user_id}")
+    logger.info("Lang command received for user_id: %s", user_id)
     await message.answer(translations["uz"]["start"], reply_markup=get_language_menu())
 
 # Admin komandasi
 @router.message(Command("admin"))
-async def admin_handler(message: types.Message):
+async def admin_handler(message: types.Message, state: FSMContext, lang: str):
     user_id = str(message.from_user.id)
-    lang = user_lang.get(user_id, "uz")
-    admin_state[user_id] = {"awaiting_code": True}
-    logger.info(f"Admin command received for user_id: {user_id}")
+    await state.set_state(AdminFlow.code)
+    logger.info("Admin command received for user_id: %s", user_id)
     await message.answer(translations[lang]["admin_code_prompt"], reply_markup=get_registration_nav(lang))
 
 # Til tanlash
 @router.callback_query(F.data.startswith("lang_"))
-async def handle_language_selection(callback: types.CallbackQuery):
+async def handle_language_selection(callback: types.CallbackQuery, state: FSMContext):
     user_id = str(callback.from_user.id)
     lang = callback.data.split("_")[1]
-    user_lang[user_id] = lang
+    if lang not in LANGUAGES:
+        await callback.answer()
+        return
 
-    logger.info(f"Language selected for user_id: {user_id}, language: {lang}")
+    logger.info("Language selected for user_id: %s, language: %s", user_id, lang)
+    await retry_locked(storage.set_user_lang, user_id, lang)
     
     # Ro‘yxatdan o‘tish jarayonini boshlash
-    user_data[user_id] = {"initial_step": 0, "initial_answers": {}, "awaiting_code": False}
+    await reset_flow(state, lang, initial_answers={})
     await callback.message.edit_text(translations[lang]["welcome"], reply_markup=None)
-    await ask_initial_question(user_id)
+    await ask_initial_question(user_id, state, lang, 0)
     
     await callback.answer()
 
 # Dastlabki savollar va tasdiqlash
-async def ask_initial_question(user_id):
-    lang = user_lang.get(user_id, "uz")
-    logger.info(f"ask_initial_question called for user_id: {user_id}, lang: {lang}")
-    
-    if user_id not in user_data:
-        logger.error(f"User {user_id} not found in user_data, resetting")
-        user_data[user_id] = {"initial_step": 0, "initial_answers": {}, "awaiting_code": False}
-    
-    step = user_data[user_id]["initial_step"]
-    logger.info(f"Current step for user_id {user_id}: {step}")
-    
-    if step < len(translations[lang]["initial_questions"]):
-        logger.info(f"Asking question {step} to user_id: {user_id}")
+async def ask_initial_question(user_id, state: FSMContext, lang, step):
+    logger.info("ask_initial_question called for user_id: %s, lang: %s, step: %s", user_id, lang, step)
+
+    if step < len(ONBOARDING_STEPS):
+        await state.set_state(ONBOARDING_STEPS[step])
         await bot.send_message(user_id, translations[lang]["initial_questions"][step], reply_markup=None)
-    elif not user_data[user_id].get("awaiting_code"):
+    else:
         code = str(random.randint(1000, 9999))
-        verification_codes[user_id] = code
-        user_data[user_id]["awaiting_code"] = True
-        logger.info(f"Sending verification code {code} to user_id: {user_id}")
+        await state.update_data(code=code)
+        await state.set_state(Onboarding.code)
+        logger.info("Sending verification code %s to user_id: %s", code, user_id)
         await bot.send_message(user_id, translations[lang]["verify_code"].format(code=code), reply_markup=None)
-    else:
-        logger.info(f"User {user_id} already in verification stage, awaiting code")
-        await verify_code(user_id)
 
-async def handle_initial_answer(message: types.Message):
+# Dastlabki savollarga javoblar (ro'yxatdan o'tish tugmasi asosiy menyuga o'tadi)
+@onboarding_router.message(F.text, ~MenuAction("registration"))
+async def handle_initial_answer(message: types.Message, state: FSMContext, lang: str):
     user_id = str(message.from_user.id)
-    lang = user_lang.get(user_id, "uz")
     text = message.text
+    current = await state.get_state()
+    data = await state.get_data()
 
-    logger.info(f"Handling initial answer from user_id: {user_id}, text: {text}")
+    logger.info("Handling initial answer from user_id: %s, state: %s", user_id, current)
 
-    if user_id not in user_data:
-        logger.error(f"User {user_id} not found in user_data during handle_initial_answer")
-        return
-
-    if user_data[user_id].get("awaiting_code"):
-        logger.info(f"User {user_id} in verification stage, checking code: {text}")
-        if text == verification_codes.get(user_id):
-            registered_users[user_id] = user_data[user_id]["initial_answers"]
-            save_data()
-            logger.info(f"User {user_id} verified successfully")
+    if current == Onboarding.code.state:
+        if text == data.get("code"):
+            record = Registration.from_dict({"lang": lang, **data.get("initial_answers", {})})
+            await retry_locked(storage.set_registration, user_id, record)
+            logger.info("User %s verified successfully", user_id)
+            await reset_flow(state, lang)
             await message.answer(translations[lang]["code_correct"], reply_markup=get_main_menu(lang))
-            user_data.pop(user_id)
-            verification_codes.pop(user_id, None)
         else:
-            logger.info(f"User {user_id} entered incorrect code: {text}")
+            logger.info("User %s entered incorrect code", user_id)
+            storage.add_stat(VERIFY_FAILED)
             await message.answer(translations[lang]["code_incorrect"], reply_markup=None)
         return
 
-    step = user_data[user_id]["initial_step"]
-    logger.info(f"Processing step {step} for user_id: {user_id}")
+    step = 1 if current == Onboarding.phone.state else 0
+    answer = text
 
     if step == 1:  # Telefon raqami
         cleaned_text = text.replace("+", "").replace(" ", "")
         if not cleaned_text.isdigit():
-            logger.info(f"Invalid phone number from user_id: {user_id}")
+            logger.info("Invalid phone number from user_id: %s", user_id)
             await message.answer(translations[lang]["error_phone"], reply_markup=None)
             return
         if len(cleaned_text) not in [9, 12]:
-            logger.info(f"Phone number length invalid for user_id: {user_id}")
+            logger.info("Phone number length invalid for user_id: %s", user_id)
             await message.answer(translations[lang]["error_phone_length"], reply_markup=None)
             return
-    elif step == 0:  # Ism
+        answer = normalize_phone(text)
+    else:  # Ism
         if any(char.isdigit() for char in text):
-            logger.info(f"Name contains digits for user_id: {user_id}")
+            logger.info("Name contains digits for user_id: %s", user_id)
             await message.answer(translations[lang]["error_no_digits"], reply_markup=None)
             return
 
-    question = translations[lang]["initial_questions"][step]
-    user_data[user_id]["initial_answers"][question] = text
-    user_data[user_id]["initial_step"] += 1
-    logger.info(f"Answer saved for user_id: {user_id}, proceeding to next step")
-    await ask_initial_question(user_id)
+    await state.update_data(initial_answers={**data.get("initial_answers", {}), REGISTRATION_FIELDS[step]: answer})
+    logger.info("Answer saved for user_id: %s, proceeding to next step", user_id)
+    await ask_initial_question(user_id, state, lang, step + 1)
 
 # Ro'yxatdan o'tish jarayoni
-@router.message(F.text.in_(["📝 Ro'yxatdan o'tish", "📝 Регистрация", "📝 Registration"]))
-async def start_registration(message: types.Message):
-    user_id = str(message.from_user.id)
-    lang = user_lang.get(user_id, "uz")
-    logger.info(f"Starting registration for user_id: {user_id}")
-    if user_id not in registered_users:
-        logger.info(f"User {user_id} not registered, prompting to register")
-        await message.answer(translations[lang]["error_not_registered"], reply_markup=get_main_menu(lang))
+async def start_registration(message: types.Message, user_id, lang, state: FSMContext):
+    logger.info("Starting registration for user_id: %s", user_id)
+    if not storage.is_registered(user_id):
+        logger.info("User %s not registered, prompting to register", user_id)
+        await message.answer(**screen("not_registered", lang))
         return
-    user_data[user_id] = {"step": 0, "documents": {}, "file_types": {}}
-    await ask_registration_question(user_id)
+    await reset_flow(state, lang, documents=[], file_types=[], file_unique_ids=[])
+    await ask_registration_question(user_id, state, lang, [])
 
-async def ask_registration_question(user_id):
-    lang = user_lang.get(user_id, "uz")
-    step = user_data[user_id]["step"]
+async def ask_registration_question(user_id, state: FSMContext, lang, documents):
+    step = len(documents)
     if step < len(translations[lang]["registration_questions"]):
+        await state.set_state(Documents.upload)
         await bot.send_message(user_id, translations[lang]["registration_questions"][step], reply_markup=get_registration_nav(lang))
     else:
-        await show_registration_summary(user_id)
+        await state.set_state(Documents.confirm)
+        await show_registration_summary(user_id, lang, documents)
 
-@router.message(F.document | F.photo)
-async def handle_document(message: types.Message):
+@documents_router.message(F.document | F.photo)
+async def handle_document(message: types.Message, state: FSMContext, lang: str):
     user_id = str(message.from_user.id)
-    lang = user_lang.get(user_id, "uz")
-    if user_id not in user_data or "step" not in user_data[user_id]:
-        return
-    step = user_data[user_id]["step"]
     file_id = None
     file_type = None
     if message.document:
         if message.document.mime_type not in ["application/pdf", "image/jpeg", "image/png"]:
             await message.answer(translations[lang]["error_invalid_file"])
             return
-        file_id = message.document.file_id
+        file_id, file_unique_id = message.document.file_id, message.document.file_unique_id
         file_type = "document"
     elif message.photo:
-        file_id = message.photo[-1].file_id
+        file_id, file_unique_id = message.photo[-1].file_id, message.photo[-1].file_unique_id
         file_type = "photo"
     if file_id:
-        user_data[user_id]["documents"][step] = file_id
-        user_data[user_id]["file_types"][step] = file_type
-        user_data[user_id]["step"] += 1
-        await ask_registration_question(user_id)
-
-async def show_registration_summary(user_id):
-    lang = user_lang.get(user_id, "uz")
+        data = await state.get_data()
+        documents = data.get("documents", []) + [file_id]
+        storage.add_stat(DOCUMENTS)
+        await state.update_data(documents=documents, file_types=data.get("file_types", []) + [file_type],
+                                file_unique_ids=data.get("file_unique_ids", []) + [file_unique_id])
+        if document_archive is not None:
+            run_in_background(document_archive.archive_quietly(file_id, file_unique_id, file_type))
+        await ask_registration_question(user_id, state, lang, documents)
+
+async def show_registration_summary(user_id, lang, documents):
     summary = "📝 Yuklangan hujjatlar:\n"
-    for i, doc in user_data[user_id]["documents"].items():
+    for i, doc in enumerate(documents):
         summary += f"{translations[lang]['registration_questions'][i]}\n"
     await bot.send_message(user_id, summary, reply_markup=get_confirm_buttons(lang))
 
 @router.callback_query(F.data == "confirm_registration")
-async def confirm_registration(callback: types.CallbackQuery):
+async def confirm_registration(callback: types.CallbackQuery, state: FSMContext, lang: str):
     user_id = str(callback.from_user.id)
-    lang = user_lang.get(user_id, "uz")
-    documents = user_data[user_id]["documents"]
-    file_types = user_data[user_id]["file_types"]
+    if await state.get_state() != Documents.confirm.state:
+        await callback.answer()  # Takroriy bosish
+        return
+    data = await state.get_data()
+    documents = data["documents"]
+    file_types = data["file_types"]
+    file_unique_ids = data.get("file_unique_ids") or [None] * len(documents)
+
+    # Hujjatlar foydalanuvchi indeksiga yoziladi; avval yuborilgan fayllar kanalga qayta yuborilmaydi
+    previous = storage.get_documents(user_id)
+    records = {
+        str(i): {"file_id": file_id, "file_unique_id": unique_id, "file_type": file_type}
+        for i, (file_id, unique_id, file_type) in enumerate(zip(documents, file_unique_ids, file_types))
+    }
+    reused = [
+        int(slot) for slot, record in records.items()
+        if record["file_unique_id"] and previous.get(slot, {}).get("file_unique_id") == record["file_unique_id"]
+    ]
+    await retry_locked(storage.set_documents, user_id, records)
     
-    # Foydalanuvchi ma'lumotlari
-    initial_data = registered_users[user_id]
-    name_key = translations[lang]["initial_questions"][0]
-    phone_key = translations[lang]["initial_questions"][1]
-    name = initial_data.get(name_key, "Noma'lum")
-    phone = initial_data.get(phone_key, "Noma'lum")
-
-    # Telefon raqamini to'g'ri formatda tayyorlash
-    cleaned_phone = phone.replace("+", "").replace(" ", "")
-    if not cleaned_phone.startswith("998") and len(cleaned_phone) == 9:
-        cleaned_phone = f"998{cleaned_phone}"
-    elif len(cleaned_phone) == 12 and not cleaned_phone.startswith("+"):
-        cleaned_phone = f"+{cleaned_phone}"
-    else:
-        cleaned_phone = f"+{cleaned_phone}"
+    # Foydalanuvchi ma'lumotlari (telefon ro'yxatdan o'tishda E.164 formatiga keltirilgan)
+    record = storage.get_registration(user_id) or Registration()
+    name = record.name or "Noma'lum"
+    cleaned_phone = record.phone or "Noma'lum"
+    duplicates = [uid for uid in storage.users_by_phone(record.phone) if uid != user_id] if record.phone else []
+
+    if not previous:
+        storage.add_stat(APPLICATIONS)  # Qayta yuborilgan arizalar voronkada hisoblanmaydi
+
+    # Foydalanuvchiga darhol javob, kanal va Bitrix24 ga yuborish fonda bajariladi
+    await callback.answer()
+    await callback.message.answer(translations[lang]["received"], reply_markup=get_main_menu(lang))
+    await reset_flow(state, lang)
 
-    # Telegram kanaliga yuborish
     message_text = f"📝 Yangi ro'yxatdan o'tgan foydalanuvchi: @{callback.from_user.username}\n"
     message_text += f"Ism/Familiya: {name}\nTelefon: {cleaned_phone}\n"
-    for i, doc in documents.items():
-        file_type = file_types[i]
+    if duplicates:
+        message_text += f"⚠️ Bu raqam bilan boshqa foydalanuvchilar ham ro'yxatdan o'tgan: {', '.join(duplicates)}\n"
+    if reused:
+        message_text += f"O'zgarmagan hujjatlar (avval yuborilgan): {', '.join(str(i + 1) for i in reused)}\n"
+    run_in_background(registration_fanout(user_id, lang, message_text, name, cleaned_phone, documents, file_types, reused))
+
+# Fon vazifalari (to'xtatishda tugashi kutiladi)
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# Hujjatlarni albomlarga ajratish: Telegram albomida rasm va hujjat aralashmaydi
+def build_channel_albums(documents, file_types, lang, skip=()):
+    photos, files = [], []
+    for i, (file_id, file_type) in enumerate(zip(documents, file_types)):
+        if i in skip:
+            continue
+        caption = translations[lang]["registration_questions"][i]
         if file_type == "photo":
-            await bot.send_photo(CHANNEL_ID, doc, caption=f"{translations[lang]['registration_questions'][i]}")
-        elif file_type == "document":
-            await bot.send_document(CHANNEL_ID, doc, caption=f"{translations[lang]['registration_questions'][i]}")
-    await bot.send_message(CHANNEL_ID, message_text)
-
-    # Bitrix24'ga yuborish
-    bitrix_response = send_lead_to_bitrix(name, cleaned_phone, documents)
-    if "error" in bitrix_response:
-        logger.error(f"Bitrix24'ga yuborish muvaffaqiyatsiz: {bitrix_response['error']}")
-        await bot.send_message(CHANNEL_ID, f"❌ Bitrix24'ga yuborishda xatolik: {bitrix_response['error']}")
+            photos.append(InputMediaPhoto(media=file_id, caption=caption))
+        else:
+            files.append(InputMediaDocument(media=file_id, caption=caption))
+    return [album for album in (photos, files) if album]
+
+async def send_channel_album(album):
+    if len(album) > 1:
+        await bot.send_media_group(CHANNEL_ID, media=album)
+    elif isinstance(album[0], InputMediaPhoto):
+        await bot.send_photo(CHANNEL_ID, album[0].media, caption=album[0].caption)
     else:
-        logger.info(f"Bitrix24'ga muvaffaqiyatli yuborildi: Lead ID {bitrix_response.get('result')}")
-        await bot.send_message(CHANNEL_ID, f"✅ Bitrix24'ga muvaffaqiyatli yuborildi: Lead ID {bitrix_response.get('result')}")
+        await bot.send_document(CHANNEL_ID, album[0].media, caption=album[0].caption)
 
-    await callback.message.answer(translations[lang]["received"], reply_markup=get_main_menu(lang))
-    user_data.pop(user_id, None)
+# Ro'yxatdan o'tish ma'lumotlarini kanal va Bitrix24 ga yuborish (bosqichlar vaqti log qilinadi)
+async def registration_fanout(user_id, lang, message_text, name, phone, documents, file_types, reused=()):
+    timings = {}
+    started = time.perf_counter()
+    try:
+        # Bitrix24 navbatiga birinchi bo'lib yoziladi: kanalga yuborish xato bersa ham lead yo'qolmaydi
+        bitrix_outbox.enqueue(LEAD_ADD, build_lead_payload(name, phone, documents),
+                              {"user_id": user_id, "phone": normalize_phone(phone)})
+        timings["bitrix_enqueue"] = time.perf_counter() - started
+
+        stage = time.perf_counter()
+        albums = build_channel_albums(documents, file_types, lang, skip=reused)
+        first = albums[0][0] if albums else None
+        if first is not None and len(message_text) + len(first.caption) + 2 <= 1024:
+            first.caption = f"{message_text}\n{first.caption}"
+        else:
+            await bot.send_message(CHANNEL_ID, message_text)
+        for album in albums:
+            await send_channel_album(album)
+        timings["channel"] = time.perf_counter() - stage
+    except Exception as e:
+        logger.error(f"Ro'yxatdan o'tish ma'lumotlarini kanalga yuborishda xatolik (user_id: {user_id}): {e}")
+    timings["total"] = time.perf_counter() - started
+    logger.info("Registration fan-out for user_id %s", user_id, extra={f"{k}_ms": round(v * 1000, 1) for k, v in timings.items()})
 
 @router.callback_query(F.data == "retry_registration")
-async def retry_registration(callback: types.CallbackQuery):
+async def retry_registration(callback: types.CallbackQuery, state: FSMContext, lang: str):
     user_id = str(callback.from_user.id)
-    lang = user_lang.get(user_id, "uz")
-    user_data[user_id] = {"step": 0, "documents": {}, "file_types": {}}
-    await ask_registration_question(user_id)
-
-# Asosiy menyu va funksiyalar
-@router.message(F.text)
-async def handle_language_and_menu(message: types.Message):
-    user_id = str(message.from_user.id)
-    lang = user_lang.get(user_id, "uz")
-    logger.info(f"Foydalanuvchi {user_id} yubordi: {message.text}")
+    await reset_flow(state, lang, documents=[], file_types=[], file_unique_ids=[])
+    await ask_registration_question(user_id, state, lang, [])
+
+# Admin kodi (asosiy menyu tugmalari menyuga o'tadi)
+@admin_code_router.message(F.text, ~MenuAction(*MAIN_MENU_ACTIONS))
+async def handle_admin_code(message: types.Message, state: FSMContext, lang: str):
+    if message.text == ADMIN_CODE:
+        await state.set_state(AdminFlow.panel)
+        await message.answer(**screen("admin_welcome", lang))
+    else:
+        await state.set_state(None)
+        await message.answer(**screen("not_admin", lang))
 
+# Admin paneli
+async def admin_stats(message: types.Message, user_id, lang, state: FSMContext):
     today = datetime.now().date().isoformat()
-    if today not in daily_users:
-        daily_users[today] = set()
-    daily_users[today].add(user_id)
-    save_data()
-
-    if user_id in user_data and "initial_step" in user_data[user_id]:
-        logger.info(f"User {user_id} in initial registration phase")
-        await handle_initial_answer(message)
-        return
-
-    if message.text == translations[lang]["home"]:
-        admin_state.pop(user_id, None)
-        user_data.pop(user_id, None)
-        await message.answer(translations[lang]["welcome"], reply_markup=get_main_menu(lang))
-        return
-
-    elif message.text == translations[lang]["menu"][1]:
-        operator_info = {
-            "uz": """<b>«PBS IMPEX» XK</b>
-🏢 Manzil: Toshkent shahri, Nukus ko‘chasi, 3 uy
-📞 Telefon: +99871 2155638
-👨‍💼 Sale menedjer: Mohirjon Rustamov
-📱 +99893 355-75-36
-✉️ E-mail: office@pbs-impex.uz
-🌐 Web: https://pbsimpex.com/?v=2""",
-            "ru": """<b>«PBS IMPEX» ЧП</b>
-🏢 Адрес: г. Ташкент, улица Нукус, дом 3
-📞 Телефон: +99871 2155638
-👨‍💼 Менеджер по продажам: Мохиржон Рустамов
-📱 +99893 355-75-36
-✉️ E-mail: office@pbs-impex.uz
-🌐 Сайт: https://pbsimpex.com/?v=2""",
-            "en": """<b>«PBS IMPEX» LLC</b>
-🏢 Address: Nukus street 3, Tashkent
-📞 Phone: +99871 2155638
-👨‍💼 Sales Manager: Mohirjon Rustamov
-📱 +99893 355-75-36
-✉️ E-mail: office@pbs-impex.uz
-🌐 Website: https://pbsimpex.com/?v=2"""
-        }
-        await message.answer(operator_info[lang], reply_markup=get_main_menu(lang), parse_mode="HTML")
-        return
-
-    elif message.text == translations[lang]["menu"][2]:
-        await message.answer(translations[lang]["services"], reply_markup=get_services_menu(lang))
-        return
-
-    elif message.text == translations[lang]["menu"][3]:
-        if user_id in registered_users:
-            initial_data = registered_users[user_id]
-            name_key = translations[lang]["initial_questions"][0]
-            phone_key = translations[lang]["initial_questions"][1]
-            profile_text = translations[lang]["profile"].format(
-                name=initial_data.get(name_key, "Nomalum"),
-                phone=initial_data.get(phone_key, "Nomalum")
-            )
-            await message.answer(profile_text, reply_markup=get_profile_buttons(lang))
-        else:
-            await message.answer(translations[lang]["error_not_registered"], reply_markup=get_main_menu(lang))
-        return
+    stats_text = translations[lang]["stats"].format(**collect(storage, today, LANGUAGES))
+    await message.answer(stats_text, reply_markup=get_admin_menu(lang))
+
+async def admin_post(message: types.Message, user_id, lang, state: FSMContext):
+    await state.set_state(AdminFlow.post)
+    await state.update_data(post_content=empty_post(), audience=empty_audience())
+    await message.answer(**screen("post_prompt", lang))
+
+async def admin_search(message: types.Message, user_id, lang, state: FSMContext):
+    await state.set_state(AdminFlow.search)
+    await message.answer(**screen("search_prompt", lang))
+
+async def admin_back(message: types.Message, user_id, lang, state: FSMContext):
+    await state.set_state(AdminFlow.panel)
+    await message.answer(**screen("admin_welcome", lang))
+
+ADMIN_HANDLERS = {
+    "admin_stats": admin_stats,
+    "admin_post": admin_post,
+    "admin_search": admin_search,
+    "back": admin_back,
+}
 
-    elif user_id in admin_state and admin_state[user_id].get("awaiting_code"):
-        if message.text == ADMIN_CODE:
-            admin_state[user_id] = {"in_admin": True}
-            await message.answer(translations[lang]["admin_welcome"], reply_markup=get_admin_menu(lang))
-        else:
-            admin_state.pop(user_id, None)
-            await message.answer(translations[lang]["not_admin"], reply_markup=get_main_menu(lang))
-        return
+@admin_router.message(F.text, MenuAction(*ADMIN_HANDLERS))
+async def handle_admin_menu(message: types.Message, action: str, state: FSMContext, lang: str):
+    await ADMIN_HANDLERS[action](message, str(message.from_user.id), lang, state)
 
-    elif user_id in admin_state and admin_state[user_id].get("in_admin"):
-        if message.text == translations[lang]["admin_menu"][0]:
-            today = datetime.now().date().isoformat()
-            stats_text = translations[lang]["stats"].format(
-                total=len(users),
-                blocked=len(blocked_users),
-                daily=len(daily_users.get(today, set()))
-            )
-            await message.answer(stats_text, reply_markup=get_admin_menu(lang))
-        elif message.text == translations[lang]["admin_menu"][1]:
-            admin_state[user_id] = {
-                "in_admin": True,
-                "awaiting_post": True,
-                "post_content": {"text": None, "photo": None, "video": None}
-            }
-            await message.answer(translations[lang]["post_prompt"], reply_markup=get_registration_nav(lang))
-        elif message.text == translations[lang]["admin_menu"][2]:
-            admin_state.pop(user_id, None)
-            await message.answer(translations[lang]["welcome"], reply_markup=get_main_menu(lang))
-        elif message.text == translations[lang]["back"]:
-            admin_state[user_id] = {"in_admin": True}
-            await message.answer(translations[lang]["admin_welcome"], reply_markup=get_admin_menu(lang))
+# Admin qidiruvi: so'rov FSM'da saqlanadi, sahifalar inline tugmalar bilan almashtiriladi
+@admin_search_router.message(F.text)
+async def handle_admin_search(message: types.Message, state: FSMContext, lang: str):
+    user_id = str(message.from_user.id)
+    action = menu_action(message.text)
+    if action == "back":
+        await admin_back(message, user_id, lang, state)
         return
-
-    elif message.text in ["🚛 Logistika", "🚛 Логистика", "🚛 Logistics"]:
-        logistics_text = {
-            "uz": """✅ <b>Logistika xizmati</b>
-• Malakali maslahat berish
-• Transport vositalarining qulay kombinatsiyasi (avia, avto, temir yo‘l, suv) asosida optimal yo‘nalish ishlab chiqish
-• Xarajatlarni hisoblash
-• Kerakli hujjatlarni rasmiylashtirish
-• Sug‘urta shartlarini qulaylashtirish
-• Yuk tashish bosqichlari bo‘yicha hisobot berish
-• Hilma-hil mamlakatlardan kelgan yuklarni reeksport mamlakatida to‘plash
-• \"Eshikdan eshikgacha\" xizmati
-• Toshkent va O‘zbekiston bo‘ylab shaxsiy transportda yuk tashish (5 tonna/20 kub; 1.5 tonna/14 kub)
-• Texnik Iqtisodiy Asos shartlariga asosan yuk tashishni tashkil etish""",
-            "ru": """✅ <b>Логистические услуги</b>
-• Консультации от специалистов
-• Оптимальный маршрут с учетом различных видов транспорта (авиа, авто, жд, морской)
-• Расчет затрат
-• Оформление всех необходимых документов
-• Упрощение условий страхования
-• Отчетность по каждому этапу перевозки
-• Консолидация грузов из разных стран в стране реэкспорта
-• Услуга \"от двери до двери\"
-• Перевозки по Ташкенту и всей Узбекистану (5 тонн/20 куб; 1.5 тонн/14 куб)
-• Организация перевозок на основе ТЭО""",
-            "en": """✅ <b>Logistics Service</b>
-• Professional consulting
-• Optimal route planning using air, road, rail, and sea transport
-• Cost calculation
-• Document processing
-• Simplified insurance terms
-• Reporting for each transport stage
-• Consolidation of goods from different countries in re-export country
-• Door-to-door service
-• Local transport across Tashkent and Uzbekistan (5 ton/20 m³; 1.5 ton/14 m³)
-• Full logistics based on feasibility studies"""
-        }
-        await message.answer(logistics_text[lang], parse_mode="HTML", reply_markup=get_services_menu(lang))
+    if action == "home":
+        await menu_home(message, user_id, lang, state)
         return
-
-    elif message.text in ["🧾 Ruxsatnomalar va bojxona xizmatlari", "🧾 Разрешения и таможенные услуги", "🧾 Permits and Customs Services"]:
-        customs_text = {
-            "uz": """✅ <b>Ruxsatnomalar va bojxona xizmatlari</b>
-• Tashqi savdo shartnomalarini tuzishda maslahat va ularni ro‘yxatdan o‘tkazish
-• TIF TN kodi asosida ekspert xulosasi va bojxona moslashtirish
-• Import/eksportdagi xarajatlar bo‘yicha ma’lumot
-• Yuk hujjatlarini olish, raskreditovka qilish, bojxonada ro‘yxatga olish
-• Bojxona xizmatlarini bojxona skladigacha yoki kerakli manzilgacha yetkazish
-• Skladga qo‘yish va nazorat qilish
-• Bojxona deklaratsiyasini tayyorlash""",
-            "ru": """✅ <b>Разрешения и таможенные услуги</b>
-• Консультации по внешнеторговым контрактам и их регистрация
-• Экспертное заключение по ТН ВЭД и согласование с таможней
-• Информация по затратам на импорт/экспорт
-• Получение документов, раскредитовка, регистрация, сопровождение
-• Таможенные услуги до склада или по нужному адресу
-• Хранение и контроль на складе
-• Подготовка таможенной декларации""",
-            "en": """✅ <b>Permits and Customs Services</b>
-• Consulting on foreign trade contracts and registration
-• Expert opinion based on HS Code and customs approval
-• Info on import/export costs
-• Document handling, clearance, customs registration
-• Customs service delivery to warehouse or specified address
-• Storage and monitoring
-• Preparation of customs declaration"""
-        }
-        await message.answer(customs_text[lang], parse_mode="HTML", reply_markup=get_services_menu(lang))
+    query = message.text.strip()
+    await state.update_data(search_query=query)
+    await message.answer(**search_page(query, 0, lang))
+
+@router.callback_query(F.data.startswith("search_page:"))
+async def turn_search_page(callback: types.CallbackQuery, state: FSMContext, lang: str):
+    query = (await state.get_data()).get("search_query")
+    if await state.get_state() != AdminFlow.search.state or query is None:
+        await callback.answer()
         return
+    offset = int(callback.data.split(":")[1])
+    await callback.message.edit_text(**search_page(query, offset, lang))
+    await callback.answer()
 
-    elif message.text in ["🏢 Ma’muriyatchilik ishlari", "🏢 Административные услуги", "🏢 Administrative Services"]:
-        admin_text = {
-            "uz": """✅ <b>Ma’muriyatchilik ishlari</b>
-• Mijozlarimiz tovariga buyurtma va talabnomalarni joylashtirish
-• Tovarni sotib olish shartnomalarini muvofiqlashtirish
-• Yetkazib berish muddati, narxi va xarakteristikasini moslashtirish
-• Tovar va transport hujjatlarini muvofiqlashtirish
-• Invoyslarni olish va tekshirish
-• \"Back orders\" holatini nazorat qilish
-• Buyurtmalarni yig‘ish va jo‘natish""",
-            "ru": """✅ <b>Административные услуги</b>
-• Размещение заказов и заявок на товары клиентов
-• Согласование контрактов на закупку
-• Согласование сроков, цены и характеристик поставки
-• Согласование товарных и транспортных документов
-• Получение и проверка инвойсов
-• Контроль \"Back orders\"
-• Сбор и отправка заказов""",
-            "en": """✅ <b>Administrative Services</b>
-• Placing orders and requests for client goods
-• Coordinating purchase contracts
-• Adjusting delivery time, price, and specifications
-• Coordinating goods and transport documents
-• Receiving and verifying invoices
-• Controlling \"Back orders\"
-• Collecting and dispatching orders"""
-        }
-        await message.answer(admin_text[lang], parse_mode="HTML", reply_markup=get_services_menu(lang))
-        return
+def search_page(query, offset, lang):
+    started = time.perf_counter()
+    total, results = storage.search_registrations(query, offset, SEARCH_PAGE_SIZE)
+    logger.info("Admin search: %d results in %.1f ms", total, (time.perf_counter() - started) * 1000)
+    if not total:
+        return {"text": translations[lang]["search_empty"].format(query=html.escape(query))}
+    items = "\n".join(
+        f"{offset + i}. {html.escape(record.name)} — {record.phone} (<code>{user_id}</code>)"
+        for i, (user_id, record) in enumerate(results, 1)
+    )
+    text = translations[lang]["search_results"].format(
+        query=html.escape(query), total=total, start=offset + 1, end=offset + len(results), items=items
+    )
+    return {"text": text, "reply_markup": get_page_buttons("search_page", offset, total, SEARCH_PAGE_SIZE)}
 
-    elif message.text in ["📄 Sertifikatsiya", "📄 Сертификация", "📄 Certification"]:
-        cert_text = {
-            "uz": """✅ <b>Sertifikatsiya</b>
-• Tovar uchun har xil sertifikatlarni olish (kerak bo‘lganda)
-• Akkreditatsiyaga ega laboratoriyalardan sinov protokollarini va xulosalarni olish
-• Yukni olib kirish yoki olib chiqish uchun kerakli ruxsat xatlarini olish
-• O‘lchash vositalarini metrologik attestatsiyadan o‘tkazish
-• Tovarning soni va sifati uchun ekspertiza va inspeksiya
-• Sertifikatsiya uchun namunalarni tanlab olishni tashkillashtirish""",
-            "ru": """✅ <b>Сертификация</b>
-• Получение различных сертификатов для товаров (при необходимости)
-• Получение протоколов испытаний и заключений из аккредитованных лабораторий
-• Получение разрешений на ввоз или вывоз груза
-• Метрологическая аттестация измерительных средств
-• Экспертиза и инспекция количества и качества товара
-• Организация отбора образцов для сертификации""",
-            "en": """✅ <b>Certification</b>
-• Obtaining various product certificates (if needed)
-• Getting test reports and conclusions from accredited laboratories
-• Obtaining permits for cargo import or export
-• Metrological certification of measuring instruments
-• Product quantity and quality inspection
-• Organizing sample selection for certification"""
-        }
-        await message.answer(cert_text[lang], parse_mode="HTML", reply_markup=get_services_menu(lang))
-        return
+# Asosiy menyu va funksiyalar
+async def menu_home(message: types.Message, user_id, lang, state: FSMContext):
+    await reset_flow(state, lang)
+    await message.answer(**screen("welcome", lang))
+
+async def menu_back(message: types.Message, user_id, lang, state: FSMContext):
+    await message.answer(**screen("welcome", lang))
+
+async def menu_profile(message: types.Message, user_id, lang, state: FSMContext):
+    record = storage.get_registration(user_id)
+    if record is not None:
+        profile_text = translations[lang]["profile"].format(
+            name=record.name or "Nomalum",
+            phone=record.phone or "Nomalum"
+        )
+        await message.answer(profile_text, reply_markup=get_profile_buttons(lang))
+    else:
+        await message.answer(**screen("not_registered", lang))
+
+# Statik ekranlar: amal nomi ekran nomi bilan bir xil
+def static_screen(name):
+    async def handler(message: types.Message, user_id, lang, state: FSMContext):
+        await message.answer(**screen(name, lang))
+    return handler
+
+MENU_HANDLERS = {
+    "home": menu_home,
+    "back": menu_back,
+    "registration": start_registration,
+    "operator": static_screen("operator"),
+    "services": static_screen("services"),
+    "profile": menu_profile,
+    "service_0": static_screen("service_0"),
+    "service_1": static_screen("service_1"),
+    "service_2": static_screen("service_2"),
+    "service_3": static_screen("service_3"),
+}
 
-    elif message.text == translations[lang]["back"]:
-        await message.answer(translations[lang]["welcome"], reply_markup=get_main_menu(lang))
-        return
+@menu_router.message(F.text)
+async def handle_language_and_menu(message: types.Message, state: FSMContext, lang: str):
+    user_id = str(message.from_user.id)
+    logger.info("Foydalanuvchi %s yubordi: %s", user_id, message.text)
+    handler = MENU_HANDLERS.get(menu_action(message.text))
+    if handler is not None:
+        await handler(message, user_id, lang, state)
 
 # Profil tugmalari
 @router.callback_query(F.data == "confirm_profile")
-async def confirm_profile(callback: types.CallbackQuery):
+async def confirm_profile(callback: types.CallbackQuery, lang: str):
     user_id = str(callback.from_user.id)
-    lang = user_lang.get(user_id, "uz")
     await callback.message.delete()
-    await bot.send_message(user_id, translations[lang]["welcome"], reply_markup=get_main_menu(lang))
+    await bot.send_message(user_id, **screen("welcome", lang))
 
 @router.callback_query(F.data == "edit_profile")
-async def edit_profile(callback: types.CallbackQuery):
+async def edit_profile(callback: types.CallbackQuery, state: FSMContext, lang: str):
     user_id = str(callback.from_user.id)
-    lang = user_lang.get(user_id, "uz")
-    user_data[user_id] = {"initial_step": 0, "initial_answers": {}, "awaiting_code": False}
+    await reset_flow(state, lang, initial_answers={})
     await callback.message.delete()
-    await ask_initial_question(user_id)
+    await ask_initial_question(user_id, state, lang, 0)
 
-# Admin post filtiri
-class IsAwaitingPost(Filter):
-    async def __call__(self, message: types.Message) -> bool:
-        user_id = str(message.from_user.id)
-        return admin_state.get(user_id, {}).get("awaiting_post", False)
-
-@router.message(IsAwaitingPost(), F.text | F.photo | F.video)
-async def handle_admin_post(message: types.Message):
+# Admin post
+@admin_post_router.message(StateFilter(AdminFlow.post), F.text | F.photo | F.video)
+async def handle_admin_post(message: types.Message, state: FSMContext, lang: str):
     user_id = str(message.from_user.id)
-    lang = user_lang.get(user_id, "uz")
 
-    if message.text == translations[lang]["back"]:
-        admin_state[user_id] = {"in_admin": True}
-        await message.answer(translations[lang]["admin_welcome"], reply_markup=get_admin_menu(lang))
+    action = menu_action(message.text)
+    if action == "back":
+        await state.set_state(AdminFlow.panel)
+        await message.answer(**screen("admin_welcome", lang))
+        return
+    if action == "home":
+        await menu_home(message, user_id, lang, state)
         return
 
+    data = await state.get_data()
+    post_content = data.get("post_content") or empty_post()
     if message.text:
-        admin_state[user_id]["post_content"]["text"] = message.text
+        post_content["text"] = message.text
     elif message.photo:
-        admin_state[user_id]["post_content"]["photo"] = message.photo[-1].file_id
+        post_content["photo"] = message.photo[-1].file_id
     elif message.video:
-        admin_state[user_id]["post_content"]["video"] = message.video.file_id
+        post_content["video"] = message.video.file_id
+    await state.update_data(post_content=post_content)
 
-    await show_post_preview(user_id, message)
+    await show_post_preview(user_id, lang, post_content, data.get("audience") or empty_audience())
 
-async def show_post_preview(user_id, message: types.Message):
-    lang = user_lang.get(user_id, "uz")
-    post_content = admin_state[user_id]["post_content"]
+# Ko'rinishdagi tugmalarda segment filtrlari va shu segmentdagi qabul qiluvchilar soni (yuborishdan oldin)
+async def show_post_preview(user_id, lang, post_content, audience):
     preview_text = translations[lang]["post_confirm"].format(post=post_content["text"] or "Matn yo‘q")
+    markup = get_post_confirm_buttons(lang, audience, storage.audience_count(audience))
 
     if post_content["photo"]:
-        await bot.send_photo(user_id, post_content["photo"], caption=post_content["text"] or "", reply_markup=get_post_confirm_buttons(lang))
+        await bot.send_photo(user_id, post_content["photo"], caption=post_content["text"] or "", reply_markup=markup)
     elif post_content["video"]:
-        await bot.send_video(user_id, post_content["video"], caption=post_content["text"] or "", reply_markup=get_post_confirm_buttons(lang))
+        await bot.send_video(user_id, post_content["video"], caption=post_content["text"] or "", reply_markup=markup)
     elif post_content["text"]:
-        await bot.send_message(user_id, preview_text, reply_markup=get_post_confirm_buttons(lang))
+        await bot.send_message(user_id, preview_text, reply_markup=markup)
     else:
         await bot.send_message(user_id, "❌ Hech qanday kontent kiritilmadi!", reply_markup=get_registration_nav(lang))
 
 @router.callback_query(F.data == "confirm_post")
-async def confirm_post(callback: types.CallbackQuery):
-    user_id = str(callback.from_user.id)
-    lang = user_lang.get(user_id, "uz")
-    post_content = admin_state[user_id]["post_content"]
-    sent_count = 0
-
-    for uid in users:
-        if uid not in blocked_users:
-            try:
-                if post_content["photo"]:
-                    await bot.send_photo(uid, post_content["photo"], caption=post_content["text"] or "")
-                elif post_content["video"]:
-                    await bot.send_video(uid, post_content["video"], caption=post_content["text"] or "")
-                elif post_content["text"]:
-                    await bot.send_message(uid, post_content["text"])
-                sent_count += 1
-                await asyncio.sleep(0.1)
-            except Exception as e:
-                logger.error(f"Post yuborishda xatolik: {e}")
-                blocked_users.add(uid)
-                save_data()
-
+async def confirm_post(callback: types.CallbackQuery, state: FSMContext, lang: str):
+    if await state.get_state() != AdminFlow.post.state:
+        await callback.answer()  # Takroriy bosish
+        return
+    data = await state.get_data()
+    await state.set_state(AdminFlow.panel)
+    await callback.answer()
     await callback.message.delete()
-    await bot.send_message(user_id, translations[lang]["post_sent"].format(count=sent_count), reply_markup=get_admin_menu(lang))
-    admin_state[user_id] = {"in_admin": True}
+    await queue_post(callback.from_user.id, lang, data.get("post_content") or empty_post(), audience=data.get("audience"))
+
+# Segment filtri tugmasi: keyingi qiymatga o'tiladi, tugmalar yangi son bilan qayta chiziladi
+@router.callback_query(F.data.startswith("audience:"), StateFilter(AdminFlow.post))
+async def change_audience(callback: types.CallbackQuery, state: FSMContext, lang: str):
+    name = callback.data.split(":")[1]
+    if name not in AUDIENCE_FILTERS:
+        await callback.answer()
+        return
+    audience = (await state.get_data()).get("audience") or empty_audience()
+    audience[name] = next_value(audience, name)
+    await state.update_data(audience=audience)
+    await callback.message.edit_reply_markup(
+        reply_markup=get_post_confirm_buttons(lang, audience, storage.audience_count(audience))
+    )
+    await callback.answer()
+
+# Tarqatish fonda (BroadcastRunner) bajariladi, admin darhol panelga qaytadi
+async def queue_post(user_id, lang, post_content, start_at=None, audience=None):
+    await bot.send_message(user_id, translations[lang]["post_queued"], reply_markup=get_admin_menu(lang))
+    await broadcast_runner.create(user_id, lang, post_content, start_at, audience)
 
-@router.callback_query(F.data == "retry_post")
-async def retry_post(callback: types.CallbackQuery):
+@router.callback_query(F.data == "schedule_post")
+async def schedule_post(callback: types.CallbackQuery, state: FSMContext, lang: str):
+    if await state.get_state() != AdminFlow.post.state:
+        await callback.answer()
+        return
+    await state.set_state(AdminFlow.schedule)
+    await callback.answer()
+    await callback.message.answer(translations[lang]["post_schedule_prompt"], reply_markup=get_registration_nav(lang))
+
+@admin_post_router.message(StateFilter(AdminFlow.schedule), F.text)
+async def handle_post_schedule(message: types.Message, state: FSMContext, lang: str):
+    action = menu_action(message.text)
+    if action == "back":
+        await state.set_state(AdminFlow.post)
+        data = await state.get_data()
+        await show_post_preview(str(message.from_user.id), lang, data.get("post_content") or empty_post(),
+                                data.get("audience") or empty_audience())
+        return
+    if action == "home":
+        await menu_home(message, str(message.from_user.id), lang, state)
+        return
+    start_at = parse_start_time(message.text)
+    if start_at is None:
+        await message.answer(translations[lang]["post_schedule_invalid"])
+        return
+    data = await state.get_data()
+    await state.set_state(AdminFlow.panel)
+    await queue_post(message.from_user.id, lang, data.get("post_content") or empty_post(), start_at,
+                     data.get("audience"))
+
+# Progress xabaridagi pauza / davom ettirish / bekor qilish tugmalari
+# (faqat admin kodi qabul qilingandan keyingi holatlarda; AdminFlow.code - hali tekshirilmagan foydalanuvchi)
+@router.callback_query(F.data.startswith("broadcast:"),
+                       StateFilter(AdminFlow.panel, AdminFlow.post, AdminFlow.schedule, AdminFlow.search))
+async def control_broadcast(callback: types.CallbackQuery, state: FSMContext, lang: str):
+    parts = callback.data.split(":")
+    if len(parts) != 3 or parts[1] not in ("pause", "resume", "cancel") or not parts[2].isdigit():
+        await callback.answer(translations[lang]["invalid_action"], show_alert=True)
+        return
+    if await broadcast_runner.control(int(parts[2]), parts[1]) is None:
+        await callback.answer(translations[lang]["invalid_action"], show_alert=True)
+        return
+    await callback.answer()
+
+@router.callback_query(F.data == "retry_post", StateFilter(AdminFlow.post, AdminFlow.schedule))
+async def retry_post(callback: types.CallbackQuery, state: FSMContext, lang: str):
     user_id = str(callback.from_user.id)
-    lang = user_lang.get(user_id, "uz")
-    admin_state[user_id] = {
-        "in_admin": True,
-        "awaiting_post": True,
-        "post_content": {"text": None, "photo": None, "video": None}
-    }
+    await state.set_state(AdminFlow.post)
+    await state.update_data(post_content=empty_post(), audience=empty_audience())
     await callback.message.delete()
-    await bot.send_message(user_id, translations[lang]["post_prompt"], reply_markup=get_registration_nav(lang))
+    await bot.send_message(user_id, **screen("post_prompt", lang))
 
-# Kunlik foydalanuvchilarni yangilash
+# Kunlik foydalanuvchilarni yangilash: ishga tushganda va har yarim tunda
+# o'tgan kunlar siqiladi, DAU/WAU/MAU log qilinadi
 async def reset_daily_users():
     while True:
+        current = datetime.now().date()
+        today = current.isoformat()
+        storage.start_day(today)
+        compacted = storage.compact_activity(today, ACTIVITY_KEEP_DAYS, ACTIVITY_KEEP_MONTHS)
+        yesterday = (current - timedelta(days=1)).isoformat()
+        wau = storage.count_active_between((current - timedelta(days=7)).isoformat(), yesterday)
+        mau = storage.count_active_between((current - timedelta(days=30)).isoformat(), yesterday)
+        storage.set_stat(WAU, yesterday, wau)
+        storage.set_stat(MAU, yesterday, mau)
+        logger.info(f"Kunlik foydalanuvchilar {today} uchun yangilandi (siqildi: {compacted}). "
+                    f"Kecha DAU: {storage.count_active(yesterday)}, WAU: {wau}, MAU: {mau}")
         now = datetime.now()
         next_midnight = (now.replace(hour=23, minute=59, second=59, microsecond=999999) + timedelta(seconds=1))
         await asyncio.sleep((next_midnight - now).total_seconds())
-        today = datetime.now().date().isoformat()
-        daily_users[today] = set()
-        save_data()
-        logger.info(f"Kunlik foydalanuvchilar {today} uchun yangilandi.")
 
 # Webhook server
 async def on_startup():
-    load_data()
+    await storage.open()
+    scheduler.start()
+    if not IS_LEADER:
+        return
+    bitrix_outbox.start()
+    broadcast_runner.start()
     await set_bot_commands()
     webhook_info = await bot.get_webhook_info()
     if webhook_info.url != WEBHOOK_URL:
@@ -902,29 +777,94 @@ async def on_startup():
     asyncio.create_task(reset_daily_users())
 
 async def on_shutdown():
-    await bot.delete_webhook()
+    if background_tasks:
+        await asyncio.wait(background_tasks, timeout=30)
+    await broadcast_runner.close()
+    await bitrix_outbox.close()
+    await storage.close()
+    await dp.storage.close()
+    if IS_LEADER:
+        await bot.delete_webhook()
+    await scheduler.close()
     await bot.session.close()
     logging.info("Bot shutdown")
 
+# Har bir xabar yuborgan foydalanuvchi kunlik faollikka yoziladi
+async def track_activity(handler, event: types.Message, data):
+    if event.from_user is not None:
+        storage.mark_active(str(event.from_user.id), datetime.now().date().isoformat())
+    return await handler(event, data)
+
+# Foydalanuvchi tili FSM ma'lumotlaridan olinib, handlerlarga `lang` sifatida uzatiladi;
+# update davomidagi log yozuvlariga user_id qo'shiladi
+async def inject_language(handler, event, data):
+    state = data.get("state")
+    data["lang"] = (await state.get_data()).get("lang", "uz") if state is not None else "uz"
+    token = log_user_id.set(event.from_user.id if event.from_user else None)
+    try:
+        return await handler(event, data)
+    finally:
+        log_user_id.reset(token)
+
+# Prometheus metrikalari
+async def metrics_handler(request):
+    return web.Response(text=REGISTRY.render(), content_type="text/plain")
+
+def setup_dispatcher():
+    dp.message.middleware(HandlerMetricsMiddleware("message"))
+    dp.callback_query.middleware(HandlerMetricsMiddleware("callback_query"))
+    # Flood cheklovi birinchi: tashlangan update faollik, FSM va saqlash qatlamiga yetmaydi
+    for event, (rate, burst) in parse_limits(THROTTLE_LIMITS).items():
+        dp.observers[event].outer_middleware(ThrottleMiddleware(event, rate, burst, THROTTLE_MUTE, THROTTLE_MAX_USERS))
+    dp.message.outer_middleware(track_activity)
+    dp.message.outer_middleware(inject_language)
+    dp.callback_query.outer_middleware(inject_language)
+    dp.include_routers(
+        router, onboarding_router, admin_post_router, documents_router, admin_code_router, admin_router,
+        admin_search_router, menu_router
+    )
+
+# Ota jarayonda baza ishchilardan oldin bir marta yaratiladi (JSON'dan ko'chirish poygasiz)
+async def prepare_shared_storage():
+    await storage.open()
+    await storage.close()
+
 async def main():
-    dp.include_router(router)
+    if WORKERS > 1 and WORKER_INDEX is None:
+        await run_dispatcher(WEBAPP_HOST, WEBAPP_PORT, WEBHOOK_PATH, WORKERS, WORKER_BASE_PORT,
+                             prepare=prepare_shared_storage)
+        return
+
+    setup_dispatcher()
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
 
     app = web.Application()
-    webhook_requests_handler = SimpleRequestHandler(dispatcher=dp, bot=bot)
+    if INTAKE_WORKERS > 0:
+        intake = UpdateIntake(dp, bot, workers=INTAKE_WORKERS, max_queue=INTAKE_MAX_QUEUE,
+                              max_per_user=INTAKE_MAX_PER_USER, shed_policy=INTAKE_SHED)
+        webhook_requests_handler = IntakeRequestHandler(intake)
+    else:
+        webhook_requests_handler = SimpleRequestHandler(dispatcher=dp, bot=bot)
     webhook_requests_handler.register(app, path=WEBHOOK_PATH)
+    if METRICS_PATH:
+        app.router.add_get(METRICS_PATH, metrics_handler)
     setup_application(app, dp, bot=bot)
 
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT)
+    if WORKER_INDEX is not None:
+        asyncio.create_task(watch_parent())
+        site = web.TCPSite(runner, "127.0.0.1", int(os.getenv("WORKER_PORT")))
+    else:
+        site = web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT)
     await site.start()
 
     try:
         await asyncio.Event().wait()
     finally:
         await runner.cleanup()
+        log_listener.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,195 @@
+import bisect
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+# Prometheus matn formatidagi metrikalar (tashqi kutubxonasiz).
+# Barcha qiymatlar event loop ichida yangilanadi, shuning uchun qulf kerak emas.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        lines = self.header()
+        for values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    # Qiymat so'rov paytida hisoblanadi (masalan, navbat uzunligi)
+    def set_function(self, function):
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                self._values[()] = self._function()
+            except Exception:
+                pass
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self):
+        lines = self.header()
+        for values, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.register(Histogram(
+    "bot_handler_seconds", "Update handler duration", ("event", "handler")))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    "bot_handler_errors_total", "Update handlers that raised", ("event", "handler")))
+TELEGRAM_SECONDS = REGISTRY.register(Histogram(
+    "telegram_api_seconds", "Telegram Bot API call duration (excluding send queue wait)", ("method",)))
+TELEGRAM_ERRORS = REGISTRY.register(Counter(
+    "telegram_api_errors_total", "Failed Telegram Bot API calls", ("method", "error")))
+SEND_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "telegram_send_queue_depth", "Requests waiting in the send scheduler"))
+STORAGE_FLUSH_SECONDS = REGISTRY.register(Histogram(
+    "storage_flush_seconds", "Write-behind JSON snapshot duration"))
+STORAGE_FLUSH_ERRORS = REGISTRY.register(Counter(
+    "storage_flush_errors_total", "Failed write-behind JSON snapshots"))
+INTAKE_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "intake_queue_depth", "Webhook updates waiting for a worker"))
+INTAKE_SHED = REGISTRY.register(Counter(
+    "intake_shed_total", "Webhook updates shed under load", ("reason",)))
+INTAKE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "intake_wait_seconds", "Time an update waited in the intake queue"))
+ARCHIVE_FILES = REGISTRY.register(Counter(
+    "archive_files_total", "Registration documents by archive result", ("result",)))
+ARCHIVE_BYTES = REGISTRY.register(Counter(
+    "archive_bytes_total", "Bytes downloaded into the document archive"))
+FSM_ENTRIES = REGISTRY.register(Gauge(
+    "fsm_entries", "Conversation states held in memory"))
+FSM_EVICTIONS = REGISTRY.register(Counter(
+    "fsm_evictions_total", "Conversation states removed by expiry or the entry cap", ("reason",)))
+THROTTLED = REGISTRY.register(Counter(
+    "throttled_updates_total", "Updates rejected by the per-user flood limit", ("event", "action")))
+BITRIX_SECONDS = REGISTRY.register(Histogram(
+    "bitrix_call_seconds", "Bitrix24 REST call duration", ("method",)))
+BITRIX_ERRORS = REGISTRY.register(Counter(
+    "bitrix_call_errors_total", "Failed Bitrix24 REST calls", ("method",)))
+BITRIX_LEADS = REGISTRY.register(Counter(
+    "bitrix_lead_commands_total", "Bitrix24 lead outbox entries by outcome (add, update, skip)", ("action",)))
+BITRIX_OUTBOX_DEPTH = REGISTRY.register(Gauge(
+    "bitrix_outbox_depth", "Pending Bitrix24 outbox entries"))
+BROADCAST_MESSAGES = REGISTRY.register(Counter(
+    "broadcast_messages_total", "Broadcast deliveries by result", ("result",)))
+BROADCAST_ACTIVE = REGISTRY.register(Gauge(
+    "broadcast_active", "Broadcasts currently being delivered"))
+BROADCAST_PROCESSED = REGISTRY.register(Gauge(
+    "broadcast_processed", "Recipients processed by the current or last broadcast"))
+
+
+# Dispatcher middleware'i: har bir handler qancha vaqt ishlagani va xatolari
+class HandlerMetricsMiddleware:
+    def __init__(self, event):
+        self.event = event
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(self.event, name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, self.event, name)
+
+
+# Bot sessiyasi middleware'i: Telegram API chaqiruvlari (navbatdan keyingi haqiqiy so'rov)
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, name)
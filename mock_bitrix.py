@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+from bitrix import LEAD_ADD, BitrixClient, BitrixOutbox, build_lead_payload
+from storage import JsonStorage
+
+# Soxta Bitrix24 REST serveri: crm.lead.add / crm.lead.update / crm.lead.get va batch.
+# So'rovlar, buyruqlar va yaratilgan leadlar (bir raqamga bir nechta lead ham) hisoblanadi.
+# Bot bilan: BITRIX_WEBHOOK_URL=http://127.0.0.1:8092/rest/1/mock/ python mock_bitrix.py
+# Simulyatsiya: python mock_bitrix.py --simulate 1000 --batch-size 1  (va --batch-size 50 bilan solishtiring)
+
+KEY_RE = re.compile(r"[^\[\]]+")
+
+
+class MockError(Exception):
+    def __init__(self, code, description):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+
+
+# "fields[PHONE][0][VALUE]=..." -> {"fields": {"PHONE": [{"VALUE": ...}]}}
+def parse_query(query):
+    params = {}
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        parts = KEY_RE.findall(key)
+        node = params
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return listify(params)
+
+
+def listify(value):
+    if not isinstance(value, dict):
+        return value
+    if value and all(key.isdigit() for key in value):
+        return [listify(value[key]) for key in sorted(value, key=int)]
+    return {key: listify(item) for key, item in value.items()}
+
+
+class MockBitrix:
+    def __init__(self, latency=0.05, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.leads = {}
+        self.requests = Counter()
+        self.commands = Counter()
+        self.injected = Counter()
+        self._lead_ids = itertools.count(1)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/stats", self.handle_stats)
+        app.router.add_post("/{path:.*}", self.handle)
+        return app
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats())
+
+    async def handle(self, request):
+        method = request.match_info["path"].rstrip("/").rsplit("/", 1)[-1].removesuffix(".json")
+        payload = await request.json() if request.can_read_body else {}
+        self.requests[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if random.random() < self.error_rate:
+            self.injected[method] += 1
+            return web.json_response({"error": "INTERNAL_SERVER_ERROR", "error_description": "Injected error"}, status=503)
+        if method == "batch":
+            return web.json_response({"result": self.batch(payload)})
+        try:
+            return web.json_response({"result": self.execute(method, payload)})
+        except MockError as e:
+            return web.json_response({"error": e.code, "error_description": e.description}, status=400)
+
+    # Buyruqlar ketma-ket bajariladi; halt=0 bo'lsa xato bergan buyruqdan keyin ham davom etiladi
+    def batch(self, payload):
+        results, errors = {}, {}
+        for key, command in payload.get("cmd", {}).items():
+            method, _, query = command.partition("?")
+            try:
+                results[key] = self.execute(method, parse_query(query))
+            except MockError as e:
+                errors[key] = {"error": e.code, "error_description": e.description}
+                if str(payload.get("halt", 0)) not in ("0", "false"):
+                    break
+        return {"result": results, "result_error": errors, "result_total": [], "result_next": []}
+
+    def execute(self, method, params):
+        self.commands[method] += 1
+        if method == "crm.lead.add":
+            lead_id = next(self._lead_ids)
+            self.leads[lead_id] = dict(params.get("fields") or {})
+            return lead_id
+        if method == "crm.lead.update":
+            lead = self.leads.get(int(params.get("id") or 0))
+            if lead is None:
+                raise MockError("NOT_FOUND", "Not found")
+            lead.update(params.get("fields") or {})
+            return True
+        if method == "crm.lead.get":
+            lead_id = int(params.get("id") or 0)
+            if lead_id not in self.leads:
+                raise MockError("NOT_FOUND", "Not found")
+            return {"ID": str(lead_id), **self.leads[lead_id]}
+        raise MockError("ERROR_METHOD_NOT_FOUND", f"Method not found: {method}")
+
+    def stats(self):
+        phones = Counter(
+            lead["PHONE"][0]["VALUE"] for lead in self.leads.values() if lead.get("PHONE")
+        )
+        return {
+            "requests": sum(self.requests.values()),
+            "requests_by_method": dict(self.requests.most_common()),
+            "commands_by_method": dict(self.commands.most_common()),
+            "injected_errors": dict(self.injected),
+            "leads": len(self.leads),
+            "duplicate_leads": sum(count - 1 for count in phones.values())
+        }
+
+
+# Navbatga `registrations` ta lead yoziladi (raqamlarning bir qismi takrorlanadi: qayta ro'yxatdan o'tish),
+# keyin BitrixOutbox navbat bo'shaguncha soxta serverga yuboradi
+async def simulate(args, url, mock):
+    rng = random.Random(args.seed)
+    phones = [f"+99890{rng.randrange(10 ** 7):07d}" for _ in range(max(1, int(args.simulate * (1 - args.repeat_rate))))]
+    with tempfile.TemporaryDirectory() as workdir:
+        storage = JsonStorage(os.path.join(workdir, "bot_data.json"))
+        await storage.open()
+        outbox = BitrixOutbox(storage, BitrixClient(url), batch_size=args.batch_size, base_delay=0.05, max_delay=0.5)
+        for i in range(args.simulate):
+            phone = phones[i] if i < len(phones) else rng.choice(phones)
+            payload = build_lead_payload(f"Foydalanuvchi {phone[-4:]}", phone, range(rng.choice((3, 3, 2))))
+            outbox.enqueue(LEAD_ADD, payload, {"user_id": str(i), "phone": phone})
+        started = time.perf_counter()
+        outbox.start()
+        while storage.outbox_count():
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        await outbox.close()
+        await storage.close()
+    return {
+        "registrations": args.simulate,
+        "distinct_phones": len(phones),
+        "batch_size": outbox.batch_size,
+        "duration_s": round(elapsed, 2),
+        "requests_saved": args.simulate - sum(mock.requests.values()),
+        **mock.stats()
+    }
+
+
+async def main(args):
+    mock = MockBitrix(latency=args.latency / 1000, error_rate=args.error_rate)
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    url = f"http://127.0.0.1:{args.port}/rest/1/mock/"
+    try:
+        if args.simulate:
+            report = await simulate(args, url, mock)
+        else:
+            print(f"Soxta Bitrix24: BITRIX_WEBHOOK_URL={url} (statistika: http://127.0.0.1:{args.port}/stats)",
+                  file=sys.stderr)
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                pass
+            report = mock.stats()
+    finally:
+        await runner.cleanup()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Soxta Bitrix24 REST serveri (lead va batch so'rovlarini hisoblaydi)")
+    parser.add_argument("--port", type=int, default=8092)
+    parser.add_argument("--latency", type=float, default=50, help="Har bir so'rov kechikishi (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503 javoblar ulushi")
+    parser.add_argument("--simulate", type=int, default=0, help="Shuncha ro'yxatdan o'tishni navbat orqali yuborib, hisobot chiqarish")
+    parser.add_argument("--batch-size", type=int, default=50, help="Simulyatsiyada batch hajmi (1 - har bir lead alohida)")
+    parser.add_argument("--repeat-rate", type=float, default=0.2, help="Simulyatsiyada qayta ro'yxatdan o'tishlar ulushi")
+    parser.add_argument("--seed", type=int, default=1)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
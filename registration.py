@@ -0,0 +1,59 @@
+from texts import translations
+
+# Ro'yxatdan o'tgan foydalanuvchi yozuvi: ism, E.164 formatidagi telefon va ro'yxatdan o'tgan til.
+# Eski yozuvlar savol matni bo'yicha saqlangan ({"Ismingiz yoki familiyangiz?": ...}),
+# ular yuklashda shu ko'rinishga o'tkaziladi - maydonlar endi tilga bog'liq emas.
+
+COUNTRY_CODE = "998"
+FIELDS = ("name", "phone")  # dastlabki savollar tartibida
+
+# Barcha tillardagi savol matni -> (maydon, til)
+LEGACY_KEYS = {
+    question: (field, lang)
+    for lang, texts in translations.items()
+    for field, question in zip(FIELDS, texts["initial_questions"])
+}
+
+
+# "90 123 45 67", "998901234567", "+998901234567" -> "+998901234567"; noto'g'ri bo'lsa None
+def normalize_phone(text):
+    digits = text.replace("+", "").replace(" ", "")
+    if not digits.isdigit():
+        return None
+    if len(digits) == 9:
+        return f"+{COUNTRY_CODE}{digits}"
+    if len(digits) == 12:
+        return f"+{digits}"
+    return None
+
+
+class Registration:
+    __slots__ = ("name", "phone", "lang")
+
+    def __init__(self, name="", phone="", lang=""):
+        self.name = name
+        self.phone = phone
+        self.lang = lang
+
+    def to_dict(self):
+        return {"name": self.name, "phone": self.phone, "lang": self.lang}
+
+    # Yangi ({"name", "phone", "lang"}) va eski (savol matni bo'yicha) formatlar
+    @classmethod
+    def from_dict(cls, data):
+        if "name" in data or "phone" in data:
+            return cls(data.get("name") or "", data.get("phone") or "", data.get("lang") or "")
+        record = cls()
+        for key, value in data.items():
+            field, lang = LEGACY_KEYS.get(key, (None, None))
+            if field == "name":
+                record.name = value
+            elif field == "phone":
+                record.phone = normalize_phone(value) or value
+            else:
+                continue
+            record.lang = record.lang or lang
+        return record
+
+    def __repr__(self):
+        return f"Registration(name={self.name!r}, phone={self.phone!r}, lang={self.lang!r})"
@@ -0,0 +1,189 @@
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+
+from texts import translations, SERVICE_BUTTONS, OPERATOR_INFO, SERVICE_TEXTS
+
+LANGUAGES = tuple(translations)
+
+
+# Klaviaturalar (ishga tushishda bir marta quriladi)
+def build_language_menu():
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=translations[lang]["lang_name"], callback_data=f"lang_{lang}")]
+            for lang in LANGUAGES
+        ]
+    )
+
+def build_main_menu(lang):
+    return ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text=btn)] for btn in translations[lang]["menu"]],
+        resize_keyboard=True
+    )
+
+def build_registration_nav(lang):
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text=translations[lang]["home"])],
+            [KeyboardButton(text=translations[lang]["back"])]
+        ],
+        resize_keyboard=True
+    )
+
+def build_services_menu(lang):
+    return ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text=btn)] for btn in SERVICE_BUTTONS[lang]] + [
+            [KeyboardButton(text=translations[lang]["home"])],
+            [KeyboardButton(text=translations[lang]["back"])]
+        ],
+        resize_keyboard=True
+    )
+
+def build_admin_menu(lang):
+    return ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text=btn)] for btn in translations[lang]["admin_menu"]] + [
+            [KeyboardButton(text=translations[lang]["back"])]
+        ],
+        resize_keyboard=True
+    )
+
+def build_inline_pair(lang, confirm_data, retry_data):
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[
+            InlineKeyboardButton(text=translations[lang]["confirm"], callback_data=confirm_data),
+            InlineKeyboardButton(text=translations[lang]["retry"], callback_data=retry_data)
+        ]]
+    )
+
+
+LANGUAGE_MENU = build_language_menu()
+KEYBOARDS = {}
+for _lang in LANGUAGES:
+    KEYBOARDS["main", _lang] = build_main_menu(_lang)
+    KEYBOARDS["registration_nav", _lang] = build_registration_nav(_lang)
+    KEYBOARDS["services", _lang] = build_services_menu(_lang)
+    KEYBOARDS["admin", _lang] = build_admin_menu(_lang)
+    KEYBOARDS["confirm", _lang] = build_inline_pair(_lang, "confirm_registration", "retry_registration")
+    KEYBOARDS["profile", _lang] = build_inline_pair(_lang, "confirm_profile", "edit_profile")
+
+
+def get_language_menu():
+    return LANGUAGE_MENU
+
+def get_main_menu(lang):
+    return KEYBOARDS["main", lang]
+
+def get_registration_nav(lang):
+    return KEYBOARDS["registration_nav", lang]
+
+def get_services_menu(lang):
+    return KEYBOARDS["services", lang]
+
+def get_admin_menu(lang):
+    return KEYBOARDS["admin", lang]
+
+def get_confirm_buttons(lang):
+    return KEYBOARDS["confirm", lang]
+
+def get_profile_buttons(lang):
+    return KEYBOARDS["profile", lang]
+
+# Post ko'rinishi tugmalari (har safar quriladi): segment filtrlari (callback_data = "audience:{filtr}"),
+# tasdiqlash tugmasida esa shu segmentdagi qabul qiluvchilar soni
+def get_post_confirm_buttons(lang, audience, count):
+    t = translations[lang]
+    filters = [
+        InlineKeyboardButton(text=f"{t['audience_filters'][name]}: {audience_value(lang, name, value)}",
+                             callback_data=f"audience:{name}")
+        for name, value in audience.items()
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[filters[i:i + 2] for i in range(0, len(filters), 2)] + [
+        [InlineKeyboardButton(text=f"{t['confirm']} (👥 {count})", callback_data="confirm_post"),
+         InlineKeyboardButton(text=t["retry"], callback_data="retry_post")],
+        [InlineKeyboardButton(text=t["post_schedule"], callback_data="schedule_post")]
+    ])
+
+def audience_value(lang, name, value):
+    t = translations[lang]
+    if value is None:
+        return t["audience_any"]
+    if name == "lang":
+        return translations[value]["lang_name"]
+    if name == "active_days":
+        return t["audience_days"].format(days=value)
+    return t["audience_yes"] if value else t["audience_no"]
+
+# Post tarqatish progress xabari tugmalari: callback_data = "broadcast:{amal}:{id}"
+BROADCAST_ACTIONS = {"running": ("pause", "cancel"), "paused": ("resume", "cancel"), "scheduled": ("cancel",)}
+
+def get_broadcast_buttons(lang, job_id, status):
+    actions = BROADCAST_ACTIONS.get(status)
+    if not actions:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=translations[lang][f"broadcast_{action}"], callback_data=f"broadcast:{action}:{job_id}")
+        for action in actions
+    ]])
+
+# Sahifalash tugmalari (har safar quriladi): callback_data = "{prefix}:{offset}"
+def get_page_buttons(prefix, offset, total, page_size):
+    row = []
+    if offset > 0:
+        row.append(InlineKeyboardButton(text="◀️", callback_data=f"{prefix}:{max(0, offset - page_size)}"))
+    if offset + page_size < total:
+        row.append(InlineKeyboardButton(text="▶️", callback_data=f"{prefix}:{offset + page_size}"))
+    return InlineKeyboardMarkup(inline_keyboard=[row]) if row else None
+
+
+# Statik ekranlar: (ekran, til) -> message.answer() uchun tayyor argumentlar
+def build_screens():
+    screens = {}
+    for lang in LANGUAGES:
+        t = translations[lang]
+        screens["welcome", lang] = {"text": t["welcome"], "reply_markup": get_main_menu(lang)}
+        screens["operator", lang] = {"text": OPERATOR_INFO[lang], "reply_markup": get_main_menu(lang), "parse_mode": "HTML"}
+        screens["services", lang] = {"text": t["services"], "reply_markup": get_services_menu(lang)}
+        screens["not_registered", lang] = {"text": t["error_not_registered"], "reply_markup": get_main_menu(lang)}
+        screens["admin_welcome", lang] = {"text": t["admin_welcome"], "reply_markup": get_admin_menu(lang)}
+        screens["not_admin", lang] = {"text": t["not_admin"], "reply_markup": get_main_menu(lang)}
+        screens["post_prompt", lang] = {"text": t["post_prompt"], "reply_markup": get_registration_nav(lang)}
+        screens["search_prompt", lang] = {"text": t["search_prompt"], "reply_markup": get_registration_nav(lang)}
+        for index, texts in enumerate(SERVICE_TEXTS):
+            screens[f"service_{index}", lang] = {"text": texts[lang], "parse_mode": "HTML", "reply_markup": get_services_menu(lang)}
+    return screens
+
+
+SCREENS = build_screens()
+
+def screen(name, lang):
+    return SCREENS[name, lang]
+
+
+# Oldindan serializatsiya qilingan klaviaturalar: statik klaviatura har safar
+# pydantic -> dict -> JSON aylanishidan o'tmaydi, tayyor JSON satri yuboriladi.
+class PreparedMarkupSession(AiohttpSession):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wire = {}
+
+    def _prepared(self, bot, markup):
+        key = id(markup)
+        wire = self._wire.get(key)
+        if wire is None:
+            wire = self.prepare_value(markup, bot=bot, files={})
+            self._wire[key] = wire
+        return wire
+
+    def build_form_data(self, bot, method):
+        markup = getattr(method, "reply_markup", None)
+        if markup is None or not is_static_markup(markup):
+            return super().build_form_data(bot, method)
+        form = super().build_form_data(bot, method.model_copy(update={"reply_markup": None}))
+        form.add_field("reply_markup", self._prepared(bot, markup))
+        return form
+
+
+_STATIC_MARKUP_IDS = {id(LANGUAGE_MENU)} | {id(markup) for markup in KEYBOARDS.values()}
+
+def is_static_markup(markup):
+    return id(markup) in _STATIC_MARKUP_IDS
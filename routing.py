@@ -0,0 +1,40 @@
+from aiogram.filters import Filter
+
+from texts import translations, SERVICE_BUTTONS
+
+MAIN_MENU_ACTIONS = ("registration", "operator", "services", "profile")
+ADMIN_MENU_ACTIONS = ("admin_stats", "admin_post", "admin_search", "home")
+SERVICE_ACTIONS = tuple(f"service_{i}" for i in range(len(SERVICE_BUTTONS["uz"])))
+
+
+# Tugma matni -> (amal, til). Barcha tillar uchun bir marta quriladi.
+def build_menu_index():
+    index = {}
+    for lang, t in translations.items():
+        entries = [(t["home"], "home"), (t["back"], "back")]
+        entries += zip(t["menu"], MAIN_MENU_ACTIONS)
+        entries += zip(t["admin_menu"], ADMIN_MENU_ACTIONS)
+        entries += zip(SERVICE_BUTTONS[lang], SERVICE_ACTIONS)
+        for text, action in entries:
+            index.setdefault(text, (action, lang))
+    return index
+
+
+MENU_INDEX = build_menu_index()
+
+
+def menu_action(text):
+    entry = MENU_INDEX.get(text)
+    return entry[0] if entry else None
+
+
+# Menyu tugmasi filtri: mos kelsa handlerga `action` uzatiladi
+class MenuAction(Filter):
+    def __init__(self, *actions):
+        self.actions = frozenset(actions)
+
+    async def __call__(self, message):
+        action = menu_action(message.text)
+        if action is None or (self.actions and action not in self.actions):
+            return False
+        return {"action": action}
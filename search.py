@@ -0,0 +1,127 @@
+import re
+from bisect import bisect_left, insort
+
+from registration import COUNTRY_CODE
+
+# Admin qidiruvi uchun xotiradagi indeks: ro'yxatdan o'tganlar telefon raqami prefiksi
+# yoki ism bo'laklari (prefiks) bo'yicha topiladi. Ikkala indeks ham tartiblangan
+# (kalit, user_id) ro'yxati: prefiks oralig'i bisect bilan topiladi, yangilash insort.
+
+# Kirill -> lotin (o'zbek va rus yozuvi), so'ngra ikki yozuvdagi farqlar bir xil shaklga keltiriladi
+CYRILLIC = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "", "ы": "i", "ь": "",
+    "э": "e", "ю": "yu", "я": "ya", "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h",
+}
+# Xasanov/Hasanov/Хасанов, Qodirov/Кодиров, G'ofurov/Gofurov -> bir xil kalit
+FOLDS = {"x": "h", "q": "k", "'": "", "‘": "", "’": "", "ʻ": "", "ʼ": "", "`": ""}
+TRANSLIT = str.maketrans({**CYRILLIC, **FOLDS, "х": "h", "қ": "k"})
+DIGRAPHS = (("kh", "h"), ("zh", "j"))  # Khasanov, Zhanna
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+NON_DIGITS = re.compile(r"\D")
+PHONE_QUERY_RE = re.compile(r"^[\d\s()+-]+$")
+
+
+def name_tokens(text):
+    text = text.lower().translate(TRANSLIT)
+    for old, new in DIGRAPHS:
+        if old in text:
+            text = text.replace(old, new)
+    return TOKEN_RE.findall(text)
+
+
+def phone_digits(phone):
+    return NON_DIGITS.sub("", phone)
+
+
+# Tartiblangan ro'yxatdagi `prefix` bilan boshlanadigan kalitlar oralig'i
+def prefix_range(items, prefix):
+    return bisect_left(items, (prefix,)), bisect_left(items, (prefix + "\uffff",))
+
+
+class SearchIndex:
+    def __init__(self):
+        self.phones = []  # (raqamlar, user_id)
+        self.tokens = []  # (ism bo'lagi, user_id)
+        self.entries = {}  # user_id -> (raqamlar, bo'laklar)
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Ishga tushishda: hamma yozuvlar qo'shilib, bir marta tartiblanadi
+    def build(self, items):
+        for user_id, record in items:
+            digits, tokens = self._keys(record)
+            self.entries[user_id] = (digits, tokens)
+            if digits:
+                self.phones.append((digits, user_id))
+            self.tokens.extend((token, user_id) for token in tokens)
+        self.phones.sort()
+        self.tokens.sort()
+
+    def update(self, user_id, record):
+        keys = self._keys(record)
+        previous = self.entries.get(user_id)
+        if previous == keys:
+            return
+        if previous is not None:
+            self._remove(self.phones, [previous[0]] if previous[0] else [], user_id)
+            self._remove(self.tokens, previous[1], user_id)
+        self.entries[user_id] = keys
+        if keys[0]:
+            insort(self.phones, (keys[0], user_id))
+        for token in keys[1]:
+            insort(self.tokens, (token, user_id))
+
+    @staticmethod
+    def _keys(record):
+        return phone_digits(record.phone), tuple(sorted(set(name_tokens(record.name))))
+
+    @staticmethod
+    def _remove(items, keys, user_id):
+        for key in keys:
+            i = bisect_left(items, (key, user_id))
+            if i < len(items) and items[i] == (key, user_id):
+                del items[i]
+
+    # (jami, sahifadagi user_id'lar). Faqat raqamli so'rov - telefon prefiksi, aks holda ism bo'laklari.
+    def search(self, query, offset=0, limit=10):
+        if PHONE_QUERY_RE.match(query):
+            return self._search_phone(phone_digits(query), offset, limit)
+        return self._search_name(name_tokens(query), offset, limit)
+
+    # "90123" kabi mahalliy raqam ham qidiriladi (+998 90123...); ichma-ich oraliqlar bir marta olinadi
+    def _search_phone(self, digits, offset, limit):
+        if not digits:
+            return 0, []
+        prefixes = [digits]
+        local = COUNTRY_CODE + digits
+        if not local.startswith(digits):
+            prefixes.append(local)
+        ranges = [prefix_range(self.phones, prefix) for prefix in prefixes]
+        total = sum(hi - lo for lo, hi in ranges)
+        page = []
+        for lo, hi in ranges:
+            if offset >= hi - lo:
+                offset -= hi - lo
+                continue
+            page.extend(user_id for _, user_id in self.phones[lo + offset:min(hi, lo + offset + limit - len(page))])
+            offset = 0
+            if len(page) >= limit:
+                break
+        return total, page
+
+    # Birinchi bo'lak bo'yicha nomzodlar (bo'lak tartibida), qolgan bo'laklar bilan kesishma
+    def _search_name(self, tokens, offset, limit):
+        if not tokens:
+            return 0, []
+        tokens = sorted(set(tokens), key=len, reverse=True)
+        lo, hi = prefix_range(self.tokens, tokens[0])
+        candidates = dict.fromkeys(user_id for _, user_id in self.tokens[lo:hi])
+        for token in tokens[1:]:
+            lo, hi = prefix_range(self.tokens, token)
+            matched = {user_id for _, user_id in self.tokens[lo:hi]}
+            candidates = [user_id for user_id in candidates if user_id in matched]
+        candidates = list(candidates)
+        return len(candidates), candidates[offset:offset + limit]
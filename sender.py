@@ -0,0 +1,189 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Navbat ustuvorligi: kichik qiymat oldin yuboriladi
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+send_priority = contextvars.ContextVar("send_priority", default=PRIORITY_INTERACTIVE)
+
+
+# Ommaviy yuborishlar (post tarqatish) shu blok ichida past ustuvorlik oladi
+@contextmanager
+def bulk_priority():
+    token = send_priority.set(PRIORITY_BULK)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    # Token bo'lsa uni oladi va 0 qaytaradi, aks holda necha soniya kutish kerakligini
+    def reserve(self, now):
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def block(self, until):
+        self.blocked_until = max(self.blocked_until, until)
+
+    def idle(self, now):
+        return now >= self.blocked_until and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class _Job:
+    __slots__ = ("call", "chat_id", "future", "attempts")
+
+    def __init__(self, call, chat_id, future):
+        self.call = call
+        self.chat_id = chat_id
+        self.future = future
+        self.attempts = 0
+
+
+# Barcha chiquvchi so'rovlar uchun yagona navbat:
+# umumiy (global) va har bir chat uchun alohida token bucket,
+# TelegramRetryAfter ni avtomatik hisobga olish va bir nechta yuboruvchi vazifalar.
+class SendScheduler:
+    def __init__(self, global_rate=30.0, chat_rate=1.0, chat_burst=3, group_rate=20 / 60, group_burst=5,
+                 workers=8, max_retries=3, max_chat_buckets=10000):
+        self.global_bucket = TokenBucket(global_rate, max(1, int(global_rate)))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+        self._chat_buckets = {}
+        self._queue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._tasks = []
+        self._delayed = 0
+        self._active = 0
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    @property
+    def pending(self):
+        return self._queue.qsize() + self._delayed + self._active
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self, timeout=10):
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.pending:
+            logger.warning(f"Yuborish navbatida {self.pending} ta so'rov qoldi")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, call, chat_id, priority=PRIORITY_INTERACTIVE):
+        job = _Job(call, chat_id, asyncio.get_running_loop().create_future())
+        self._put(priority, next(self._seq), job)
+        return await job.future
+
+    def _put(self, priority, seq, job):
+        self._queue.put_nowait((priority, seq, job))
+
+    def _later(self, delay, priority, seq, job):
+        self._delayed += 1
+        asyncio.get_running_loop().call_later(delay, self._release, priority, seq, job)
+
+    def _release(self, priority, seq, job):
+        self._delayed -= 1
+        self._put(priority, seq, job)
+
+    def _chat_bucket(self, chat_id):
+        chat_id = str(chat_id)
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.max_chat_buckets:
+                now = time.monotonic()
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.idle(now)}
+            # Guruh va kanallar (@username yoki manfiy ID) uchun limit pastroq
+            is_group = chat_id.startswith(("@", "-"))
+            if is_group:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _worker(self):
+        while True:
+            priority, seq, job = await self._queue.get()
+            self._active += 1
+            try:
+                if job.future.done():
+                    continue
+                chat_bucket = self._chat_bucket(job.chat_id)
+                wait = chat_bucket.reserve(time.monotonic())
+                if wait > 0:
+                    # Chat band: ishchi boshqa chatlarga xizmat qilishda davom etadi
+                    self._later(wait, priority, seq, job)
+                    continue
+                while (wait := self.global_bucket.reserve(time.monotonic())) > 0:
+                    await asyncio.sleep(wait)
+                try:
+                    result = await job.call()
+                except TelegramRetryAfter as e:
+                    job.attempts += 1
+                    logger.warning(f"Flood control: chat {job.chat_id}, {e.retry_after}s kutiladi")
+                    chat_bucket.block(time.monotonic() + e.retry_after)
+                    if job.attempts > self.max_retries:
+                        if not job.future.done():
+                            job.future.set_exception(e)
+                    else:
+                        self._later(e.retry_after, priority, seq, job)
+                except Exception as e:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                else:
+                    if not job.future.done():
+                        job.future.set_result(result)
+            finally:
+                self._active -= 1
+
+
+# Bot sessiyasi middleware'i: chat_id bor har bir so'rov rejalashtiruvchi orqali o'tadi
+class SchedulerMiddleware(BaseRequestMiddleware):
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not self.scheduler.running:
+            return await make_request(bot, method)
+        return await self.scheduler.submit(lambda: make_request(bot, method), chat_id, send_priority.get())
@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import tempfile
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Snapshot formati: sarlavha qatori, har bir bo'lim uchun bitta qator va yakunlovchi qator.
+#
+#   BOTSNAP 1
+#   users<TAB>crc32<TAB>{json}
+#   ...
+#   END<TAB>bo'limlar soni
+#
+# Har bir bo'lim alohida CRC32 bilan tekshiriladi, END qatori esa fayl oxirigacha
+# yozilganini bildiradi. Oldingi to'g'ri nusxa `.prev` faylida saqlanadi.
+
+MAGIC = "BOTSNAP"
+VERSION = 1
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def backup_path(path):
+    return path + ".prev"
+
+
+def _checksum(payload):
+    return f"{zlib.crc32(payload.encode('utf-8')):08x}"
+
+
+# Atomar yozish: vaqtinchalik fayl + fsync, joriy fayl `.prev` ga o'tkaziladi
+def write_snapshot(path, sections):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".snap", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(f"{MAGIC} {VERSION}\n")
+            for name, value in sections.items():
+                payload = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+                f.write(f"{name}\t{_checksum(payload)}\t{payload}\n")
+            f.write(f"END\t{len(sections)}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.replace(path, backup_path(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# Faylni o'qish va tekshirish. Eski formatdagi (bitta JSON obyekt) fayl ham o'qiladi.
+def read_snapshot(path):
+    with open(path, "r", encoding="utf-8") as f:
+        header = f.readline()
+        if not header.startswith(MAGIC):
+            try:
+                data = json.loads(header + f.read())
+            except ValueError as e:
+                raise SnapshotError(f"JSON buzilgan: {e}")
+            if not isinstance(data, dict):
+                raise SnapshotError("JSON obyekt kutilgan")
+            return data
+        if header.split()[1:] != [str(VERSION)]:
+            raise SnapshotError(f"Noma'lum snapshot versiyasi: {header.strip()}")
+        sections = {}
+        for line in f:
+            name, _, rest = line.rstrip("\n").partition("\t")
+            if name == "END":
+                if rest != str(len(sections)):
+                    raise SnapshotError(f"Bo'limlar soni mos emas: {rest} != {len(sections)}")
+                return sections
+            checksum, _, payload = rest.partition("\t")
+            if _checksum(payload) != checksum:
+                raise SnapshotError(f"'{name}' bo'limining nazorat summasi mos emas")
+            sections[name] = json.loads(payload)
+    raise SnapshotError("Fayl oxirigacha yozilmagan (END qatori yo'q)")
+
+
+# Joriy fayl buzilgan bo'lsa oldingi to'g'ri nusxaga qaytiladi.
+# Buzilgan fayl o'chirilmaydi, `.corrupt` nomi bilan chetga olinadi.
+def load_snapshot(path):
+    for candidate in (path, backup_path(path)):
+        if not os.path.exists(candidate):
+            continue
+        try:
+            data = read_snapshot(candidate)
+        except (OSError, ValueError) as e:
+            logger.error(f"{candidate} ni o'qib bo'lmadi: {e}")
+            os.replace(candidate, candidate + ".corrupt")
+            continue
+        if candidate != path:
+            logger.warning(f"{path} o'rniga oldingi nusxa ishlatildi: {candidate}")
+        return data
+    return {}
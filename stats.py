@@ -0,0 +1,84 @@
+from datetime import date, timedelta
+
+# Jonli statistika: hisoblagichlar voqea sodir bo'lganda oshiriladi (storage.add_stat),
+# admin paneli faqat tayyor qiymatlarni o'qiydi: jami (day = "") va oxirgi kunlar qatori.
+# Xom ma'lumotlar (foydalanuvchilar, faollik) panel uchun skanerlanmaydi.
+
+USERS = "users"  # yangi foydalanuvchilar (/start)
+BLOCKED = "blocked"  # botni bloklaganlar
+ACTIVE = "active"  # kunlik faol foydalanuvchilar (DAU)
+REGISTRATIONS = "registrations"  # kod bilan tasdiqlanganlar
+VERIFY_FAILED = "verify_failed"  # noto'g'ri tasdiqlash kodi
+DOCUMENTS = "documents"  # yuklangan hujjatlar
+APPLICATIONS = "applications"  # birinchi marta hujjat yuborganlar (takroriy arizalarsiz)
+BROADCAST_SENT = "broadcast_sent"
+BROADCAST_BLOCKED = "broadcast_blocked"
+WAU = "wau"  # har kuni yarim tunda o'tgan kun uchun yoziladi
+MAU = "mau"
+
+TREND_DAYS = 30
+SPARKS = "▁▂▃▄▅▆▇█"
+
+
+def language_stat(lang):
+    return f"lang_{lang}"
+
+
+def sparkline(values):
+    top = max(values, default=0)
+    if not top:
+        return SPARKS[0] * len(values)
+    return "".join(SPARKS[round(value * (len(SPARKS) - 1) / top)] for value in values)
+
+
+def percent(part, whole):
+    return round(100 * part / whole) if whole else 0
+
+
+def latest(series, days):
+    for day in reversed(days):
+        if day in series:
+            return series[day]
+    return 0
+
+
+# Admin paneli uchun qiymatlar: jami, bugungi va oxirgi TREND_DAYS kun
+def collect(storage, today, languages, days=TREND_DAYS):
+    current = date.fromisoformat(today)
+    period = [(current - timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1)]
+    totals = storage.stats_totals()
+    daily = storage.stats_between(period[0], today)
+
+    def series(name):
+        values = daily.get(name, {})
+        return [values.get(day, 0) for day in period]
+
+    def window(name):
+        return sum(series(name))
+
+    started, registered, applied = window(USERS), window(REGISTRATIONS), window(APPLICATIONS)
+    language_total = sum(totals.get(language_stat(lang), 0) for lang in languages)
+    return {
+        "today": today,
+        "total": totals.get(USERS, 0),
+        "new_today": daily.get(USERS, {}).get(today, 0),
+        "blocked": totals.get(BLOCKED, 0),
+        "dau": daily.get(ACTIVE, {}).get(today, 0),
+        "wau": latest(daily.get(WAU, {}), period),
+        "mau": latest(daily.get(MAU, {}), period),
+        "started": started,
+        "registered": registered,
+        "registered_rate": percent(registered, started),
+        "applied": applied,
+        "applied_rate": percent(applied, registered),
+        "verify_failed": window(VERIFY_FAILED),
+        "documents": window(DOCUMENTS),
+        "broadcast_sent": totals.get(BROADCAST_SENT, 0),
+        "broadcast_blocked": totals.get(BROADCAST_BLOCKED, 0),
+        "languages": " · ".join(
+            f"{lang} {percent(totals.get(language_stat(lang), 0), language_total)}%" for lang in languages
+        ),
+        "dau_trend": sparkline(series(ACTIVE)),
+        "users_trend": sparkline(series(USERS)),
+        "registrations_trend": sparkline(series(REGISTRATIONS))
+    }
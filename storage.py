@@ -0,0 +1,1391 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from bisect import bisect_right
+from datetime import date, datetime
+
+from activity import ActivityLog, Bitmap, compaction_cutoffs, days_between, month_of
+from audience import (
+    ALL_USERS, BLOCKED_USERS, REGISTERED, WITH_DOCUMENTS, AudienceIndex, active_range, is_everyone, lang_set, ordinals_of
+)
+from metrics import STORAGE_FLUSH_ERRORS, STORAGE_FLUSH_SECONDS
+from registration import Registration
+from search import SearchIndex
+from snapshot import load_snapshot, write_snapshot
+from stats import ACTIVE, BLOCKED, REGISTRATIONS, USERS, language_stat
+
+logger = logging.getLogger(__name__)
+
+
+# Faylni atomar yozish: vaqtinchalik fayl + os.replace
+def write_json_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# Ma'lumotlarni fonda saqlash (write-behind).
+# O'zgarishlar faqat "dirty" deb belgilanadi va `interval` soniyada bir marta
+# yoki `max_dirty` ta o'zgarish yig'ilganda bitta yozuvga birlashtiriladi.
+# Shu ikki sozlama nosozlikda yo'qolishi mumkin bo'lgan ma'lumot hajmini chegaralaydi.
+class WriteBehindSaver:
+    def __init__(self, write, snapshot, interval=5.0, max_dirty=500):
+        self.write = write
+        self.snapshot = snapshot
+        self.interval = interval
+        self.max_dirty = max(1, max_dirty)
+        self._dirty = 0
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def mark_dirty(self, count=1):
+        self._dirty += count
+        if self._dirty >= self.max_dirty or self.interval <= 0:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval or None)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._dirty:
+                await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._dirty:
+                return
+            pending, self._dirty = self._dirty, 0
+            # Snapshot event loop ichida olinadi (to'plamlar o'zgarib turadi),
+            # serializatsiya va disk I/O esa alohida oqimda bajariladi.
+            started = time.perf_counter()
+            data = self.snapshot()
+            try:
+                await asyncio.to_thread(self.write, data)
+            except Exception as e:
+                self._dirty += pending
+                STORAGE_FLUSH_ERRORS.inc()
+                logger.error(f"Ma'lumotlarni saqlashda xatolik: {e}")
+            else:
+                STORAGE_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Saqlash interfeysi: JSON va SQLite backendlari bir xil metodlarni beradi.
+# Foydalanuvchi ID'lari main.py dagidek satr ko'rinishida uzatiladi.
+class Storage:
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # Ma'lumot diskka yozilganini kutish (post tarqatish kursori kabi nazorat nuqtalari uchun)
+    async def flush(self):
+        pass
+
+    def add_user(self, user_id):
+        raise NotImplementedError
+
+    def count_users(self):
+        raise NotImplementedError
+
+    # Bloklamagan foydalanuvchilar user_id (son) tartibida, `after` dan keyingilari;
+    # `audience` berilsa - faqat shu segment (audience.FILTERS)
+    def iter_recipients(self, after=None, audience=None):
+        raise NotImplementedError
+
+    # Segmentdagi (bloklamagan) foydalanuvchilar soni - post ko'rinishida yuborishdan oldin ko'rsatiladi
+    def audience_count(self, audience=None):
+        raise NotImplementedError
+
+    # Foydalanuvchi tanlagan til (segmentlash uchun)
+    def set_user_lang(self, user_id, lang):
+        raise NotImplementedError
+
+    def block_user(self, user_id):
+        raise NotImplementedError
+
+    def count_blocked(self):
+        raise NotImplementedError
+
+    def start_day(self, day):
+        pass
+
+    def mark_active(self, user_id, day):
+        raise NotImplementedError
+
+    def count_active(self, day):
+        raise NotImplementedError
+
+    # [start, end] kunlarida kamida bir marta faol bo'lgan foydalanuvchilar (WAU/MAU)
+    def count_active_between(self, start, end):
+        raise NotImplementedError
+
+    # Eski kunlarni oylik bitmaplarga siqish, juda eski oylarning bitmaplarini o'chirish
+    def compact_activity(self, today, keep_days, keep_months):
+        raise NotImplementedError
+
+    def is_registered(self, user_id):
+        return self.get_registration(user_id) is not None
+
+    # Registration yozuvi yoki None
+    def get_registration(self, user_id):
+        raise NotImplementedError
+
+    def set_registration(self, user_id, record):
+        raise NotImplementedError
+
+    # Shu telefon raqami (E.164) bilan ro'yxatdan o'tgan foydalanuvchilar
+    def users_by_phone(self, phone):
+        raise NotImplementedError
+
+    # Admin qidiruvi (telefon prefiksi yoki ism): (jami, [(user_id, Registration)])
+    def search_registrations(self, query, offset=0, limit=10):
+        raise NotImplementedError
+
+    # {slot: {"file_id", "file_unique_id", "file_type"}} - foydalanuvchining oxirgi yuborgan hujjatlari
+    def get_documents(self, user_id):
+        raise NotImplementedError
+
+    def set_documents(self, user_id, documents):
+        raise NotImplementedError
+
+    # Hujjatlar arxivi indeksi: file_unique_id -> {"sha256", "size", "file_id", "file_type"}
+    def get_archived(self, file_unique_id):
+        raise NotImplementedError
+
+    def add_archived(self, file_unique_id, record):
+        raise NotImplementedError
+
+    # Statistika hisoblagichlari: kunlik qiymat va jami (day = "") birga oshiriladi.
+    # Foydalanuvchilar, bloklash, faollik va ro'yxatdan o'tish hisoblagichlarini backend o'zi yuritadi.
+    def add_stat(self, name, amount=1, day=None):
+        raise NotImplementedError
+
+    # Faqat kunlik qiymat (masalan, yarim tunda hisoblangan WAU/MAU)
+    def set_stat(self, name, day, value):
+        raise NotImplementedError
+
+    def stats_totals(self):
+        raise NotImplementedError
+
+    # {name: {day: value}}
+    def stats_between(self, start, end):
+        raise NotImplementedError
+
+    # Bitrix24 outbox: status "pending" yoki "failed"; yetkazilganlari o'chiriladi
+    def outbox_add(self, method, payload, context, now):
+        raise NotImplementedError
+
+    def outbox_due(self, now, limit):
+        raise NotImplementedError
+
+    def outbox_next_attempt(self):
+        raise NotImplementedError
+
+    def outbox_retry(self, entry_id, attempts, next_attempt, error):
+        raise NotImplementedError
+
+    def outbox_fail(self, entry_id, attempts, error):
+        raise NotImplementedError
+
+    def outbox_done(self, entry_id):
+        raise NotImplementedError
+
+    def outbox_count(self):
+        raise NotImplementedError
+
+    # Bitrix24 lead keshi: telefon (E.164) -> {"lead_id", "fingerprint"} yoki None
+    def get_lead(self, phone):
+        raise NotImplementedError
+
+    def set_lead(self, phone, lead_id, fingerprint):
+        raise NotImplementedError
+
+    # Post tarqatish vazifalari: {"id", "admin_id", "lang", "content", "status", "start_at", "cursor",
+    # "total", "processed", "sent", "failed", "message_id", "finished_at"}
+    def broadcast_add(self, job):
+        raise NotImplementedError
+
+    def broadcast_get(self, job_id):
+        raise NotImplementedError
+
+    def broadcast_update(self, job_id, **fields):
+        raise NotImplementedError
+
+    # Yuborilishi kerak bo'lgan birinchi vazifa: to'xtab qolgan (running) yoki vaqti kelgan (scheduled)
+    def broadcast_due(self, now):
+        raise NotImplementedError
+
+    def broadcast_next_start(self):
+        raise NotImplementedError
+
+
+# Eski formatda hujjat o'rnida faqat file_id satri saqlangan
+def document_record(value):
+    if isinstance(value, str):
+        return {"file_id": value, "file_unique_id": None, "file_type": None}
+    return value
+
+
+# Faollik tarixi alohida faylda: bot_data.json -> bot_data.history
+def history_path(path):
+    return os.path.splitext(path)[0] + ".history"
+
+
+# bot_data.json ni tarixi bilan birga to'liq o'qish (SQLite'ga ko'chirish uchun).
+# Buzilgan fayl o'rniga oldingi to'g'ri nusxa ishlatiladi.
+def read_json_data(path):
+    data = load_snapshot(path)
+    if "activity" in data:
+        history = ActivityLog.from_dict(data["activity"], history=lambda: load_snapshot(history_path(path)))
+        data["activity"] = history.to_dict()
+    return data
+
+
+# JSON backend: hamma narsa xotirada, diskka WriteBehindSaver orqali yoziladi.
+# Ishga tushishda faqat joriy holat o'qiladi, faollik tarixi birinchi so'rovda yuklanadi.
+class JsonStorage(Storage):
+    def __init__(self, path, save_interval=5.0, save_max_dirty=500):
+        self.path = path
+        self.history_path = history_path(path)
+        self.users = set()
+        self.blocked_users = set()
+        self.activity = ActivityLog()
+        self.registered_users = {}
+        self.phone_index = {}
+        self.search_index = None
+        self.user_langs = {}
+        self.audience_index = None
+        self.user_documents = {}
+        self.archive_files = {}
+        self.bitrix_outbox = {}
+        self.bitrix_leads = {}
+        self.broadcasts = {}
+        self.stats = {}
+        self.saver = WriteBehindSaver(self.write, self.snapshot, interval=save_interval, max_dirty=save_max_dirty)
+
+    async def open(self):
+        self.load()
+        self.saver.start()
+
+    async def close(self):
+        await self.saver.close()
+
+    async def flush(self):
+        self.saver.mark_dirty()
+        await self.saver.flush()
+
+    def load(self):
+        started = time.perf_counter()
+        data = load_snapshot(self.path)
+        self.users = set(data.get("users", []))
+        self.blocked_users = set(data.get("blocked_users", []))
+        self.activity = ActivityLog.from_dict(data.get("activity", {}), history=self._load_history)
+        # Eski format: har bir kun uchun ID'lar ro'yxati
+        for day, user_ids in data.get("daily_users", {}).items():
+            self.activity.start_day(day)
+            for user_id in user_ids:
+                self.activity.mark(user_id, day)
+        # Eski yozuvlar (savol matni bo'yicha) shu yerda yangi formatga o'tadi
+        self.registered_users = {
+            user_id: Registration.from_dict(answers) for user_id, answers in data.get("registered_users", {}).items()
+        }
+        self.phone_index = {}
+        for user_id, record in self.registered_users.items():
+            self._index_phone(record.phone, user_id)
+        self.search_index = None
+        # Eski fayl: ro'yxatdan o'tganlarning tili yozuvidan olinadi
+        self.user_langs = data.get("user_langs") or {
+            user_id: record.lang for user_id, record in self.registered_users.items() if record.lang
+        }
+        self.audience_index = None
+        self.user_documents = data.get("user_documents", {})
+        self.archive_files = data.get("archive_files", {})
+        self.bitrix_outbox = {entry["id"]: entry for entry in data.get("bitrix_outbox", [])}
+        self.bitrix_leads = data.get("bitrix_leads", {})
+        self.broadcasts = {job["id"]: job for job in data.get("broadcasts", [])}
+        self.stats = data.get("stats") or self._seed_stats()
+        logger.info(f"{self.path} yuklandi: {time.perf_counter() - started:.3f}s")
+
+    # Hisoblagichlarsiz eski fayl: jami qiymatlar mavjud ma'lumotlardan bir marta olinadi
+    def _seed_stats(self):
+        stats = {"": {USERS: len(self.users), BLOCKED: len(self.blocked_users), REGISTRATIONS: len(self.registered_users)}}
+        for day, bitmap in self.activity.days.items():
+            stats[day] = {ACTIVE: bitmap.count()}
+        return stats
+
+    def _load_history(self):
+        started = time.perf_counter()
+        data = load_snapshot(self.history_path)
+        logger.info(f"{self.history_path} yuklandi: {time.perf_counter() - started:.3f}s")
+        return data
+
+    # Joriy holat va (faqat o'zgargan bo'lsa) faollik tarixi
+    def snapshot(self):
+        history = None
+        if self.activity.history_dirty:
+            history = self.activity.history_dict()
+            self.activity.history_dirty = False
+        return {
+            "users": list(self.users),
+            "blocked_users": list(self.blocked_users),
+            "activity": self.activity.current_dict(),
+            "registered_users": {user_id: record.to_dict() for user_id, record in self.registered_users.items()},
+            "user_langs": dict(self.user_langs),
+            "user_documents": dict(self.user_documents),
+            "archive_files": dict(self.archive_files),
+            "bitrix_outbox": [dict(entry) for entry in self.bitrix_outbox.values()],
+            "bitrix_leads": dict(self.bitrix_leads),
+            "broadcasts": [dict(job) for job in self.broadcasts.values()],
+            "stats": {day: dict(values) for day, values in self.stats.items()}
+        }, history
+
+    # Alohida oqimda bajariladi. Tarix asosiy fayldan oldin yoziladi: ikkisi orasida
+    # to'xtab qolinsa, kunlar qayta siqiladi (bitmap birlashmasi takrorlansa ham natija o'zgarmaydi).
+    def write(self, data):
+        sections, history = data
+        if history is not None:
+            try:
+                write_snapshot(self.history_path, history)
+            except BaseException:
+                self.activity.history_dirty = True
+                raise
+        write_snapshot(self.path, sections)
+
+    def add_user(self, user_id):
+        if user_id in self.users:
+            return False
+        self.users.add(user_id)
+        self._audience_add(ALL_USERS, user_id)
+        self.add_stat(USERS)
+        return True
+
+    def count_users(self):
+        return len(self.users)
+
+    def iter_recipients(self, after=None, audience=None):
+        if is_everyone(audience):
+            user_ids = sorted(self.users, key=int)
+        else:
+            ordinals = list(self.activity.ordinals)
+            user_ids = sorted((ordinals[ordinal] for ordinal in ordinals_of(self._audience_bits(audience))), key=int)
+        start = 0 if after is None else bisect_right(user_ids, int(after), key=int)
+        for user_id in user_ids[start:]:
+            if user_id not in self.blocked_users:
+                yield user_id
+
+    def audience_count(self, audience=None):
+        if is_everyone(audience):
+            return len(self.users) - len(self.blocked_users)
+        return self._audience_bits(audience).bit_count()
+
+    # Segment bitmaplari birinchi so'rovda quriladi, keyin o'zgarishlar bilan yangilanadi
+    def _audience(self):
+        if self.audience_index is None:
+            ordinal = self.activity.ordinal
+            sets = {
+                ALL_USERS: [ordinal(user_id) for user_id in self.users],
+                BLOCKED_USERS: [ordinal(user_id) for user_id in self.blocked_users],
+                REGISTERED: [ordinal(user_id) for user_id in self.registered_users],
+                WITH_DOCUMENTS: [ordinal(user_id) for user_id, documents in self.user_documents.items() if documents],
+            }
+            for user_id, lang in self.user_langs.items():
+                sets.setdefault(lang_set(lang), []).append(ordinal(user_id))
+            self.audience_index = build_audience_index(sets)
+        return self.audience_index
+
+    def _audience_bits(self, audience):
+        active = 0
+        if audience.get("active_days"):
+            active = self.activity.active_between(*active_range(audience["active_days"]))
+        return self._audience().select(audience, active)
+
+    def _audience_add(self, name, user_id):
+        if self.audience_index is not None:
+            self.audience_index.add(name, self.activity.ordinal(user_id))
+
+    def _audience_discard(self, name, user_id):
+        if self.audience_index is not None:
+            self.audience_index.discard(name, self.activity.ordinal(user_id))
+
+    def set_user_lang(self, user_id, lang):
+        previous = self.user_langs.get(user_id)
+        if previous == lang:
+            return
+        if previous is not None:
+            self._audience_discard(lang_set(previous), user_id)
+        self.user_langs[user_id] = lang
+        self._audience_add(lang_set(lang), user_id)
+        self.add_stat(language_stat(lang))
+        self.saver.mark_dirty()
+
+    def block_user(self, user_id):
+        if user_id not in self.blocked_users:
+            self.blocked_users.add(user_id)
+            self._audience_add(BLOCKED_USERS, user_id)
+            self.add_stat(BLOCKED)
+
+    def count_blocked(self):
+        return len(self.blocked_users)
+
+    def start_day(self, day):
+        if self.activity.start_day(day):
+            self.saver.mark_dirty()
+
+    def mark_active(self, user_id, day):
+        if self.activity.mark(user_id, day):
+            self.add_stat(ACTIVE, day=day)
+
+    def count_active(self, day):
+        return self.activity.count_day(day)
+
+    def count_active_between(self, start, end):
+        return self.activity.count_between(start, end)
+
+    def compact_activity(self, today, keep_days, keep_months):
+        changed = self.activity.compact(today, keep_days, keep_months)
+        if changed:
+            self.saver.mark_dirty(changed)
+        return changed
+
+    def get_registration(self, user_id):
+        return self.registered_users.get(user_id)
+
+    def set_registration(self, user_id, record):
+        previous = self.registered_users.get(user_id)
+        if previous is None:
+            self.add_stat(REGISTRATIONS)
+        elif previous.phone != record.phone:
+            self._unindex_phone(previous.phone, user_id)
+        self.registered_users[user_id] = record
+        self._index_phone(record.phone, user_id)
+        if self.search_index is not None:
+            self.search_index.update(user_id, record)
+        self._audience_add(REGISTERED, user_id)
+        self.saver.mark_dirty()
+
+    def users_by_phone(self, phone):
+        return list(self.phone_index.get(phone, ()))
+
+    # Indeks birinchi qidiruvda quriladi (ishga tushish sekinlashmaydi), keyin set_registration yangilaydi
+    def search_registrations(self, query, offset=0, limit=10):
+        if self.search_index is None:
+            self.search_index = build_search_index(self.registered_users.items())
+        total, user_ids = self.search_index.search(query, offset, limit)
+        return total, [(user_id, self.registered_users[user_id]) for user_id in user_ids]
+
+    # Telefon -> foydalanuvchilar ro'yxati (odatda bitta element)
+    def _index_phone(self, phone, user_id):
+        if phone:
+            user_ids = self.phone_index.setdefault(phone, [])
+            if user_id not in user_ids:
+                user_ids.append(user_id)
+
+    def _unindex_phone(self, phone, user_id):
+        user_ids = self.phone_index.get(phone)
+        if user_ids and user_id in user_ids:
+            user_ids.remove(user_id)
+            if not user_ids:
+                del self.phone_index[phone]
+
+    def get_documents(self, user_id):
+        return {slot: document_record(value) for slot, value in self.user_documents.get(user_id, {}).items()}
+
+    def set_documents(self, user_id, documents):
+        self.user_documents[user_id] = documents
+        if documents:
+            self._audience_add(WITH_DOCUMENTS, user_id)
+        else:
+            self._audience_discard(WITH_DOCUMENTS, user_id)
+        self.saver.mark_dirty()
+
+    def get_archived(self, file_unique_id):
+        return self.archive_files.get(file_unique_id)
+
+    def add_archived(self, file_unique_id, record):
+        self.archive_files[file_unique_id] = record
+        self.saver.mark_dirty()
+
+    def add_stat(self, name, amount=1, day=None):
+        for key in (day or _today(), ""):
+            values = self.stats.setdefault(key, {})
+            values[name] = values.get(name, 0) + amount
+        self.saver.mark_dirty()
+
+    def set_stat(self, name, day, value):
+        self.stats.setdefault(day, {})[name] = value
+        self.saver.mark_dirty()
+
+    def stats_totals(self):
+        return dict(self.stats.get("", {}))
+
+    def stats_between(self, start, end):
+        result = {}
+        for day in days_between(start, end):
+            for name, value in self.stats.get(day, {}).items():
+                result.setdefault(name, {})[day] = value
+        return result
+
+    def outbox_add(self, method, payload, context, now):
+        entry_id = max(self.bitrix_outbox, default=0) + 1
+        self.bitrix_outbox[entry_id] = {
+            "id": entry_id, "method": method, "payload": payload, "context": context,
+            "attempts": 0, "next_attempt": now, "status": "pending", "last_error": None
+        }
+        self.saver.mark_dirty()
+        return entry_id
+
+    def _outbox_pending(self):
+        return [entry for entry in self.bitrix_outbox.values() if entry["status"] == "pending"]
+
+    def outbox_due(self, now, limit):
+        due = sorted((e for e in self._outbox_pending() if e["next_attempt"] <= now), key=lambda e: e["next_attempt"])
+        return [dict(entry) for entry in due[:limit]]
+
+    def outbox_next_attempt(self):
+        return min((entry["next_attempt"] for entry in self._outbox_pending()), default=None)
+
+    def outbox_retry(self, entry_id, attempts, next_attempt, error):
+        self.bitrix_outbox[entry_id].update(attempts=attempts, next_attempt=next_attempt, last_error=error)
+        self.saver.mark_dirty()
+
+    def outbox_fail(self, entry_id, attempts, error):
+        self.bitrix_outbox[entry_id].update(attempts=attempts, status="failed", last_error=error)
+        self.saver.mark_dirty()
+
+    def outbox_done(self, entry_id):
+        self.bitrix_outbox.pop(entry_id, None)
+        self.saver.mark_dirty()
+
+    def outbox_count(self):
+        return len(self._outbox_pending())
+
+    def get_lead(self, phone):
+        lead = self.bitrix_leads.get(phone)
+        return dict(lead) if lead else None
+
+    def set_lead(self, phone, lead_id, fingerprint):
+        self.bitrix_leads[phone] = {"lead_id": lead_id, "fingerprint": fingerprint}
+        self.saver.mark_dirty()
+
+    def broadcast_add(self, job):
+        job_id = max(self.broadcasts, default=0) + 1
+        self.broadcasts[job_id] = {**BROADCAST_DEFAULTS, **job, "id": job_id, "created_at": _now()}
+        self.saver.mark_dirty()
+        return job_id
+
+    def broadcast_get(self, job_id):
+        job = self.broadcasts.get(job_id)
+        return dict(job) if job else None
+
+    def broadcast_update(self, job_id, **fields):
+        self.broadcasts[job_id].update(fields)
+        self.saver.mark_dirty()
+
+    def broadcast_due(self, now):
+        due = [job for job in self.broadcasts.values()
+               if job["status"] == "running" or (job["status"] == "scheduled" and job["start_at"] <= now)]
+        return dict(min(due, key=lambda job: job["id"])) if due else None
+
+    def broadcast_next_start(self):
+        return min((job["start_at"] for job in self.broadcasts.values() if job["status"] == "scheduled"), default=None)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    first_seen TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocked_users (
+    user_id INTEGER PRIMARY KEY,
+    blocked_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_activity (
+    day TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (day, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_daily_activity_user ON daily_activity (user_id, day);
+CREATE TABLE IF NOT EXISTS activity_users (
+    ordinal INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS activity_rollups (
+    period TEXT PRIMARY KEY,
+    active INTEGER NOT NULL,
+    bitmap BLOB
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS registrations (
+    user_id INTEGER PRIMARY KEY,
+    answers TEXT NOT NULL,
+    registered_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_registrations_time ON registrations (registered_at);
+CREATE TABLE IF NOT EXISTS user_langs (
+    user_id INTEGER PRIMARY KEY,
+    lang TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    user_id INTEGER NOT NULL,
+    slot TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    file_unique_id TEXT,
+    file_type TEXT,
+    PRIMARY KEY (user_id, slot)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS archive_files (
+    file_unique_id TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    file_id TEXT NOT NULL,
+    file_type TEXT,
+    archived_at TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_archive_files_sha256 ON archive_files (sha256);
+CREATE TABLE IF NOT EXISTS bitrix_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    method TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    context TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    last_error TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bitrix_outbox_due ON bitrix_outbox (status, next_attempt);
+CREATE TABLE IF NOT EXISTS bitrix_leads (
+    phone TEXT PRIMARY KEY,
+    lead_id INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    admin_id INTEGER NOT NULL,
+    lang TEXT NOT NULL,
+    content TEXT NOT NULL,
+    status TEXT NOT NULL,
+    start_at REAL NOT NULL,
+    cursor TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    message_id INTEGER,
+    created_at TEXT NOT NULL,
+    finished_at REAL,
+    audience TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts (status, start_at);
+CREATE TABLE IF NOT EXISTS stats_counters (
+    day TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (day, name)
+) WITHOUT ROWID;
+"""
+
+BROADCAST_COLUMNS = (
+    "id", "admin_id", "lang", "content", "status", "start_at", "cursor", "total", "processed", "sent", "failed",
+    "message_id", "created_at", "finished_at", "audience"
+)
+BROADCAST_DEFAULTS = {
+    "status": "scheduled", "cursor": None, "total": 0, "processed": 0, "sent": 0, "failed": 0,
+    "message_id": None, "finished_at": None, "audience": None
+}
+
+# Eski bazalarga keyin qo'shilgan ustunlar
+SQLITE_COLUMNS = [
+    ("documents", "file_unique_id", "TEXT"),
+    ("documents", "file_type", "TEXT"),
+    ("registrations", "name", "TEXT"),
+    ("registrations", "phone", "TEXT"),
+    ("registrations", "lang", "TEXT"),
+    ("broadcasts", "audience", "TEXT"),
+]
+
+# Qo'shilgan ustunlarga tayanadigan indekslar (ALTER dan keyin yaratiladi)
+SQLITE_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_registrations_phone ON registrations (phone);
+"""
+
+
+# busy_timeout (ms): yozuvlar hodisalar siklida bajariladi, shuning uchun bir nechta ishchida
+# qisqa bo'lishi kerak - boshqa jarayon qulfni ushlab tursa, hamma update shuncha kutib qoladi
+def connect_sqlite(path, busy_timeout=5000):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+    conn.executescript(SQLITE_SCHEMA)
+    for table, column, ddl in SQLITE_COLUMNS:
+        if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    conn.executescript(SQLITE_INDEXES)
+    return conn
+
+
+# Boshqa ishchi qulfni busy_timeout dan uzoqroq ushlab tursa, foydalanuvchi kutayotgan yozuv
+# hodisalar siklini to'smasdan biroz kutib qayta uriniladi
+async def retry_locked(func, *args, attempts=5, delay=0.05):
+    for attempt in range(1, attempts + 1):
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as e:
+            if attempt == attempts or "locked" not in str(e):
+                raise
+            logger.warning("SQLite band, %s qayta uriniladi (%s/%s): %s", func.__name__, attempt, attempts, e)
+            await asyncio.sleep(delay * attempt)
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def build_audience_index(ordinals_by_set):
+    started = time.perf_counter()
+    index = AudienceIndex()
+    index.build(ordinals_by_set)
+    logger.info(f"Auditoriya indeksi qurildi: {len(index.sets)} ta segment, {time.perf_counter() - started:.3f}s")
+    return index
+
+
+def build_search_index(items):
+    started = time.perf_counter()
+    index = SearchIndex()
+    index.build(items)
+    logger.info(f"Qidiruv indeksi qurildi: {len(index)} ta yozuv, {time.perf_counter() - started:.3f}s")
+    return index
+
+
+# Registration -> (answers, name, phone, lang) ustunlari; answers ustuni eski o'quvchilar uchun saqlanadi
+def _registration_row(record):
+    return json.dumps(record.to_dict(), ensure_ascii=False), record.name, record.phone, record.lang
+
+
+def _today():
+    return date.today().isoformat()
+
+
+# SQLite (WAL) backend: har bir o'zgarish bitta qatorli upsert
+class SqliteStorage(Storage):
+    def __init__(self, path, migrate_from=None, page_size=1000, audience_max_age=None, busy_timeout=5000):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.migrate_from = migrate_from
+        self.page_size = page_size
+        self.conn = None
+        self.search_index = None
+        self.search_synced = ""
+        # Bir nechta ishchida boshqa jarayonlar yozgan o'zgarishlar uchun indeks shuncha soniyada qayta quriladi
+        self.audience_max_age = audience_max_age
+        self.audience_index = None
+        self.audience_built = 0.0
+
+    async def open(self):
+        if self.migrate_from and not os.path.exists(self.path) and os.path.exists(self.migrate_from):
+            migrate_json_to_sqlite(self.migrate_from, self.path)
+        self.conn = connect_sqlite(self.path, self.busy_timeout)
+        if self._scalar("SELECT COUNT(*) FROM stats_counters WHERE day = ''") == 0:
+            self._seed_stats()
+        self._migrate_registrations()
+        if self.conn.execute("SELECT 1 FROM user_langs LIMIT 1").fetchone() is None:
+            # Tillar jadvalidan oldingi baza: ro'yxatdan o'tganlarning tili yozuvidan olinadi
+            self.conn.execute(
+                "INSERT OR IGNORE INTO user_langs (user_id, lang) SELECT user_id, lang FROM registrations WHERE lang != ''"
+            )
+
+    async def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.execute("PRAGMA optimize")
+            except sqlite3.OperationalError as e:
+                logger.warning(f"PRAGMA optimize bajarilmadi: {e}")
+            self.conn.close()
+            self.conn = None
+
+    def _scalar(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchone()[0]
+
+    # Hisoblagichlarsiz eski baza: jami va kunlik qiymatlar jadvallardan bir marta tiklanadi
+    def _seed_stats(self):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            for name, table in ((USERS, "users"), (BLOCKED, "blocked_users"), (REGISTRATIONS, "registrations")):
+                self.conn.execute(
+                    f"INSERT OR IGNORE INTO stats_counters (day, name, value) SELECT '', ?, COUNT(*) FROM {table}", (name,)
+                )
+            for name, table, column in ((USERS, "users", "first_seen"), (REGISTRATIONS, "registrations", "registered_at")):
+                self.conn.execute(
+                    f"INSERT OR IGNORE INTO stats_counters (day, name, value) "
+                    f"SELECT substr({column}, 1, 10), ?, COUNT(*) FROM {table} GROUP BY 1", (name,)
+                )
+            self.conn.execute(
+                "INSERT OR IGNORE INTO stats_counters (day, name, value) "
+                "SELECT period, ?, active FROM activity_rollups WHERE length(period) = 10", (ACTIVE,)
+            )
+            self.conn.execute(
+                "INSERT OR IGNORE INTO stats_counters (day, name, value) "
+                "SELECT day, ?, COUNT(*) FROM daily_activity GROUP BY day", (ACTIVE,)
+            )
+
+    def _add_stat(self, name, amount=1, day=None):
+        self.conn.executemany(
+            "INSERT INTO stats_counters (day, name, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(day, name) DO UPDATE SET value = value + excluded.value",
+            [(day or _today(), name, amount), ("", name, amount)]
+        )
+
+    def add_stat(self, name, amount=1, day=None):
+        try:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self._add_stat(name, amount, day)
+        except sqlite3.OperationalError as e:
+            logger.warning("Statistika yozilmadi (%s): %s", name, e)
+
+    def set_stat(self, name, day, value):
+        self.conn.execute(
+            "INSERT INTO stats_counters (day, name, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(day, name) DO UPDATE SET value = excluded.value",
+            (day, name, value)
+        )
+
+    def stats_totals(self):
+        return dict(self.conn.execute("SELECT name, value FROM stats_counters WHERE day = ''"))
+
+    def stats_between(self, start, end):
+        result = {}
+        for day, name, value in self.conn.execute(
+                "SELECT day, name, value FROM stats_counters WHERE day BETWEEN ? AND ?", (start, end)):
+            result.setdefault(name, {})[day] = value
+        return result
+
+    def add_user(self, user_id):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, first_seen) VALUES (?, ?)", (int(user_id), _now())
+            )
+            if cur.rowcount > 0:
+                self._add_stat(USERS)
+        if cur.rowcount > 0:
+            self._audience_add(ALL_USERS, user_id)
+        return cur.rowcount > 0
+
+    def count_users(self):
+        return self._scalar("SELECT COUNT(*) FROM users")
+
+    # Keyset paginatsiya: uzoq davom etadigan yuborish paytida kursor ochiq qolmaydi.
+    # Segment bo'yicha yuborishda tartib raqami segment bitmapida bo'lganlar olinadi.
+    def iter_recipients(self, after=None, audience=None):
+        bitmap = None if is_everyone(audience) else Bitmap.from_int(self._audience_bits(audience))
+        # "? IS NULL OR ..." sharti PRIMARY KEY oralig'idan foydalanishga to'sqinlik qiladi
+        last = -1 if after is None else int(after)
+        while True:
+            rows = self.conn.execute(
+                "SELECT u.user_id, a.ordinal FROM users u LEFT JOIN blocked_users b ON b.user_id = u.user_id "
+                "LEFT JOIN activity_users a ON a.user_id = u.user_id "
+                "WHERE b.user_id IS NULL AND u.user_id > ? ORDER BY u.user_id LIMIT ?",
+                (last, self.page_size)
+            ).fetchall()
+            if not rows:
+                return
+            for user_id, ordinal in rows:
+                if bitmap is None or (ordinal is not None and ordinal in bitmap):
+                    yield str(user_id)
+            last = rows[-1][0]
+
+    def audience_count(self, audience=None):
+        if is_everyone(audience):
+            return self.count_users() - self.count_blocked()
+        return self._audience_bits(audience).bit_count()
+
+    # Segment bitmaplari activity_users tartib raqamlari bo'yicha (raqami yo'q foydalanuvchilarga shu yerda beriladi)
+    def _audience(self):
+        stale = self.audience_max_age is not None and time.monotonic() - self.audience_built > self.audience_max_age
+        if self.audience_index is None or stale:
+            self.conn.execute("INSERT OR IGNORE INTO activity_users (user_id) SELECT user_id FROM users")
+            sets = {}
+            for name, table in ((ALL_USERS, "users"), (BLOCKED_USERS, "blocked_users"), (REGISTERED, "registrations"),
+                                (WITH_DOCUMENTS, "documents")):
+                rows = self.conn.execute(
+                    f"SELECT DISTINCT a.ordinal FROM {table} t JOIN activity_users a ON a.user_id = t.user_id"
+                )
+                sets[name] = [ordinal for (ordinal,) in rows]
+            rows = self.conn.execute("SELECT t.lang, a.ordinal FROM user_langs t JOIN activity_users a ON a.user_id = t.user_id")
+            for lang, ordinal in rows:
+                sets.setdefault(lang_set(lang), []).append(ordinal)
+            self.audience_index = build_audience_index(sets)
+            self.audience_built = time.monotonic()
+        return self.audience_index
+
+    def _audience_bits(self, audience):
+        active = 0
+        if audience.get("active_days"):
+            active, _ = self._active_between(*active_range(audience["active_days"]))
+        return self._audience().select(audience, active)
+
+    def _ordinal(self, user_id):
+        self.conn.execute("INSERT OR IGNORE INTO activity_users (user_id) VALUES (?)", (int(user_id),))
+        return self._scalar("SELECT ordinal FROM activity_users WHERE user_id = ?", (int(user_id),))
+
+    def _audience_add(self, name, user_id):
+        if self.audience_index is not None:
+            self.audience_index.add(name, self._ordinal(user_id))
+
+    def _audience_discard(self, name, user_id):
+        if self.audience_index is not None:
+            self.audience_index.discard(name, self._ordinal(user_id))
+
+    def set_user_lang(self, user_id, lang):
+        previous = self.conn.execute("SELECT lang FROM user_langs WHERE user_id = ?", (int(user_id),)).fetchone()
+        if previous is not None and previous[0] == lang:
+            return
+        # Til statistikasi har bosishda emas, faqat til o'zgarganda oshiriladi
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "INSERT INTO user_langs (user_id, lang) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET lang = excluded.lang",
+                (int(user_id), lang)
+            )
+            self._add_stat(language_stat(lang))
+        if previous is not None:
+            self._audience_discard(lang_set(previous[0]), user_id)
+        self._audience_add(lang_set(lang), user_id)
+
+    def block_user(self, user_id):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO blocked_users (user_id, blocked_at) VALUES (?, ?)", (int(user_id), _now())
+            )
+            if cur.rowcount > 0:
+                self._add_stat(BLOCKED)
+        if cur.rowcount > 0:
+            self._audience_add(BLOCKED_USERS, user_id)
+
+    def count_blocked(self):
+        return self._scalar("SELECT COUNT(*) FROM blocked_users")
+
+    # Ko'p hollarda qator allaqachon bor: tranzaksiya faqat yangi faollikda ochiladi
+    def mark_active(self, user_id, day):
+        try:
+            if self.conn.execute("SELECT 1 FROM daily_activity WHERE day = ? AND user_id = ?", (day, int(user_id))).fetchone():
+                return
+            with self.conn:
+                self.conn.execute("BEGIN")
+                cur = self.conn.execute("INSERT OR IGNORE INTO daily_activity (day, user_id) VALUES (?, ?)", (day, int(user_id)))
+                if cur.rowcount > 0:
+                    self._add_stat(ACTIVE, day=day)
+        except sqlite3.OperationalError as e:
+            # Faollik statistikasi ixtiyoriy: qulf band bo'lsa update to'xtatilmaydi
+            logger.warning("Faollik yozilmadi (user_id: %s): %s", user_id, e)
+
+    # Joriy kun daily_activity qatorlarida, o'tgan kunlar activity_rollups dagi bitmaplarda
+    def count_active(self, day):
+        row = self.conn.execute("SELECT active FROM activity_rollups WHERE period = ?", (day,)).fetchone()
+        if row:
+            return row[0]
+        return self._scalar("SELECT COUNT(*) FROM daily_activity WHERE day = ?", (day,))
+
+    def _rollup_bitmap(self, period):
+        row = self.conn.execute("SELECT bitmap FROM activity_rollups WHERE period = ?", (period,)).fetchone()
+        return Bitmap(row[0]) if row and row[0] is not None else None
+
+    def count_active_between(self, start, end):
+        active, unknown = self._active_between(start, end)
+        return active.bit_count() + unknown
+
+    # (tartib raqamlari bitmapi, raqami hali berilmagan faol foydalanuvchilar soni)
+    def _active_between(self, start, end):
+        active, months = 0, set()
+        for day in days_between(start, end):
+            bitmap = self._rollup_bitmap(day)
+            if bitmap is not None:
+                active |= bitmap.as_int()
+            elif self._rollup_bitmap(month_of(day)) is not None:
+                months.add(month_of(day))
+        for month in months:
+            active |= self._rollup_bitmap(month).as_int()
+        # Hali siqilmagan kunlar: tartib raqami yo'q foydalanuvchilar hech bir bitmapda yo'q
+        rows = self.conn.execute(
+            "SELECT DISTINCT d.user_id, a.ordinal FROM daily_activity d "
+            "LEFT JOIN activity_users a ON a.user_id = d.user_id WHERE d.day BETWEEN ? AND ?",
+            (start, end)
+        ).fetchall()
+        active |= Bitmap.from_ordinals(ordinal for _, ordinal in rows if ordinal is not None).as_int()
+        return active, sum(1 for _, ordinal in rows if ordinal is None)
+
+    def _merge_rollup(self, period, bitmap):
+        existing = self._rollup_bitmap(period)
+        if existing is not None:
+            bitmap = Bitmap.from_int(existing.as_int() | bitmap.as_int())
+        self.conn.execute(
+            "INSERT INTO activity_rollups (period, active, bitmap) VALUES (?, ?, ?) "
+            "ON CONFLICT(period) DO UPDATE SET active = excluded.active, bitmap = excluded.bitmap",
+            (period, bitmap.count(), bitmap.to_bytes())
+        )
+
+    def compact_activity(self, today, keep_days, keep_months):
+        day_cutoff, month_cutoff = compaction_cutoffs(today, keep_days, keep_months)
+        changed = 0
+        # 1. Tugagan kunlarning qatorlari bitmapga aylantiriladi
+        days = [day for (day,) in self.conn.execute("SELECT DISTINCT day FROM daily_activity WHERE day < ?", (today,))]
+        for day in days:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO activity_users (user_id) SELECT user_id FROM daily_activity WHERE day = ?",
+                    (day,)
+                )
+                ordinals = self.conn.execute(
+                    "SELECT a.ordinal FROM daily_activity d JOIN activity_users a ON a.user_id = d.user_id WHERE d.day = ?",
+                    (day,)
+                )
+                self._merge_rollup(day, Bitmap.from_ordinals(ordinal for (ordinal,) in ordinals))
+                self.conn.execute("DELETE FROM daily_activity WHERE day = ?", (day,))
+            changed += 1
+        # 2. Saqlash muddatidan o'tgan kunlar oylik bitmapga qo'shiladi (kunlik son qoladi)
+        old_days = self.conn.execute(
+            "SELECT period, bitmap FROM activity_rollups WHERE length(period) = 10 AND period < ? AND bitmap IS NOT NULL",
+            (day_cutoff,)
+        ).fetchall()
+        for day, bitmap in old_days:
+            with self.conn:
+                # Avval o'qiladi: yozish qulfi tranzaksiya boshida olinadi
+                self.conn.execute("BEGIN IMMEDIATE")
+                self._merge_rollup(month_of(day), Bitmap(bitmap))
+                self.conn.execute("UPDATE activity_rollups SET bitmap = NULL WHERE period = ?", (day,))
+            changed += 1
+        # 3. Juda eski oylardan faqat MAU soni qoladi
+        cur = self.conn.execute(
+            "UPDATE activity_rollups SET bitmap = NULL WHERE length(period) = 7 AND period < ? AND bitmap IS NOT NULL",
+            (month_cutoff,)
+        )
+        return changed + cur.rowcount
+
+    # Eski qatorlar (faqat savol matni bo'yicha `answers`) name/phone/lang ustunlariga yoyiladi
+    def _migrate_registrations(self):
+        rows = self.conn.execute("SELECT user_id, answers FROM registrations WHERE name IS NULL").fetchall()
+        if not rows:
+            return
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "UPDATE registrations SET answers = ?, name = ?, phone = ?, lang = ? WHERE user_id = ?",
+                [_registration_row(Registration.from_dict(json.loads(answers))) + (user_id,)
+                 for user_id, answers in rows]
+            )
+        logger.info(f"{len(rows)} ta ro'yxatdan o'tish yozuvi yangi formatga o'tkazildi")
+
+    def get_registration(self, user_id):
+        row = self.conn.execute(
+            "SELECT name, phone, lang FROM registrations WHERE user_id = ?", (int(user_id),)
+        ).fetchone()
+        return Registration(*row) if row else None
+
+    def set_registration(self, user_id, record):
+        with self.conn:
+            # IMMEDIATE: WAL'da o'qish tranzaksiyasini yozishga o'tkazish busy_timeout'siz SQLITE_BUSY beradi
+            self.conn.execute("BEGIN IMMEDIATE")
+            if not self.conn.execute("SELECT 1 FROM registrations WHERE user_id = ?", (int(user_id),)).fetchone():
+                self._add_stat(REGISTRATIONS)
+            self.conn.execute(
+                "INSERT INTO registrations (user_id, answers, name, phone, lang, registered_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET answers = excluded.answers, name = excluded.name, "
+                "phone = excluded.phone, lang = excluded.lang, registered_at = excluded.registered_at",
+                (int(user_id),) + _registration_row(record) + (_now(),)
+            )
+        self._audience_add(REGISTERED, user_id)
+
+    def users_by_phone(self, phone):
+        return [str(user_id) for (user_id,) in
+                self.conn.execute("SELECT user_id FROM registrations WHERE phone = ?", (phone,))]
+
+    # Indeks birinchi qidiruvda quriladi, keyin registered_at bo'yicha yangi/o'zgargan qatorlar
+    # qo'shib boriladi (boshqa ishchi jarayonlar yozgan ro'yxatdan o'tishlar ham ko'rinadi)
+    def _sync_search_index(self):
+        rows = self.conn.execute(
+            "SELECT user_id, name, phone, registered_at FROM registrations WHERE registered_at >= ?",
+            (self.search_synced,)
+        ).fetchall()
+        items = [(str(user_id), Registration(name or "", phone or "")) for user_id, name, phone, _ in rows]
+        if self.search_index is None:
+            self.search_index = build_search_index(items)
+        else:
+            for user_id, record in items:
+                self.search_index.update(user_id, record)
+        self.search_synced = max((row[3] for row in rows), default=self.search_synced)
+
+    def search_registrations(self, query, offset=0, limit=10):
+        self._sync_search_index()
+        total, user_ids = self.search_index.search(query, offset, limit)
+        return total, [(user_id, self.get_registration(user_id)) for user_id in user_ids]
+
+    def get_documents(self, user_id):
+        rows = self.conn.execute(
+            "SELECT slot, file_id, file_unique_id, file_type FROM documents WHERE user_id = ?", (int(user_id),)
+        )
+        return {
+            slot: {"file_id": file_id, "file_unique_id": file_unique_id, "file_type": file_type}
+            for slot, file_id, file_unique_id, file_type in rows
+        }
+
+    def set_documents(self, user_id, documents):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("DELETE FROM documents WHERE user_id = ?", (int(user_id),))
+            self.conn.executemany(
+                "INSERT INTO documents (user_id, slot, file_id, file_unique_id, file_type) VALUES (?, ?, ?, ?, ?)",
+                [(int(user_id), str(slot), doc["file_id"], doc.get("file_unique_id"), doc.get("file_type"))
+                 for slot, doc in documents.items()]
+            )
+        if documents:
+            self._audience_add(WITH_DOCUMENTS, user_id)
+        else:
+            self._audience_discard(WITH_DOCUMENTS, user_id)
+
+    def get_archived(self, file_unique_id):
+        row = self.conn.execute(
+            "SELECT sha256, size, file_id, file_type FROM archive_files WHERE file_unique_id = ?", (file_unique_id,)
+        ).fetchone()
+        return {"sha256": row[0], "size": row[1], "file_id": row[2], "file_type": row[3]} if row else None
+
+    def add_archived(self, file_unique_id, record):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO archive_files (file_unique_id, sha256, size, file_id, file_type, archived_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (file_unique_id, record["sha256"], record["size"], record["file_id"], record.get("file_type"), _now())
+        )
+
+    def outbox_add(self, method, payload, context, now):
+        cur = self.conn.execute(
+            "INSERT INTO bitrix_outbox (method, payload, context, next_attempt, created_at) VALUES (?, ?, ?, ?, ?)",
+            (method, json.dumps(payload, ensure_ascii=False), json.dumps(context, ensure_ascii=False), now, _now())
+        )
+        return cur.lastrowid
+
+    def outbox_due(self, now, limit):
+        rows = self.conn.execute(
+            "SELECT id, method, payload, context, attempts FROM bitrix_outbox "
+            "WHERE status = 'pending' AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+            (now, limit)
+        ).fetchall()
+        return [
+            {"id": row[0], "method": row[1], "payload": json.loads(row[2]), "context": json.loads(row[3]),
+             "attempts": row[4]}
+            for row in rows
+        ]
+
+    def outbox_next_attempt(self):
+        return self._scalar("SELECT MIN(next_attempt) FROM bitrix_outbox WHERE status = 'pending'")
+
+    def outbox_retry(self, entry_id, attempts, next_attempt, error):
+        self.conn.execute(
+            "UPDATE bitrix_outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+            (attempts, next_attempt, error, entry_id)
+        )
+
+    def outbox_fail(self, entry_id, attempts, error):
+        self.conn.execute(
+            "UPDATE bitrix_outbox SET attempts = ?, status = 'failed', last_error = ? WHERE id = ?",
+            (attempts, error, entry_id)
+        )
+
+    def outbox_done(self, entry_id):
+        self.conn.execute("DELETE FROM bitrix_outbox WHERE id = ?", (entry_id,))
+
+    def outbox_count(self):
+        return self._scalar("SELECT COUNT(*) FROM bitrix_outbox WHERE status = 'pending'")
+
+    def get_lead(self, phone):
+        row = self.conn.execute("SELECT lead_id, fingerprint FROM bitrix_leads WHERE phone = ?", (phone,)).fetchone()
+        return {"lead_id": row[0], "fingerprint": row[1]} if row else None
+
+    def set_lead(self, phone, lead_id, fingerprint):
+        self.conn.execute(
+            "INSERT INTO bitrix_leads (phone, lead_id, fingerprint, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(phone) DO UPDATE SET lead_id = excluded.lead_id, fingerprint = excluded.fingerprint, "
+            "updated_at = excluded.updated_at",
+            (phone, lead_id, fingerprint, _now())
+        )
+
+    def _broadcast(self, row):
+        if row is None:
+            return None
+        job = dict(zip(BROADCAST_COLUMNS, row))
+        job["content"] = json.loads(job["content"])
+        job["audience"] = json.loads(job["audience"]) if job["audience"] else None
+        return job
+
+    def broadcast_add(self, job):
+        job = {**BROADCAST_DEFAULTS, **job, "created_at": _now()}
+        job["content"] = json.dumps(job["content"], ensure_ascii=False)
+        job["audience"] = json.dumps(job["audience"]) if job["audience"] else None
+        columns = [column for column in BROADCAST_COLUMNS if column != "id"]
+        cur = self.conn.execute(
+            f"INSERT INTO broadcasts ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [job[column] for column in columns]
+        )
+        return cur.lastrowid
+
+    def broadcast_get(self, job_id):
+        return self._broadcast(self.conn.execute(
+            f"SELECT {', '.join(BROADCAST_COLUMNS)} FROM broadcasts WHERE id = ?", (job_id,)
+        ).fetchone())
+
+    def broadcast_update(self, job_id, **fields):
+        self.conn.execute(
+            f"UPDATE broadcasts SET {', '.join(f'{column} = ?' for column in fields)} WHERE id = ?",
+            [*fields.values(), job_id]
+        )
+
+    def broadcast_due(self, now):
+        return self._broadcast(self.conn.execute(
+            f"SELECT {', '.join(BROADCAST_COLUMNS)} FROM broadcasts "
+            "WHERE status = 'running' OR (status = 'scheduled' AND start_at <= ?) ORDER BY id LIMIT 1",
+            (now,)
+        ).fetchone())
+
+    def broadcast_next_start(self):
+        return self._scalar("SELECT MIN(start_at) FROM broadcasts WHERE status = 'scheduled'")
+
+
+# bot_data.json dan SQLite bazaga bir martalik ko'chirish
+def migrate_json_to_sqlite(json_path, db_path):
+    data = read_json_data(json_path)
+    now = _now()
+    conn = connect_sqlite(db_path)
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (user_id, first_seen) VALUES (?, ?)",
+                [(int(uid), now) for uid in data.get("users", [])]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO blocked_users (user_id, blocked_at) VALUES (?, ?)",
+                [(int(uid), now) for uid in data.get("blocked_users", [])]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO daily_activity (day, user_id) VALUES (?, ?)",
+                [(day, int(uid)) for day, uids in data.get("daily_users", {}).items() for uid in uids]
+            )
+            # Faollik bitmaplari: tartib raqamlari saqlanadi, saqlanayotgan kunlar
+            # qatorlarga yoyiladi va keyingi compact_activity() da qayta siqiladi
+            activity = ActivityLog.from_dict(data.get("activity", {}))
+            user_ids = list(activity.ordinals)
+            conn.executemany(
+                "INSERT OR IGNORE INTO activity_users (ordinal, user_id) VALUES (?, ?)",
+                [(ordinal, int(uid)) for uid, ordinal in activity.ordinals.items()]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO daily_activity (day, user_id) VALUES (?, ?)",
+                [(day, int(user_ids[ordinal])) for day, bitmap in activity.days.items() for ordinal in bitmap]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO activity_rollups (period, active, bitmap) VALUES (?, ?, ?)",
+                [(period, count, None) for period, count in activity.counts.items()]
+                + [(month, bitmap.count(), bitmap.to_bytes()) for month, bitmap in activity.months.items()]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO registrations (user_id, answers, name, phone, lang, registered_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(int(uid),) + _registration_row(Registration.from_dict(answers)) + (now,)
+                 for uid, answers in data.get("registered_users", {}).items()]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO user_langs (user_id, lang) VALUES (?, ?)",
+                [(int(uid), lang) for uid, lang in data.get("user_langs", {}).items()]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (user_id, slot, file_id, file_unique_id, file_type) VALUES (?, ?, ?, ?, ?)",
+                [(int(uid), str(slot), doc["file_id"], doc["file_unique_id"], doc["file_type"])
+                 for uid, docs in data.get("user_documents", {}).items()
+                 for slot, value in docs.items() for doc in [document_record(value)]]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO archive_files (file_unique_id, sha256, size, file_id, file_type, archived_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(uid, record["sha256"], record["size"], record["file_id"], record.get("file_type"), now)
+                 for uid, record in data.get("archive_files", {}).items()]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO bitrix_leads (phone, lead_id, fingerprint, updated_at) VALUES (?, ?, ?, ?)",
+                [(phone, lead["lead_id"], lead["fingerprint"], now) for phone, lead in data.get("bitrix_leads", {}).items()]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO stats_counters (day, name, value) VALUES (?, ?, ?)",
+                [(day, name, value) for day, values in data.get("stats", {}).items() for name, value in values.items()]
+            )
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("users", "blocked_users", "daily_activity", "activity_rollups", "registrations", "user_langs",
+                          "documents", "stats_counters")
+        }
+    finally:
+        conn.close()
+    logger.info(f"{json_path} -> {db_path} ko'chirildi: {counts}")
+    return counts
+
+
+# Sozlamaga qarab backend tanlash. SQLite bazasi hali yo'q bo'lsa,
+# birinchi ochilishda mavjud JSON fayl avtomatik ko'chiriladi.
+def create_storage(backend, json_path, db_path, save_interval=5.0, save_max_dirty=500, audience_max_age=None,
+                   busy_timeout=5000):
+    if backend == "json":
+        return JsonStorage(json_path, save_interval=save_interval, save_max_dirty=save_max_dirty)
+    if backend == "sqlite":
+        return SqliteStorage(db_path, migrate_from=json_path, audience_max_age=audience_max_age,
+                             busy_timeout=busy_timeout)
+    raise ValueError(f"Noma'lum saqlash backendi: {backend}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="bot_data.json ni SQLite bazaga ko'chirish")
+    parser.add_argument("json_path", nargs="?", default="bot_data.json")
+    parser.add_argument("db_path", nargs="?", default="bot_data.db")
+    args = parser.parse_args()
+    print(migrate_json_to_sqlite(args.json_path, args.db_path))
@@ -0,0 +1,331 @@
+# Tarjimalar
+translations = {
+    "uz": {
+        "lang_name": "🇺🇿 O'zbekcha",
+        "start": "🌐 Iltimos, tilni tanlang:",
+        "welcome": "Assalomu alaykum! 👋\nSiz PBS IMPEX kompaniyasining rasmiy Telegram botidasiz. 🌍\n\nBiz yuk tashish va logistika xizmatlarini Markaziy Osiyo hamda xalqaro yo‘nalishlarda taqdim etamiz. ✈️🚛🚢🚂\n\n📦 Buyurtma berish yoki xizmatlar bilan tanishish uchun quyidagi menyudan foydalaning. 👇",
+        "menu": ["📝 Ro'yxatdan o'tish", "📞 Operator", "🛠 Xizmatlar", "👤 Foydalanuvchi profili"],
+        "registration_questions": [
+            "1️⃣ Pasport yoki ID suratini yuklang (.jpg, .jpeg, .png, .pdf):",
+            "2️⃣ Texpasport suratini yuklang (.jpg, .jpeg, .png, .pdf):",
+            "3️⃣ Xalqaro yuk tashish litsenziyasini yuklang (.jpg, .jpeg, .png, .pdf):"
+        ],
+        "initial_questions": ["Ismingiz yoki familiyangiz?", "Telefon raqamingiz?"],
+        "verify_code": "Tasdiqlash kodi yuborildi: {code}\nIltimos, kodni kiriting:",
+        "code_correct": "✅ Kod tasdiqlandi! Botga xush kelibsiz!",
+        "code_incorrect": "❌ Noto‘g‘ri kod! Qaytadan kiriting:",
+        "error_phone": "❌ Telefon raqami noto‘g‘ri! Faqat raqamlar kiritilishi kerak. Qaytadan kiriting:",
+        "error_phone_length": "❌ Telefon raqami 9 yoki 12 ta raqamdan iborat bo‘lishi kerak! Qaytadan kiriting:",
+        "error_no_digits": "❌ Bu maydonda raqamlar ishlatilmasligi kerak! Qaytadan kiriting:",
+        "error_not_registered": "Iltimos, avval ism va telefon raqamingizni kiriting!",
+        "confirm": "✅ Tasdiqlash",
+        "retry": "🔄 O‘zgartirish",
+        "home": "🏠 Bosh sahifa",
+        "back": "🔙 Orqaga",
+        "received": "✅ Ma'lumotlar qabul qilindi. Tez orada bog‘lanamiz!",
+        "error_invalid_file": "❌ Noto‘g‘ri fayl formati! Faqat .jpg, .jpeg, .png yoki .pdf fayllar qabul qilinadi.",
+        "services": "🛠 Xizmatlar",
+        "admin_menu": ["📊 Statistika", "📢 Post", "🔎 Qidiruv", "🏠 Bosh sahifa"],
+        "admin_code_prompt": "🔑 Admin paneliga kirish uchun kodni kiriting:",
+        "admin_welcome": "👨‍💼 Admin paneliga xush kelibsiz! Quyidagi menyudan foydalaning:",
+        "not_admin": "❌ Siz admin emassiz!",
+        "throttled": "⏳ Juda ko‘p so‘rov yuborildi. Iltimos, {seconds} soniyadan keyin qayta urinib ko‘ring.",
+        "stats": "📊 Statistika ({today}):\n1. Umumiy foydalanuvchilar soni: {total} (bugun +{new_today})\n2. Botni bloklaganlar soni: {blocked}\n3. Faol foydalanuvchilar: bugun {dau}, hafta {wau}, oy {mau}\n4. 30 kunlik voronka: {started} → ro‘yxatdan o‘tdi {registered} ({registered_rate}%) → hujjat yubordi {applied} ({applied_rate}%)\n5. Noto‘g‘ri kodlar: {verify_failed}, yuklangan hujjatlar: {documents} (30 kun)\n6. Postlar: {broadcast_sent} yetkazildi, {broadcast_blocked} yetkazilmadi\n7. Tillar: {languages}\n\n📈 30 kun:\nFaol: {dau_trend}\nYangi: {users_trend}\nRo‘yxatdan o‘tgan: {registrations_trend}",
+        "post_prompt": "📢 Post yozing (matn, rasm yoki video):",
+        "post_confirm": "📢 Yuboriladigan post:\n\n{post}\n\nTasdiqlaysizmi?",
+        "post_sent": "✅ Post {count} foydalanuvchiga yuborildi!",
+        "post_schedule": "⏰ Rejalashtirish",
+        "post_schedule_prompt": "⏰ Yuborish vaqtini kiriting (YYYY-MM-DD HH:MM yoki HH:MM):",
+        "post_schedule_invalid": "❌ Vaqt noto‘g‘ri yoki o‘tib ketgan. Masalan: 2026-01-31 09:00 yoki 18:30",
+        "post_queued": "✅ Post navbatga qo‘yildi. Jarayonni quyidagi xabarda kuzatishingiz mumkin.",
+        "broadcast_progress": "📢 Post #{id}: {status}\n{processed}/{total} ({percent}%) · ✅ {sent} · ❌ {failed}",
+        "broadcast_status": {
+            "scheduled": "⏰ {start_at} da boshlanadi", "running": "⏳ yuborilmoqda", "paused": "⏸ to‘xtatilgan",
+            "cancelled": "✖️ bekor qilindi", "done": "✅ yakunlandi"
+        },
+        "broadcast_pause": "⏸ To‘xtatish",
+        "broadcast_resume": "▶️ Davom ettirish",
+        "broadcast_cancel": "✖️ Bekor qilish",
+        "invalid_action": "❌ Noto‘g‘ri so‘rov.",
+        "audience_filters": {
+            "lang": "🌐 Til", "registered": "📝 Ro‘yxatdan o‘tgan", "documents": "📎 Hujjat yuborgan", "active_days": "🕒 Faol"
+        },
+        "audience_any": "hammasi",
+        "audience_yes": "ha",
+        "audience_no": "yo‘q",
+        "audience_days": "{days} kun",
+        "search_prompt": "🔎 Ism, familiya yoki telefon raqamini (boshlanishini) kiriting:",
+        "search_results": "🔎 «{query}»: {total} ta natija ({start}–{end})\n\n{items}",
+        "search_empty": "🔎 «{query}» bo‘yicha hech narsa topilmadi.",
+        "profile": "👤 Foydalanuvchi profili:\nIsm/Familiya: {name}\nTelefon: {phone}"
+    },
+    "ru": {
+        "lang_name": "🇷🇺 Русский",
+        "start": "🌐 Пожалуйста, выберите язык:",
+        "welcome": "Здравствуйте! 👋\nВы находитесь в официальном Telegram-боте компании PBS IMPEX. 🌍\n\nМы предоставляем услуги по перевозке и логистике в Центральной Азии и по всему миру. ✈️🚛🚢🚂\n\n📦 Для оформления заказа или получения информации воспользуйтесь меню ниже. 👇",
+        "menu": ["📝 Регистрация", "📞 Оператор", "🛠 Услуги", "👤 Профиль пользователя"],
+        "registration_questions": [
+            "1️⃣ Загрузите скан паспорта или ID (.jpg, .jpeg, .png, .pdf):",
+            "2️⃣ Загрузите скан транспортного паспорта (.jpg, .jpeg, .png, .pdf):",
+            "3️⃣ Загрузите международную лицензию на перевозку грузов (.jpg, .jpeg, .png, .pdf):"
+        ],
+        "initial_questions": ["Ваше имя или фамилия?", "Ваш номер телефона?"],
+        "verify_code": "Код подтверждения отправлен: {code}\nПожалуйста, введите код:",
+        "code_correct": "✅ Код подтвержден! Добро пожаловать в бот!",
+        "code_incorrect": "❌ Неверный код! Введите еще раз:",
+        "error_phone": "❌ Номер телефона неверный! Вводите только цифры. Повторите ввод:",
+        "error_phone_length": "❌ Номер телефона должен содержать 9 или 12 цифр! Повторите ввод:",
+        "error_no_digits": "❌ В этом поле нельзя использовать цифры! Повторите ввод:",
+        "error_not_registered": "Пожалуйста, сначала введите ваше имя и номер телефона!",
+        "confirm": "✅ Подтвердить",
+        "retry": "🔄 Изменить",
+        "home": "🏠 Главное меню",
+        "back": "🔙 Назад",
+        "received": "✅ Данные получены. Мы скоро свяжемся с вами!",
+        "error_invalid_file": "❌ Неверный формат файла! Принимаются только файлы .jpg, .jpeg, .png или .pdf.",
+        "services": "🛠 Услуги",
+        "admin_menu": ["📊 Статистика", "📢 Пост", "🔎 Поиск", "🏠 Главное меню"],
+        "admin_code_prompt": "🔑 Введите код для входа в админ-панель:",
+        "admin_welcome": "👨‍💼 Добро пожаловать в админ-панель! Используйте меню ниже:",
+        "not_admin": "❌ Вы не администратор!",
+        "throttled": "⏳ Слишком много запросов. Пожалуйста, повторите попытку через {seconds} секунд.",
+        "stats": "📊 Статистика ({today}):\n1. Общее число пользователей: {total} (сегодня +{new_today})\n2. Число заблокировавших бота: {blocked}\n3. Активные пользователи: день {dau}, неделя {wau}, месяц {mau}\n4. Воронка за 30 дней: {started} → зарегистрировались {registered} ({registered_rate}%) → отправили документы {applied} ({applied_rate}%)\n5. Неверные коды: {verify_failed}, загружено документов: {documents} (30 дней)\n6. Посты: доставлено {broadcast_sent}, не доставлено {broadcast_blocked}\n7. Языки: {languages}\n\n📈 30 дней:\nАктивные: {dau_trend}\nНовые: {users_trend}\nРегистрации: {registrations_trend}",
+        "post_prompt": "📢 Напишите пост (текст, фото или видео):",
+        "post_confirm": "📢 Пост для отправки:\n\n{post}\n\nПодтверждаете?",
+        "post_sent": "✅ Пост отправлен {count} пользователям!",
+        "post_schedule": "⏰ Запланировать",
+        "post_schedule_prompt": "⏰ Введите время отправки (YYYY-MM-DD HH:MM или HH:MM):",
+        "post_schedule_invalid": "❌ Неверное или уже прошедшее время. Например: 2026-01-31 09:00 или 18:30",
+        "post_queued": "✅ Пост поставлен в очередь. Ход рассылки отображается в сообщении ниже.",
+        "broadcast_progress": "📢 Пост #{id}: {status}\n{processed}/{total} ({percent}%) · ✅ {sent} · ❌ {failed}",
+        "broadcast_status": {
+            "scheduled": "⏰ начнется {start_at}", "running": "⏳ отправляется", "paused": "⏸ приостановлен",
+            "cancelled": "✖️ отменен", "done": "✅ завершен"
+        },
+        "broadcast_pause": "⏸ Пауза",
+        "broadcast_resume": "▶️ Продолжить",
+        "broadcast_cancel": "✖️ Отменить",
+        "invalid_action": "❌ Неверный запрос.",
+        "audience_filters": {
+            "lang": "🌐 Язык", "registered": "📝 Зарегистрирован", "documents": "📎 Отправил документы", "active_days": "🕒 Активен"
+        },
+        "audience_any": "все",
+        "audience_yes": "да",
+        "audience_no": "нет",
+        "audience_days": "{days} дн.",
+        "search_prompt": "🔎 Введите имя, фамилию или номер телефона (начало номера):",
+        "search_results": "🔎 «{query}»: найдено {total} ({start}–{end})\n\n{items}",
+        "search_empty": "🔎 По запросу «{query}» ничего не найдено.",
+        "profile": "👤 Профиль пользователя:\nИмя/Фамилия: {name}\nТелефон: {phone}"
+    },
+    "en": {
+        "lang_name": "🇬🇧 English",
+        "start": "🌐 Please select a language:",
+        "welcome": "Hello! 👋\nYou are in the official Telegram bot of PBS IMPEX. 🌍\n\nWe provide freight and logistics services in Central Asia and internationally. ✈️🚛🚢🚂\n\n📦 To place an order or view services, use the menu below. 👇",
+        "menu": ["📝 Registration", "📞 Contact Operator", "🛠 Services", "👤 User Profile"],
+        "registration_questions": [
+            "1️⃣ Upload a scan of your passport or ID (.jpg, .jpeg, .png, .pdf):",
+            "2️⃣ Upload a scan of your transport passport (.jpg, .jpeg, .png, .pdf):",
+            "3️⃣ Upload an international cargo transportation license (.jpg, .jpeg, .png, .pdf):"
+        ],
+        "initial_questions": ["Your name or surname?", "Your phone number?"],
+        "verify_code": "Verification code sent: {code}\nPlease enter the code:",
+        "code_correct": "✅ Code verified! Welcome to the bot!",
+        "code_incorrect": "❌ Incorrect code! Please try again:",
+        "error_phone": "❌ Invalid phone number! Only digits are allowed. Please try again:",
+        "error_phone_length": "❌ Phone number must be 9 or 12 digits long! Please try again:",
+        "error_no_digits": "❌ Digits are not allowed in this field! Please try again:",
+        "error_not_registered": "Please enter your name and phone number first!",
+        "confirm": "✅ Confirm",
+        "retry": "🔄 Edit",
+        "home": "🏠 Home",
+        "back": "🔙 Back",
+        "received": "✅ Data received. We will contact you soon!",
+        "error_invalid_file": "❌ Invalid file format! Only .jpg, .jpeg, .png, or .pdf files are accepted.",
+        "services": "🛠 Services",
+        "admin_menu": ["📊 Statistics", "📢 Post", "🔎 Search", "🏠 Home"],
+        "admin_code_prompt": "🔑 Enter the code to access the Admin Panel:",
+        "admin_welcome": "👨‍💼 Welcome to the Admin Panel! Use the menu below:",
+        "not_admin": "❌ You are not an admin!",
+        "throttled": "⏳ Too many requests. Please try again in {seconds} seconds.",
+        "stats": "📊 Statistics ({today}):\n1. Total users: {total} (today +{new_today})\n2. Users who blocked the bot: {blocked}\n3. Active users: day {dau}, week {wau}, month {mau}\n4. 30-day funnel: {started} → registered {registered} ({registered_rate}%) → sent documents {applied} ({applied_rate}%)\n5. Wrong codes: {verify_failed}, documents uploaded: {documents} (30 days)\n6. Posts: {broadcast_sent} delivered, {broadcast_blocked} not delivered\n7. Languages: {languages}\n\n📈 30 days:\nActive: {dau_trend}\nNew: {users_trend}\nRegistered: {registrations_trend}",
+        "post_prompt": "📢 Write a post (text, photo, or video):",
+        "post_confirm": "📢 Post to send:\n\n{post}\n\nConfirm?",
+        "post_sent": "✅ Post sent to {count} users!",
+        "post_schedule": "⏰ Schedule",
+        "post_schedule_prompt": "⏰ Enter the send time (YYYY-MM-DD HH:MM or HH:MM):",
+        "post_schedule_invalid": "❌ Invalid or past time. For example: 2026-01-31 09:00 or 18:30",
+        "post_queued": "✅ Post queued. Progress is shown in the message below.",
+        "broadcast_progress": "📢 Post #{id}: {status}\n{processed}/{total} ({percent}%) · ✅ {sent} · ❌ {failed}",
+        "broadcast_status": {
+            "scheduled": "⏰ starts at {start_at}", "running": "⏳ sending", "paused": "⏸ paused",
+            "cancelled": "✖️ cancelled", "done": "✅ finished"
+        },
+        "broadcast_pause": "⏸ Pause",
+        "broadcast_resume": "▶️ Resume",
+        "broadcast_cancel": "✖️ Cancel",
+        "invalid_action": "❌ Invalid request.",
+        "audience_filters": {
+            "lang": "🌐 Language", "registered": "📝 Registered", "documents": "📎 Sent documents", "active_days": "🕒 Active"
+        },
+        "audience_any": "all",
+        "audience_yes": "yes",
+        "audience_no": "no",
+        "audience_days": "{days} d",
+        "search_prompt": "🔎 Enter a name, surname or phone number (or its beginning):",
+        "search_results": "🔎 «{query}»: {total} results ({start}–{end})\n\n{items}",
+        "search_empty": "🔎 Nothing found for «{query}».",
+        "profile": "👤 User Profile:\nName/Surname: {name}\nPhone: {phone}"
+    }
+}
+
+
+# Xizmatlar menyusi tugmalari
+SERVICE_BUTTONS = {
+    "uz": ["🚛 Logistika", "🧾 Ruxsatnomalar va bojxona xizmatlari", "🏢 Ma’muriyatchilik ishlari", "📄 Sertifikatsiya"],
+    "ru": ["🚛 Логистика", "🧾 Разрешения и таможенные услуги", "🏢 Административные услуги", "📄 Сертификация"],
+    "en": ["🚛 Logistics", "🧾 Permits and Customs Services", "🏢 Administrative Services", "📄 Certification"]
+}
+
+# Operator ma'lumotlari
+OPERATOR_INFO = {
+    "uz": """<b>«PBS IMPEX» XK</b>
+🏢 Manzil: Toshkent shahri, Nukus ko‘chasi, 3 uy
+📞 Telefon: +99871 2155638
+👨‍💼 Sale menedjer: Mohirjon Rustamov
+📱 +99893 355-75-36
+✉️ E-mail: office@pbs-impex.uz
+🌐 Web: https://pbsimpex.com/?v=2""",
+    "ru": """<b>«PBS IMPEX» ЧП</b>
+🏢 Адрес: г. Ташкент, улица Нукус, дом 3
+📞 Телефон: +99871 2155638
+👨‍💼 Менеджер по продажам: Мохиржон Рустамов
+📱 +99893 355-75-36
+✉️ E-mail: office@pbs-impex.uz
+🌐 Сайт: https://pbsimpex.com/?v=2""",
+    "en": """<b>«PBS IMPEX» LLC</b>
+🏢 Address: Nukus street 3, Tashkent
+📞 Phone: +99871 2155638
+👨‍💼 Sales Manager: Mohirjon Rustamov
+📱 +99893 355-75-36
+✉️ E-mail: office@pbs-impex.uz
+🌐 Website: https://pbsimpex.com/?v=2"""
+}
+
+# Xizmatlar haqida matnlar
+LOGISTICS_TEXT = {
+    "uz": """✅ <b>Logistika xizmati</b>
+• Malakali maslahat berish
+• Transport vositalarining qulay kombinatsiyasi (avia, avto, temir yo‘l, suv) asosida optimal yo‘nalish ishlab chiqish
+• Xarajatlarni hisoblash
+• Kerakli hujjatlarni rasmiylashtirish
+• Sug‘urta shartlarini qulaylashtirish
+• Yuk tashish bosqichlari bo‘yicha hisobot berish
+• Hilma-hil mamlakatlardan kelgan yuklarni reeksport mamlakatida to‘plash
+• \"Eshikdan eshikgacha\" xizmati
+• Toshkent va O‘zbekiston bo‘ylab shaxsiy transportda yuk tashish (5 tonna/20 kub; 1.5 tonna/14 kub)
+• Texnik Iqtisodiy Asos shartlariga asosan yuk tashishni tashkil etish""",
+    "ru": """✅ <b>Логистические услуги</b>
+• Консультации от специалистов
+• Оптимальный маршрут с учетом различных видов транспорта (авиа, авто, жд, морской)
+• Расчет затрат
+• Оформление всех необходимых документов
+• Упрощение условий страхования
+• Отчетность по каждому этапу перевозки
+• Консолидация грузов из разных стран в стране реэкспорта
+• Услуга \"от двери до двери\"
+• Перевозки по Ташкенту и всей Узбекистану (5 тонн/20 куб; 1.5 тонн/14 куб)
+• Организация перевозок на основе ТЭО""",
+    "en": """✅ <b>Logistics Service</b>
+• Professional consulting
+• Optimal route planning using air, road, rail, and sea transport
+• Cost calculation
+• Document processing
+• Simplified insurance terms
+• Reporting for each transport stage
+• Consolidation of goods from different countries in re-export country
+• Door-to-door service
+• Local transport across Tashkent and Uzbekistan (5 ton/20 m³; 1.5 ton/14 m³)
+• Full logistics based on feasibility studies"""
+}
+
+CUSTOMS_TEXT = {
+    "uz": """✅ <b>Ruxsatnomalar va bojxona xizmatlari</b>
+• Tashqi savdo shartnomalarini tuzishda maslahat va ularni ro‘yxatdan o‘tkazish
+• TIF TN kodi asosida ekspert xulosasi va bojxona moslashtirish
+• Import/eksportdagi xarajatlar bo‘yicha ma’lumot
+• Yuk hujjatlarini olish, raskreditovka qilish, bojxonada ro‘yxatga olish
+• Bojxona xizmatlarini bojxona skladigacha yoki kerakli manzilgacha yetkazish
+• Skladga qo‘yish va nazorat qilish
+• Bojxona deklaratsiyasini tayyorlash""",
+    "ru": """✅ <b>Разрешения и таможенные услуги</b>
+• Консультации по внешнеторговым контрактам и их регистрация
+• Экспертное заключение по ТН ВЭД и согласование с таможней
+• Информация по затратам на импорт/экспорт
+• Получение документов, раскредитовка, регистрация, сопровождение
+• Таможенные услуги до склада или по нужному адресу
+• Хранение и контроль на складе
+• Подготовка таможенной декларации""",
+    "en": """✅ <b>Permits and Customs Services</b>
+• Consulting on foreign trade contracts and registration
+• Expert opinion based on HS Code and customs approval
+• Info on import/export costs
+• Document handling, clearance, customs registration
+• Customs service delivery to warehouse or specified address
+• Storage and monitoring
+• Preparation of customs declaration"""
+}
+
+ADMINISTRATIVE_TEXT = {
+    "uz": """✅ <b>Ma’muriyatchilik ishlari</b>
+• Mijozlarimiz tovariga buyurtma va talabnomalarni joylashtirish
+• Tovarni sotib olish shartnomalarini muvofiqlashtirish
+• Yetkazib berish muddati, narxi va xarakteristikasini moslashtirish
+• Tovar va transport hujjatlarini muvofiqlashtirish
+• Invoyslarni olish va tekshirish
+• \"Back orders\" holatini nazorat qilish
+• Buyurtmalarni yig‘ish va jo‘natish""",
+    "ru": """✅ <b>Административные услуги</b>
+• Размещение заказов и заявок на товары клиентов
+• Согласование контрактов на закупку
+• Согласование сроков, цены и характеристик поставки
+• Согласование товарных и транспортных документов
+• Получение и проверка инвойсов
+• Контроль \"Back orders\"
+• Сбор и отправка заказов""",
+    "en": """✅ <b>Administrative Services</b>
+• Placing orders and requests for client goods
+• Coordinating purchase contracts
+• Adjusting delivery time, price, and specifications
+• Coordinating goods and transport documents
+• Receiving and verifying invoices
+• Controlling \"Back orders\"
+• Collecting and dispatching orders"""
+}
+
+CERTIFICATION_TEXT = {
+    "uz": """✅ <b>Sertifikatsiya</b>
+• Tovar uchun har xil sertifikatlarni olish (kerak bo‘lganda)
+• Akkreditatsiyaga ega laboratoriyalardan sinov protokollarini va xulosalarni olish
+• Yukni olib kirish yoki olib chiqish uchun kerakli ruxsat xatlarini olish
+• O‘lchash vositalarini metrologik attestatsiyadan o‘tkazish
+• Tovarning soni va sifati uchun ekspertiza va inspeksiya
+• Sertifikatsiya uchun namunalarni tanlab olishni tashkillashtirish""",
+    "ru": """✅ <b>Сертификация</b>
+• Получение различных сертификатов для товаров (при необходимости)
+• Получение протоколов испытаний и заключений из аккредитованных лабораторий
+• Получение разрешений на ввоз или вывоз груза
+• Метрологическая аттестация измерительных средств
+• Экспертиза и инспекция количества и качества товара
+• Организация отбора образцов для сертификации""",
+    "en": """✅ <b>Certification</b>
+• Obtaining various product certificates (if needed)
+• Getting test reports and conclusions from accredited laboratories
+• Obtaining permits for cargo import or export
+• Metrological certification of measuring instruments
+• Product quantity and quality inspection
+• Organizing sample selection for certification"""
+}
+
+# Xizmat tugmasi (SERVICE_BUTTONS dagi tartibda) -> matn
+SERVICE_TEXTS = [LOGISTICS_TEXT, CUSTOMS_TEXT, ADMINISTRATIVE_TEXT, CERTIFICATION_TEXT]
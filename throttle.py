@@ -0,0 +1,74 @@
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram import types
+
+from metrics import THROTTLED
+from sender import TokenBucket
+from texts import translations
+
+logger = logging.getLogger(__name__)
+
+# Foydalanuvchi bo'yicha flood cheklovi: har bir update turi uchun alohida token bucket.
+# Limitdan oshgan foydalanuvchi `mute` soniyaga jim qilinadi va bitta ogohlantirish oladi,
+# shu vaqt ichidagi update'lar handler va saqlash qatlamiga yetmasdan tashlanadi.
+
+
+# "message=1/5,callback_query=3/10" -> {"message": (1.0, 5), "callback_query": (3.0, 10)} (soniyasiga, zaxira)
+def parse_limits(value):
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        event, _, limit = item.partition("=")
+        rate, _, burst = limit.partition("/")
+        limits[event.strip()] = (float(rate), int(burst or 1))
+    return limits
+
+
+class ThrottleMiddleware:
+    def __init__(self, event, rate, burst, mute=30, max_users=10000):
+        self.event = event
+        self.rate = rate
+        self.burst = burst
+        self.mute = mute
+        self.max_users = max_users
+        self._buckets = OrderedDict()
+
+    # Eng uzoq vaqt faol bo'lmagan foydalanuvchining holati chiqarib tashlanadi (LRU)
+    def _bucket(self, user_id):
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    async def __call__(self, handler, event, data):
+        user = event.from_user
+        if user is None:
+            return await handler(event, data)
+        bucket = self._bucket(user.id)
+        now = time.monotonic()
+        if now < bucket.blocked_until:
+            THROTTLED.inc(self.event, "dropped")
+            return None
+        if bucket.reserve(now) == 0:
+            return await handler(event, data)
+        bucket.block(now + self.mute)
+        THROTTLED.inc(self.event, "muted")
+        logger.warning(f"Foydalanuvchi {user.id} {self.mute}s ga jim qilindi ({self.event})")
+        await self.notify(event, user)
+        return None
+
+    async def notify(self, event, user):
+        lang = user.language_code if user.language_code in translations else "uz"
+        text = translations[lang]["throttled"].format(seconds=self.mute)
+        try:
+            if isinstance(event, types.CallbackQuery):
+                await event.answer(text, show_alert=True)
+            elif isinstance(event, types.Message):
+                await event.answer(text)
+        except Exception as e:
+            logger.error(f"Flood ogohlantirishini yuborishda xatolik: {e}")
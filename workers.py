@@ -0,0 +1,158 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Ko'p jarayonli rejim: ota jarayon WEBHOOK_PATH ni qabul qiladi va har bir update'ni
+# foydalanuvchi ID'si bo'yicha doim bitta ishchiga yuboradi (foydalanuvchi tartibi saqlanadi).
+# Ishchilar main.py ning oddiy nusxalari, 127.0.0.1 dagi alohida portlarda ishlaydi
+# va umumiy holatni bitta SQLite (WAL) bazasida saqlaydi.
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+# Update'dagi foydalanuvchi (yoki chat) ID'si; topilmasa 0
+def update_user_id(update):
+    for key, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        sender = value.get("from") or value.get("user")
+        if sender and "id" in sender:
+            return sender["id"]
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+    return 0
+
+
+def pick_worker(user_id, workers):
+    return abs(int(user_id)) % workers
+
+
+class WorkerPool:
+    def __init__(self, workers, base_port, webhook_path, env=None, script=None):
+        self.workers = workers
+        self.base_port = base_port
+        self.webhook_path = webhook_path
+        self.env = env or {}
+        self.script = script or os.path.abspath(sys.argv[0])
+        self.processes = [None] * workers
+        self._session = None
+        self._supervisor = None
+        self._closing = False
+
+    def worker_url(self, index):
+        return f"http://127.0.0.1:{self.base_port + index}{self.webhook_path}"
+
+    def _spawn(self, index):
+        env = dict(os.environ, **self.env, WORKER_INDEX=str(index), WORKER_PORT=str(self.base_port + index))
+        self.processes[index] = subprocess.Popen([sys.executable, self.script], env=env)
+        logger.info(f"Ishchi {index} ishga tushirildi (pid {self.processes[index].pid}, port {self.base_port + index})")
+
+    # Yiqilgan ishchi qayta ishga tushiriladi
+    async def _supervise(self):
+        while not self._closing:
+            for index, process in enumerate(self.processes):
+                if process.poll() is not None and not self._closing:
+                    logger.error(f"Ishchi {index} to'xtadi (kod {process.returncode}), qayta ishga tushirilmoqda")
+                    self._spawn(index)
+            await asyncio.sleep(1)
+
+    async def start(self, ready_timeout=60):
+        for index in range(self.workers):
+            self._spawn(index)
+        connector = aiohttp.TCPConnector(limit=0, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60))
+        try:
+            await self._wait_ready(ready_timeout)
+        except BaseException:
+            await self.close()
+            raise
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    # Barcha ishchilar webhook'ni qabul qila boshlaguncha kutish
+    async def _wait_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        for index in range(self.workers):
+            while True:
+                try:
+                    async with self._session.get(self.worker_url(index)) as response:
+                        await response.read()
+                    break
+                except aiohttp.ClientError:
+                    if time.monotonic() > deadline or self.processes[index].poll() is not None:
+                        raise RuntimeError(f"Ishchi {index} ishga tushmadi")
+                    await asyncio.sleep(0.2)
+
+    async def close(self):
+        self._closing = True
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+        for process in self.processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                await asyncio.to_thread(process.wait)
+        if self._session is not None:
+            await self._session.close()
+
+    async def forward(self, request):
+        body = await request.read()
+        try:
+            user_id = update_user_id(json.loads(body))
+        except (ValueError, AttributeError):
+            return web.Response(status=400)
+        headers = {"Content-Type": "application/json"}
+        if SECRET_HEADER in request.headers:
+            headers[SECRET_HEADER] = request.headers[SECRET_HEADER]
+        url = self.worker_url(pick_worker(user_id, self.workers))
+        try:
+            async with self._session.post(url, data=body, headers=headers) as response:
+                return web.Response(status=response.status, body=await response.read(),
+                                    content_type=response.content_type)
+        except aiohttp.ClientError as e:
+            # Telegram update'ni keyinroq qayta yuboradi
+            logger.error(f"Ishchiga yuborishda xatolik ({url}): {e}")
+            return web.Response(status=503)
+
+
+# Ishchi jarayon: ota jarayon to'satdan o'lsa (SIGKILL), ishchi ham to'xtaydi
+async def watch_parent(interval=1.0):
+    parent = os.getppid()
+    while os.getppid() == parent:
+        await asyncio.sleep(interval)
+    logger.error("Ota jarayon to'xtadi, ishchi yakunlanmoqda")
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+# Ota jarayon: ishchilarni ishga tushiradi va webhook'ni ular orasida taqsimlaydi
+async def run_dispatcher(host, port, webhook_path, workers, base_port, prepare=None):
+    if prepare is not None:
+        await prepare()
+    pool = WorkerPool(workers, base_port, webhook_path)
+    await pool.start()
+    app = web.Application()
+    app.router.add_post(webhook_path, pool.forward)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"{workers} ta ishchi, webhook {host}:{port}{webhook_path}")
+    # SIGTERM/SIGINT da ishchilar ham to'xtatiladi
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await pool.close()